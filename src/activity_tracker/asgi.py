@@ -2,6 +2,8 @@
 ASGI config for activity_tracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Live event streams are served by core.live, direct uploads by core.uploads
+and everything else by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -9,8 +11,21 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'activity_tracker.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core.live import events_application  # noqa: E402
+from core.uploads import upload_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == settings.LIVE_EVENTS_PATH:
+        return await events_application(scope, receive, send)
+    if scope['type'] == 'http' and scope['path'].startswith(settings.UPLOAD_PATH):
+        return await upload_application(scope, receive, send)
+
+    return await django_application(scope, receive, send)
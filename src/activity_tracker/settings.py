@@ -104,6 +104,21 @@ DATABASES = {
     }
 }
 
+# Local memory of each process by default. Set CACHE_BACKEND and CACHE_LOCATION
+# to a cache shared by all processes, such as memcached, so that cache
+# invalidations reach every process. Until then, entries of the caches which
+# writes invalidate expire after LOCAL_CACHE_TIMEOUT seconds, see core.cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+LOCAL_CACHE_TIMEOUT = 10
+
 AUTHENTICATION_BACKENDS = [
     # Needed to login by username in Django admin, regardless of `allauth`
     'django.contrib.auth.backends.ModelBackend',
@@ -112,6 +127,59 @@ AUTHENTICATION_BACKENDS = [
     'allauth.account.auth_backends.AuthenticationBackend',
 ]
 
+# New passwords are hashed with the first hasher, passwords of the other hashers
+# are rehashed with it when their users log in
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+# Passwords hashed at once per process by token logins, see user.login
+LOGIN_HASH_CONCURRENCY = 4
+LOGIN_HASH_TIMEOUT = 5
+
+# Token authentication cache, see core.authentication
+TOKEN_CACHE_ALIAS = 'default'
+TOKEN_CACHE_TIMEOUT = 300
+TOKEN_CACHE_MAX_SIZE = 10000
+
+# Meal and daily meal detail response cache, see core.cache
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 3600
+
+# Food catalog cache, see core.cache. Entries are rebuilt after the timeout and
+# served while they are rebuilt for up to the stale timeout
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = 300
+CATALOG_CACHE_STALE_TIMEOUT = 60
+CATALOG_CACHE_LOCK_TIMEOUT = 5
+# Fraction of the catalog cache lookups counted, 0 to count none
+CATALOG_CACHE_STATS_RATE = 0.01
+
+# Generation of the food name autocomplete index, see meal.autocomplete
+AUTOCOMPLETE_CACHE_ALIAS = 'default'
+
+# Least word similarity of food names matching a search, see core.search
+WORD_SIMILARITY_THRESHOLD = 0.5
+
+# Live events of meals and measurements, see core.live. Set LIVE_BROKER to
+# core.live.CacheBroker with a shared cache when running several workers
+LIVE_BROKER = os.environ.get('LIVE_BROKER', 'core.live.LocalBroker')
+LIVE_CACHE_ALIAS = 'default'
+LIVE_EVENTS_PATH = '/api/user/events/'
+LIVE_KEEPALIVE_SECONDS = 15
+LIVE_POLL_SECONDS = 1
+LIVE_EVENT_TIMEOUT = 60
+LIVE_QUEUE_SIZE = 100
+
+# Background processing of uploaded pictures, see core.images. Originals are
+# downsized to IMAGE_MAX_SIZE and WebP variants written for every size in pixels
+IMAGE_WORKERS = 2
+IMAGE_MAX_SIZE = 2048
+IMAGE_VARIANTS = {'thumbnail': 160, 'medium': 640}
+IMAGE_QUALITY = 80
+
 # TODO Write out email confirmations in the console for now
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
@@ -169,6 +237,29 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = '/vol/web/media'
+
+# Uploads are stored once per distinct content under the hash of the content,
+# see core.storage. Set MEDIA_STORAGE to core.storage.MediaStorage to store
+# every upload under a new name instead
+DEFAULT_FILE_STORAGE = os.environ.get('MEDIA_STORAGE', 'core.storage.ContentAddressedStorage')
+
+# Serving of uploads, see core.views.MediaView. Set MEDIA_SERVER to nginx to
+# hand files off with X-Accel-Redirect to an internal location at
+# MEDIA_ACCEL_PREFIX aliasing MEDIA_ROOT, or to apache for X-Sendfile.
+# Otherwise files are sent by the application server, with sendfile if it
+# supports it. Stored files never change, so clients may cache them for good
+MEDIA_SERVER = os.environ.get('MEDIA_SERVER', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Direct uploads of pictures to signed URLs, see core.uploads. Uploads not
+# used within UPLOAD_EXPIRE_SECONDS are deleted by the clear_uploads command
+UPLOAD_BACKEND = os.environ.get('UPLOAD_BACKEND', 'core.uploads.LocalUploadBackend')
+UPLOAD_ROOT = '/vol/web/uploads'
+UPLOAD_PATH = '/api/uploads/'
+UPLOAD_URL_TIMEOUT = 15 * 60
+UPLOAD_EXPIRE_SECONDS = 24 * 60 * 60
+UPLOAD_MAX_SIZE = 10 * 1024 * 1024
 STATIC_ROOT = '/vol/web/static'
 
 AUTH_USER_MODEL = 'core.User'
@@ -13,12 +13,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.views.generic.base import TemplateView
 
+from core.views import DirectUploadView, LiveEventsView, MediaView
+
 urlpatterns = [
     # Admin page
     path('admin/', admin.site.urls),
@@ -31,4 +34,14 @@ urlpatterns = [
     path('api/user/', include('user.urls')),
     path('api/meal/', include('meal.urls')),
     path('api/measurement/', include('measurement.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+    # Served by core.live.events_application under ASGI
+    path(settings.LIVE_EVENTS_PATH.lstrip('/'), LiveEventsView.as_view(), name='live-events'),
+
+    # Uploads
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), MediaView.as_view(), name='media'),
+    # Served by core.uploads.upload_application under ASGI
+    re_path(
+        r'^%s(?P<key>.+)$' % re.escape(settings.UPLOAD_PATH.lstrip('/')), DirectUploadView.as_view(), name='upload',
+    ),
+]
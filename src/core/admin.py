@@ -1,9 +1,11 @@
+from django import forms
 from django.contrib import admin
 from django.utils.translation import gettext as _
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
 
 from core import models
+from meal.barcodes import normalize_barcode
 
 class UserAdmin(BaseUserAdmin):
     
@@ -29,13 +31,37 @@ class UserAdmin(BaseUserAdmin):
 # user
 admin.site.register(models.User, UserAdmin)
 
+
 # meal
-admin.site.register(models.BaseFood)
+class CaloriesAdmin(admin.ModelAdmin):
+    """Calories are maintained from the food amounts, see core.signals"""
+    readonly_fields = ['calories']
+
+
+class BaseFoodForm(forms.ModelForm):
+    """Stores barcodes normalized, see meal.barcodes"""
+
+    def clean_barcode(self):
+        barcode = self.cleaned_data['barcode']
+        if not barcode:
+            return None
+        try:
+            return normalize_barcode(barcode)
+        except ValueError as error:
+            raise forms.ValidationError(str(error))
+
+
+class BaseFoodAdmin(admin.ModelAdmin):
+    form = BaseFoodForm
+    search_fields = ['name', 'barcode']
+
+
+admin.site.register(models.BaseFood, BaseFoodAdmin)
 admin.site.register(models.FoodAmount)
-admin.site.register(models.Recipe)
-admin.site.register(models.Meal)
-admin.site.register(models.DailyMeal)
+admin.site.register(models.Recipe, BaseFoodAdmin)
+admin.site.register(models.Meal, CaloriesAdmin)
+admin.site.register(models.DailyMeal, CaloriesAdmin)
 
 # measurement
 admin.site.register(models.UserGoal)
-admin.site.register(models.Measurement)
\ No newline at end of file
+admin.site.register(models.Measurement)
@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.cache import entry_timeout
+
+
+# Token cache
+#
+# Resolved tokens are kept in a bounded LRU of this process for at most
+# TOKEN_CACHE_TIMEOUT seconds, and in the TOKEN_CACHE_ALIAS cache, which all
+# processes share when it is a shared backend. Every entry records the version
+# of its user, kept in the same cache. Versions are random: deleting a token,
+# or changing or deleting its user, replaces that version, so every process
+# rejects its cached entries on the next request and authenticates against the
+# database. A version evicted from the cache is created again with a new
+# value, so the entries of the evicted one are rejected too.
+# With a process-local cache, entries expire after LOCAL_CACHE_TIMEOUT seconds.
+
+class TokenCache:
+    """Cache of token key to user and token"""
+    USER_EXCLUDED_FIELDS = {'password'}
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.TOKEN_CACHE_ALIAS]
+
+    @staticmethod
+    def entry_key(key):
+        """Return the cache key of a token key, which must not be stored as is"""
+        return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def version_key(user_id):
+        return f'auth:user:{user_id}'
+
+    def get_version(self, user_id):
+        version_key = self.version_key(user_id)
+        version = self.cache.get(version_key)
+        if version is None:
+            self.cache.add(version_key, uuid.uuid4().hex, None)
+            version = self.cache.get(version_key)
+
+        return version
+
+    def get(self, key):
+        """Return the (user, token) of a cached valid token, None if not cached"""
+        entry_key = self.entry_key(key)
+        with self.lock:
+            entry = self.entries.get(entry_key)
+            if entry is not None:
+                self.entries.move_to_end(entry_key)
+        if entry is None or entry['expires'] < time.time():
+            entry = self.cache.get(entry_key)
+            if entry is None:
+                return None
+
+        if entry['version'] != self.get_version(entry['token'][1]):
+            self.discard(entry_key)
+            return None
+
+        self.store_local(entry_key, entry)
+        return self.load(entry)
+
+    def set(self, token, version):
+        """Cache a token and its user, loaded at the given user version"""
+        user = token.user
+        timeout = entry_timeout(self.cache, settings.TOKEN_CACHE_TIMEOUT)
+        user_fields = [
+            field.attname for field in user._meta.concrete_fields if field.name not in self.USER_EXCLUDED_FIELDS
+        ]
+        entry = {
+            'version': version,
+            'expires': time.time() + timeout,
+            'user_fields': user_fields,
+            'user': [getattr(user, field) for field in user_fields],
+            'token': [token.key, token.user_id, token.created],
+        }
+        entry_key = self.entry_key(token.key)
+        self.store_local(entry_key, entry)
+        self.cache.set(entry_key, entry, timeout)
+
+    def store_local(self, entry_key, entry):
+        with self.lock:
+            self.entries[entry_key] = entry
+            self.entries.move_to_end(entry_key)
+            while len(self.entries) > settings.TOKEN_CACHE_MAX_SIZE:
+                self.entries.popitem(last=False)
+
+    def load(self, entry):
+        """Return new user and token instances from a cache entry, without a query"""
+        user = get_user_model().from_db(None, entry['user_fields'], entry['user'])
+        token = Token.from_db(None, ['key', 'user_id', 'created'], entry['token'])
+        token.user = user
+
+        return user, token
+
+    def discard(self, entry_key):
+        with self.lock:
+            self.entries.pop(entry_key, None)
+        self.cache.delete(entry_key)
+
+    def revoke_token(self, key, user_id):
+        """Stop accepting the cached token"""
+        self.discard(self.entry_key(key))
+        self.revoke_user(user_id)
+
+    def revoke_user(self, user_id):
+        """Stop accepting every cached token of the user in all processes"""
+        self.cache.set(self.version_key(user_id), uuid.uuid4().hex, None)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication resolving tokens from token_cache
+    and from the database only when they are not cached"""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        token_cache.set(token, token_cache.get_version(token.user_id))
+        return token.user, token
@@ -0,0 +1,206 @@
+import hashlib
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+# Process-local caches
+#
+# Invalidations are written to the cache holding the entries, so they only
+# reach the processes sharing it. In a cache local to each process, entries
+# expire after LOCAL_CACHE_TIMEOUT seconds instead, which bounds how long a
+# process serves data written by another one.
+
+def is_process_local(cache):
+    """Return whether the cache is kept in the memory of each process"""
+    return isinstance(cache, LocMemCache)
+
+
+def entry_timeout(cache, timeout):
+    """Return the timeout of entries of the cache which writes invalidate,
+    at most LOCAL_CACHE_TIMEOUT seconds in a process-local cache"""
+    if not is_process_local(cache):
+        return timeout
+
+    return settings.LOCAL_CACHE_TIMEOUT if timeout is None else min(timeout, settings.LOCAL_CACHE_TIMEOUT)
+
+
+# Response cache
+#
+# Serialized detail responses are kept in the RESPONSE_CACHE_ALIAS cache per
+# object, user and variant of the request, together with the version of the
+# object they were built from. Versions are random and replaced when the
+# object, or a row rendered with it, is written, see core.signals and
+# add_meal_calories(), so entries built before the write stop matching. The
+# version is read before the object is loaded and replaced once the write
+# commits, so an entry is never stored with a version newer than its data.
+
+class ResponseCache:
+    """Cache of serialized responses, valid while the version of their object is unchanged"""
+
+    @property
+    def cache(self):
+        return caches[settings.RESPONSE_CACHE_ALIAS]
+
+    @staticmethod
+    def version_key(model, pk):
+        return f'response:version:{model._meta.label_lower}:{pk}'
+
+    @staticmethod
+    def entry_key(model, pk, user_id, variant):
+        """Return the cache key of an entry, variant is hashed to keep keys short"""
+        variant = hashlib.sha256(variant.encode()).hexdigest()
+        return f'response:{model._meta.label_lower}:{pk}:{user_id}:{variant}'
+
+    def get(self, model, pk, user_id, variant):
+        """Return the current version of the object and its cached entry,
+        None instead of the entry when it is not cached or outdated"""
+        version_key = self.version_key(model, pk)
+        entry_key = self.entry_key(model, pk, user_id, variant)
+        values = self.cache.get_many([version_key, entry_key])
+
+        version = values.get(version_key)
+        if version is None:
+            # Also after an eviction, so older entries stop matching
+            self.cache.add(version_key, uuid.uuid4().hex, None)
+            return self.cache.get(version_key), None
+
+        entry = values.get(entry_key)
+        if entry is None or entry['version'] != version:
+            return version, None
+
+        return version, entry
+
+    def set(self, model, pk, user_id, variant, version, entry):
+        """Cache an entry built from the object at the given version"""
+        self.cache.set(
+            self.entry_key(model, pk, user_id, variant),
+            dict(entry, version=version),
+            entry_timeout(self.cache, settings.RESPONSE_CACHE_TIMEOUT),
+        )
+
+    def invalidate(self, model, pks):
+        """Stop matching the cached entries of the objects once the current transaction commits"""
+        keys = [self.version_key(model, pk) for pk in pks]
+        if keys:
+            transaction.on_commit(lambda: self.cache.set_many({key: uuid.uuid4().hex for key in keys}, None))
+
+
+response_cache = ResponseCache()
+
+
+# Catalog cache
+#
+# Responses of the food catalog, the foods and recipes of all users, are the
+# same for every user and kept in the CATALOG_CACHE_ALIAS cache under the
+# current catalog generation. Every write to a food or recipe increments the
+# generation once it commits, see core.signals and BaseFoodQuerySet, so all
+# entries of older generations stop being read without scanning for them,
+# and expire by themselves.
+#
+# Entries are rebuilt after CATALOG_CACHE_TIMEOUT seconds by the one worker
+# holding the rebuild lock of the entry, while the others keep serving the
+# expired entry. A missing entry is only built by the worker holding the
+# lock, the others wait up to CATALOG_CACHE_LOCK_TIMEOUT seconds for it.
+# In a process-local cache, entries are not served once expired.
+# A CATALOG_CACHE_STATS_RATE fraction of the lookups is counted as a hit or
+# miss in the cache, see the catalog_cache_stats command, so most hits cost
+# no write.
+
+class CatalogCache:
+    """Cache of catalog values under generation keys, rebuilt by one worker at a time"""
+    GENERATION_KEY = 'catalog:generation'
+    STATS = ('hits', 'misses')
+    POLL_SECONDS = 0.05
+
+    @property
+    def cache(self):
+        return caches[settings.CATALOG_CACHE_ALIAS]
+
+    def get_generation(self):
+        generation = self.cache.get(self.GENERATION_KEY)
+        if generation is None:
+            # Starts above every number used before an eviction
+            self.cache.add(self.GENERATION_KEY, time.time_ns(), None)
+            generation = self.cache.get(self.GENERATION_KEY)
+
+        return generation
+
+    @staticmethod
+    def entry_key(generation, key):
+        """Return the cache key of an entry, key is hashed to keep cache keys short"""
+        return f'catalog:{generation}:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get_or_set(self, generation, key, build):
+        """Return the cached value for the key in the generation, or the value returned by build,
+        which is cached unless it is None"""
+        entry_key = self.entry_key(generation, key)
+        lock_key = entry_key + ':lock'
+        lock_timeout = settings.CATALOG_CACHE_LOCK_TIMEOUT
+
+        entry = self.cache.get(entry_key)
+        if entry is not None:
+            # An expired entry is served while another worker rebuilds it
+            if entry['expires'] > time.time() or not self.cache.add(lock_key, 1, lock_timeout):
+                self.count('hits')
+                return entry['value']
+        else:
+            deadline = time.monotonic() + lock_timeout
+            while not self.cache.add(lock_key, 1, lock_timeout):
+                if time.monotonic() > deadline:
+                    break
+                time.sleep(self.POLL_SECONDS)
+                entry = self.cache.get(entry_key)
+                if entry is not None:
+                    self.count('hits')
+                    return entry['value']
+
+        self.count('misses')
+        try:
+            value = build()
+            if value is not None:
+                timeout = entry_timeout(self.cache, settings.CATALOG_CACHE_TIMEOUT)
+                self.cache.set(
+                    entry_key,
+                    {'value': value, 'expires': time.time() + timeout},
+                    entry_timeout(self.cache, settings.CATALOG_CACHE_TIMEOUT + settings.CATALOG_CACHE_STALE_TIMEOUT),
+                )
+        finally:
+            self.cache.delete(lock_key)
+
+        return value
+
+    def invalidate(self):
+        """Stop reading the cached catalog once the current transaction commits"""
+        transaction.on_commit(self.increment_generation)
+
+    def increment_generation(self):
+        try:
+            self.cache.incr(self.GENERATION_KEY)
+        except ValueError:
+            self.cache.set(self.GENERATION_KEY, time.time_ns(), None)
+
+    def count(self, stat):
+        if random.random() >= settings.CATALOG_CACHE_STATS_RATE:
+            return
+        try:
+            self.cache.incr(f'catalog:stats:{stat}')
+        except ValueError:
+            self.cache.add(f'catalog:stats:{stat}', 1, None)
+
+    def get_stats(self):
+        """Return the hits and misses since the last reset, estimated from the counted fraction"""
+        values = self.cache.get_many([f'catalog:stats:{stat}' for stat in self.STATS])
+        rate = settings.CATALOG_CACHE_STATS_RATE
+        return {stat: round(values.get(f'catalog:stats:{stat}', 0) / rate) if rate else 0 for stat in self.STATS}
+
+    def reset_stats(self):
+        self.cache.delete_many([f'catalog:stats:{stat}' for stat in self.STATS])
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,125 @@
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from core import images
+from core.uploads import upload_backend
+
+
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    """Many related field which resolves all submitted values at once
+    instead of running one query per item"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        return self.child_relation.to_internal_value_many(data)
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field accepting only objects owned by the authenticated user.
+    With many=True every submitted key is resolved in a single IN query,
+    so any select_related on the queryset is loaded in that query as well."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        """Limit the queryset to the objects of the authenticated user"""
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None:
+            return queryset
+
+        return queryset.filter(user=request.user)
+
+    def to_internal_value_many(self, data):
+        """Return the objects for all of the given primary keys, in the submitted order"""
+        queryset = self.get_queryset()
+        pk_field = queryset.model._meta.pk
+
+        pks = []
+        for item in data:
+            if self.pk_field is not None:
+                item = self.pk_field.to_internal_value(item)
+            if isinstance(item, bool):
+                self.fail('incorrect_type', data_type=type(item).__name__)
+            try:
+                pks.append(pk_field.to_python(item))
+            except (TypeError, ValueError, ValidationError):
+                self.fail('incorrect_type', data_type=type(item).__name__)
+
+        objects = {obj.pk: obj for obj in queryset.filter(pk__in=pks)} if pks else {}
+        for pk in pks:
+            if pk not in objects:
+                self.fail('does_not_exist', pk_value=pk)
+
+        return [objects[pk] for pk in pks]
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Read-only field of the URLs of the variants of an image field,
+    null until they are written, see core.images"""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        urls = images.variant_urls(instance, self.image_field)
+        request = self.context.get('request')
+        if urls is None or request is None:
+            return urls
+
+        return {variant: request.build_absolute_uri(url) for variant, url in urls.items()}
+
+
+class UploadKeyField(serializers.CharField):
+    """Write-only field of the key of a finished direct upload of the user, see core.uploads.
+    Validates the upload as an image and returns it as a file named after its format"""
+    default_error_messages = {
+        'not_found': _('Upload not found.'),
+        'invalid_image': _(
+            'Upload a valid image. The file you uploaded was either not an image or a corrupted image.'
+        ),
+    }
+
+    def __init__(self, **kwargs):
+        kwargs['write_only'] = True
+        kwargs['required'] = False
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        key = super().to_internal_value(data)
+        user = getattr(self.context.get('request'), 'user', None)
+        try:
+            if user is None or not key.startswith(f'{user.pk}/') or not upload_backend.exists(key):
+                self.fail('not_found')
+        except ValueError:
+            self.fail('not_found')
+
+        file = upload_backend.open(key)
+        try:
+            image = Image.open(file)
+            format = image.format
+            image.verify()
+        except Exception:
+            file.close()
+            self.fail('invalid_image')
+
+        file.seek(0)
+        file.name = f'{key.split("/")[-1]}.{format.lower()}'
+        file.upload_key = key
+        return file
@@ -0,0 +1,138 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+
+# Image processing
+#
+# Uploaded pictures are processed off the request path by a pool of
+# IMAGE_WORKERS threads, Pillow releases the GIL while decoding and resizing.
+# Once the upload commits, a copy of the original without EXIF metadata of at
+# most IMAGE_MAX_SIZE pixels is saved as a new file, and a WebP variant is
+# written next to it for every size of IMAGE_VARIANTS. Then the image of the
+# object is pointed to the copy, which releases the upload, its <field>_processed
+# flag is set and serializers expose the variant URLs, see
+# core.mixins.ImageVariantsMixin. Stored files are never rewritten. Images left
+# unprocessed by an error or a restart are processed by the process_images
+# command.
+
+executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix='images')
+
+
+def processed_field(field_name):
+    """Return the name of the flag telling whether the image field is processed"""
+    return f'{field_name}_processed'
+
+
+def variant_name(name, variant):
+    """Return the file name of a variant of an image file"""
+    root, ext = os.path.splitext(name)
+    return f'{root}.{variant}.webp'
+
+
+def variant_source(name):
+    """Return the file name without extension of the image a variant file name belongs to,
+    None if it is not the name of a variant"""
+    for variant in settings.IMAGE_VARIANTS:
+        if name.endswith(f'.{variant}.webp'):
+            return name[:-len(f'.{variant}.webp')]
+
+    return None
+
+
+def variant_urls(instance, field_name):
+    """Return the URLs of the variants of an image field by variant, None if there are none yet"""
+    field_file = getattr(instance, field_name)
+    if not field_file or not getattr(instance, processed_field(field_name)):
+        return None
+
+    return {
+        variant: field_file.storage.url(variant_name(field_file.name, variant)) for variant in settings.IMAGE_VARIANTS
+    }
+
+
+def schedule(instance, field_name):
+    """Process the image of the instance once the current transaction commits"""
+    name = getattr(instance, field_name).name
+    label = instance._meta.label
+    transaction.on_commit(lambda: executor.submit(process, label, instance.pk, field_name, name))
+
+
+def encode(image, format, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return ContentFile(buffer.getvalue())
+
+
+def delete(storage, name):
+    """Delete an image file and its variants"""
+    storage.delete(name)
+    for variant in settings.IMAGE_VARIANTS:
+        storage.delete(variant_name(name, variant))
+
+
+def process(label, pk, field_name, name):
+    """Write the stripped original and the variants of an uploaded image to new files,
+    then point the image of the object to them if it is still the same upload.
+    Return whether the image could be processed"""
+    from core.models import retain_media, release_media
+
+    model = apps.get_model(label)
+    storage = model._meta.get_field(field_name).storage
+    close_old_connections()
+    try:
+        with storage.open(name) as file:
+            original = Image.open(file)
+            format = original.format
+            image = ImageOps.exif_transpose(original)
+            image.load()
+
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.getbands() else 'RGB')
+        image.thumbnail((settings.IMAGE_MAX_SIZE, settings.IMAGE_MAX_SIZE))
+        original = image.convert('RGB') if format == 'JPEG' and image.mode != 'RGB' else image
+        processed_name = storage.save(name, encode(original, format, quality=settings.IMAGE_QUALITY))
+
+        for variant, size in settings.IMAGE_VARIANTS.items():
+            # With content addressed storage, the same content may have been processed before
+            if not storage.exists(variant_name(processed_name, variant)):
+                thumbnail = image.copy()
+                thumbnail.thumbnail((size, size))
+                storage.save_derived(
+                    variant_name(processed_name, variant),
+                    encode(thumbnail, 'WEBP', quality=settings.IMAGE_QUALITY),
+                )
+
+        with transaction.atomic():
+            instance = model.objects.select_for_update().filter(pk=pk, **{field_name: name}).first()
+            if instance is not None:
+                setattr(instance, field_name, processed_name)
+                setattr(instance, processed_field(field_name), True)
+                update_fields = [field_name, processed_field(field_name)]
+                if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+                    update_fields.append('updated_at')
+                # Sends post_save, which moves the file reference of the object
+                # to the processed file and invalidates the caches of the object
+                instance.save(update_fields=update_fields)
+            else:
+                # The image was changed meanwhile, delete the processed file unless it is shared
+                retain_media(processed_name)
+                release_media(processed_name)
+    except Exception:
+        # Nothing waits for the result, the image stays unprocessed, see the process_images command
+        logger.exception('Could not process image %s of %s %s', name, label, pk)
+        return False
+    finally:
+        close_old_connections()
+
+    return True
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from rest_framework import exceptions
+
+from core.authentication import CachedTokenAuthentication
+
+
+# Live events
+#
+# Changes of a user's meals, daily meals and measurements are published as
+# compact events once their transaction commits, see core.signals and
+# measurement.signals, and pushed to the user's open Server-Sent Events
+# streams at LIVE_EVENTS_PATH. Streams are served by the ASGI application
+# directly, see activity_tracker.asgi, so an idle stream holds no thread.
+# Under WSGI, such as runserver, core.views.LiveEventsView answers 501.
+#
+# LIVE_BROKER fans events out to the subscribers. LocalBroker only reaches
+# the streams of the publishing process. With several workers CacheBroker
+# stands in for a message broker, through the shared LIVE_CACHE_ALIAS cache.
+
+class LocalBroker:
+    """Fans events out to the subscribers of this process"""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def publish(self, user_id, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(user_id, ()))
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    def subscribe(self, user_id):
+        """Return a new subscription to the user's events, must be called from the event loop"""
+        subscription = LocalSubscription(self, user_id)
+        with self.lock:
+            self.subscribers[user_id].add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.user_id, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self.subscribers.pop(subscription.user_id, None)
+
+
+class LocalSubscription:
+    """Queue of the events published to a subscriber of LocalBroker.
+    Drops the oldest event when the subscriber does not keep up"""
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE)
+
+    def put(self, event):
+        """Queue the event, from any thread"""
+        try:
+            self.loop.call_soon_threadsafe(self.put_nowait, event)
+        except RuntimeError:
+            # The event loop was closed
+            self.close()
+
+    def put_nowait(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        """Return the queued events, waiting up to timeout seconds for one"""
+        try:
+            events = [await asyncio.wait_for(self.queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+
+        return events
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class CacheBroker:
+    """Stand-in for a message broker shared by several processes. Keeps the
+    events of each user for LIVE_EVENT_TIMEOUT seconds in the cache, under
+    consecutive numbers which subscribers poll for"""
+
+    @property
+    def cache(self):
+        return caches[settings.LIVE_CACHE_ALIAS]
+
+    @staticmethod
+    def sequence_key(user_id):
+        return f'live:{user_id}'
+
+    @staticmethod
+    def event_key(user_id, number):
+        return f'live:{user_id}:{number}'
+
+    def get_sequence(self, user_id):
+        return self.cache.get(self.sequence_key(user_id), 0)
+
+    def publish(self, user_id, event):
+        key = self.sequence_key(user_id)
+        try:
+            number = self.cache.incr(key)
+        except ValueError:
+            number = 1 if self.cache.add(key, 1, None) else self.cache.incr(key)
+        self.cache.set(self.event_key(user_id, number), event, settings.LIVE_EVENT_TIMEOUT)
+
+    def subscribe(self, user_id):
+        return CacheSubscription(self, user_id)
+
+    def get_events(self, user_id, after):
+        """Return the number of the latest event of the user and the events after the given number"""
+        latest = self.get_sequence(user_id)
+        if latest <= after:
+            # The sequence was evicted when it went back
+            return latest, []
+
+        numbers = range(max(after + 1, latest - settings.LIVE_QUEUE_SIZE + 1), latest + 1)
+        keys = [self.event_key(user_id, number) for number in numbers]
+        events = self.cache.get_many(keys)
+        return latest, [events[key] for key in keys if key in events]
+
+
+class CacheSubscription:
+    """Polls CacheBroker for the events published to a subscriber"""
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.after = None
+
+    async def get(self, timeout):
+        """Return the events published since the last call, waiting up to timeout seconds for one"""
+        if self.after is None:
+            self.after = await sync_to_async(self.broker.get_sequence)(self.user_id)
+
+        waited = 0
+        while True:
+            self.after, events = await sync_to_async(self.broker.get_events)(self.user_id, self.after)
+            if events or waited >= timeout:
+                return events
+            await asyncio.sleep(settings.LIVE_POLL_SECONDS)
+            waited += settings.LIVE_POLL_SECONDS
+
+    def close(self):
+        pass
+
+
+# Fields of the events of each model
+MEAL_FIELDS = ('id', 'calories')
+DAILY_MEAL_FIELDS = ('id', 'date', 'calories', 'water_glasses')
+
+broker = import_string(settings.LIVE_BROKER)()
+
+
+def publish(user_id, event_type, data):
+    """Push an event to the user's streams once the current transaction commits"""
+    event = dict(data, type=event_type)
+    transaction.on_commit(lambda: broker.publish(user_id, event))
+
+
+def publish_rows(event_type, rows):
+    """Publish an event for each row, given as a dict of the event data and the user"""
+    for row in rows:
+        publish(row.pop('user'), event_type, row)
+
+
+# Server-Sent Events stream
+
+def authenticate(headers):
+    """Return the active user of the token in the Authorization header, None if it is not valid"""
+    authorization = headers.get(b'authorization', b'').decode('latin1').split()
+    if len(authorization) != 2 or authorization[0] != CachedTokenAuthentication.keyword:
+        return None
+
+    close_old_connections()
+    try:
+        user, token = CachedTokenAuthentication().authenticate_credentials(authorization[1])
+    except exceptions.AuthenticationFailed:
+        return None
+    finally:
+        close_old_connections()
+
+    return user
+
+
+def encode_event(event):
+    """Return the Server-Sent Events message of an event"""
+    data = json.dumps({key: value for key, value in event.items() if key != 'type'}, cls=DjangoJSONEncoder)
+    return f'event: {event["type"]}\ndata: {data}\n\n'.encode()
+
+
+async def events_application(scope, receive, send):
+    """ASGI application streaming the events of the authenticated user"""
+    user = await sync_to_async(authenticate)(dict(scope['headers']))
+    if user is None:
+        await send({
+            'type': 'http.response.start',
+            'status': 401,
+            'headers': [(b'content-type', b'application/json'), (b'www-authenticate', b'Token')],
+        })
+        await send({'type': 'http.response.body', 'body': b'{"detail":"Invalid token."}'})
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            # Disables response buffering of nginx
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+
+    subscription = broker.subscribe(user.pk)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        while not disconnected.done():
+            events = asyncio.ensure_future(subscription.get(settings.LIVE_KEEPALIVE_SECONDS))
+            await asyncio.wait({events, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                events.cancel()
+                break
+
+            body = b''.join(encode_event(event) for event in events.result()) or b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        subscription.close()
+        disconnected.cancel()
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
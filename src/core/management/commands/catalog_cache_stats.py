@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import catalog_cache
+
+
+class Command(BaseCommand):
+    """Django command to show the hits and misses of the food catalog cache,
+    estimated from the counted fraction of lookups"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after showing them')
+
+    def handle(self, *args, **options):
+        stats = catalog_cache.get_stats()
+        requests = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / requests if requests else 0
+        self.stdout.write(f'Hits: {stats["hits"]}')
+        self.stdout.write(f'Misses: {stats["misses"]}')
+        self.stdout.write(f'Hit ratio: {ratio:.1%}')
+
+        if options['reset']:
+            catalog_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.uploads import upload_backend
+
+
+class Command(BaseCommand):
+    """Django command to delete the direct uploads never used by an object"""
+
+    def handle(self, *args, **options):
+        deleted = upload_backend.delete_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired uploads'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from core.nutrition import update_recipe_calories
+
+
+class Command(BaseCommand):
+    """Django command to derive the calories of every recipe from its ingredients"""
+
+    def handle(self, *args, **options):
+        self.stdout.write('Deriving recipe calories...')
+        derived = update_recipe_calories(Recipe.objects.values_list('pk', flat=True))
+
+        self.stdout.write(self.style.SUCCESS(f'Derived calories of {len(derived)} recipes'))
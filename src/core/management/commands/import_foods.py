@@ -0,0 +1,151 @@
+import csv
+import io
+import json
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from core.cache import catalog_cache
+from core.models import User, BaseFood
+from meal.autocomplete import autocomplete
+from meal.serializers import FoodImportSerializer
+
+
+class Command(BaseCommand):
+    """Django command to import a food catalog from a CSV file with a header row,
+    or a JSON Lines file, with the name, calories and serving size of each food.
+
+    Rows are read and validated in chunks, so memory stays flat however large
+    the file is. Foods are upserted on their name among the foods of the user:
+    existing ones are updated, new ones inserted with COPY on PostgreSQL and
+    bulk_create elsewhere. Bulk writes send no model signals, so the caches
+    derived from foods are invalidated at the end."""
+    help = 'Import foods from a CSV or JSON Lines file'
+    # Fields written for new foods with COPY, in this order
+    COPY_FIELDS = (
+        'name', 'calories', 'serving_size', 'is_recipe', 'image_processed', 'usage_count', 'updated_at', 'user',
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path of the file, - for the standard input')
+        parser.add_argument('--user', required=True, help='Email of the user owning the imported foods')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Format of the file, by default its extension')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of rows written at once')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options['user']).first()
+        if user is None:
+            raise CommandError(f'No user with email {options["user"]}')
+
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+
+        self.use_copy = connection.vendor == 'postgresql'
+        self.counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'invalid': 0}
+        started = time.monotonic()
+        try:
+            rows = self.read_rows(file, file_format)
+            serializer = FoodImportSerializer()
+            read = 0
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+
+                foods = []
+                for row in chunk:
+                    read += 1
+                    try:
+                        foods.append(serializer.run_validation(row))
+                    except ValidationError as error:
+                        self.counts['invalid'] += 1
+                        self.stderr.write(f'Row {read}: {self.format_errors(error.detail)}')
+                self.write_chunk(user, foods)
+
+                self.stdout.write(
+                    f'{read} rows, ' + ', '.join(f'{count} {name}' for name, count in self.counts.items()) +
+                    f', {read / (time.monotonic() - started):.0f} rows/s'
+                )
+        except (csv.Error, json.JSONDecodeError) as error:
+            raise CommandError(f'Could not read {path}: {error}')
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+            if self.counts['created'] or self.counts['updated']:
+                autocomplete.invalidate()
+                catalog_cache.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.counts["created"]} new and {self.counts["updated"]} updated foods '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
+
+    def format_errors(self, detail):
+        if isinstance(detail, dict):
+            return '; '.join(f'{field}: {" ".join(map(str, errors))}' for field, errors in detail.items())
+
+        return ' '.join(map(str, detail))
+
+    def read_rows(self, file, file_format):
+        """Yield the rows of the file one at a time, as dicts"""
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+    def write_chunk(self, user, foods):
+        """Upsert the validated foods of a chunk in one transaction"""
+        # The last row of a name wins
+        foods = {food['name']: food for food in foods}
+        with transaction.atomic():
+            existing = {
+                name: (pk, calories, serving_size) for name, pk, calories, serving_size in BaseFood.objects.filter(
+                    user=user, recipe__isnull=True, name__in=list(foods),
+                ).order_by('pk').values_list('name', 'pk', 'calories', 'serving_size')
+            }
+
+            changed = []
+            for name, (pk, calories, serving_size) in existing.items():
+                food = foods.pop(name)
+                food.setdefault('serving_size', 100)
+                if (food['calories'], food['serving_size']) == (calories, serving_size):
+                    self.counts['unchanged'] += 1
+                else:
+                    changed.append(BaseFood(pk=pk, calories=food['calories'], serving_size=food['serving_size']))
+            # Goes through BaseFoodQuerySet.update, which keeps meal and recipe calories up to date
+            BaseFood.objects.bulk_update(changed, ['calories', 'serving_size'])
+            self.counts['updated'] += len(changed)
+
+            new_foods = [BaseFood(user=user, **food) for food in foods.values()]
+            if self.use_copy:
+                self.copy_foods(new_foods)
+            else:
+                BaseFood.objects.bulk_create(new_foods)
+            self.counts['created'] += len(new_foods)
+
+    def copy_foods(self, foods):
+        """Insert the foods with PostgreSQL COPY"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        updated_at = timezone.now().isoformat()
+        for food in foods:
+            writer.writerow([
+                food.name, food.calories, food.serving_size, 'f', 'f', 0, updated_at, food.user_id,
+            ])
+        buffer.seek(0)
+
+        opts = BaseFood._meta
+        columns = ', '.join(connection.ops.quote_name(opts.get_field(field).column) for field in self.COPY_FIELDS)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {connection.ops.quote_name(opts.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer,
+            )
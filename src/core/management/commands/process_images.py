@@ -0,0 +1,28 @@
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand
+
+from core import images
+from core.models import BaseFood
+from core.signals import IMAGE_FIELDS
+
+
+class Command(BaseCommand):
+    """Django command to process the pictures left unprocessed,
+    after an error or a restart while they were processed"""
+
+    def handle(self, *args, **options):
+        futures = []
+        for model, field_names in IMAGE_FIELDS.items():
+            for field_name in field_names:
+                pictures = model.objects.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+                pictures = pictures.filter(**{images.processed_field(field_name): False})
+                if model is BaseFood:
+                    # Recipes are processed as recipes
+                    pictures = pictures.filter(recipe__isnull=True)
+                for pk, name in pictures.values_list('pk', field_name).iterator():
+                    futures.append(images.executor.submit(images.process, model._meta.label, pk, field_name, name))
+
+        done, _ = wait(futures)
+        processed = sum(future.result() for future in done)
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} of {len(futures)} unprocessed images'))
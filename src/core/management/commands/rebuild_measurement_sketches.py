@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from measurement.sketches import rebuild_sketches
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the population sketches of measurement metrics"""
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding measurement sketches...')
+        sketches = rebuild_sketches()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(sketches)} sketches'))
@@ -0,0 +1,40 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:44
+
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def recompute_calories(apps, schema_editor):
+    """Calories are maintained incrementally from now on,
+    so start from totals matching the current meal contents"""
+    FoodAmount = apps.get_model('core', 'FoodAmount')
+    Meal = apps.get_model('core', 'Meal')
+    DailyMeal = apps.get_model('core', 'DailyMeal')
+
+    contents = FoodAmount.objects.filter(belongs_to_meal=OuterRef('pk')).values('belongs_to_meal').annotate(
+        total=Sum(F('amount') * F('food__calories'))
+    ).values('total')
+    Meal.objects.update(calories=Coalesce(Subquery(contents), 0))
+
+    def slot_calories(slot):
+        return Coalesce(Subquery(Meal.objects.filter(pk=OuterRef(slot)).values('calories')), 0)
+
+    DailyMeal.objects.update(
+        calories=slot_calories('breakfast') + slot_calories('lunch') + slot_calories('diner') + slot_calories('snack')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_measurement_usergoal'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='foodamount',
+            options={'base_manager_name': 'objects'},
+        ),
+        migrations.RunPython(recompute_calories, migrations.RunPython.noop),
+    ]
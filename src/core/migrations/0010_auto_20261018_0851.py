@@ -0,0 +1,17 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_food_amount_base_manager'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailymeal',
+            index=models.Index(fields=['user', 'date'], name='core_dailym_user_id_587f0a_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_auto_20261018_0851'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeightProjection',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_date', models.DateField(blank=True, null=True)),
+                ('last_weight', models.PositiveSmallIntegerField(default=0)),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('weight_sum', models.FloatField(default=0)),
+                ('intake_sum', models.FloatField(default=0)),
+                ('rate_sum', models.FloatField(default=0)),
+                ('intake_sq_sum', models.FloatField(default=0)),
+                ('intake_rate_sum', models.FloatField(default=0)),
+                ('rate_sq_sum', models.FloatField(default=0)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
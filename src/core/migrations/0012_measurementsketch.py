@@ -0,0 +1,25 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_weightprojection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeasurementSketch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=10)),
+                ('gender', models.CharField(choices=[('male', 'male'), ('female', 'female'), ('other', 'other')], max_length=6)),
+                ('sketch', models.TextField()),
+            ],
+            options={
+                'unique_together': {('metric', 'gender')},
+            },
+        ),
+    ]
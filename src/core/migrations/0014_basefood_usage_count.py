@@ -0,0 +1,33 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:04
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_usage(apps, schema_editor):
+    """Usage counts are maintained incrementally from now on,
+    so start from the counts of the current food amounts"""
+    BaseFood = apps.get_model('core', 'BaseFood')
+    FoodAmount = apps.get_model('core', 'FoodAmount')
+
+    usage = FoodAmount.objects.filter(food=OuterRef('pk')).values('food').annotate(
+        count=Count('pk')
+    ).values('count')
+    BaseFood.objects.update(usage_count=Coalesce(Subquery(usage), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_basefood_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basefood',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_usage, migrations.RunPython.noop),
+    ]
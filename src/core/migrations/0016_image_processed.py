@@ -0,0 +1,28 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basefood',
+            name='image_processed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='measurement',
+            name='image_processed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_processed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
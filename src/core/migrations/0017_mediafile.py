@@ -0,0 +1,40 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:34
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    """References are counted incrementally from now on,
+    so start from the pictures of the current objects"""
+    MediaFile = apps.get_model('core', 'MediaFile')
+    references = Counter()
+    for model_name, field_name in (('User', 'profile_picture'), ('BaseFood', 'image'), ('Measurement', 'image')):
+        names = apps.get_model('core', model_name).objects.exclude(**{f'{field_name}__isnull': True}).exclude(
+            **{field_name: ''}
+        ).values_list(field_name, flat=True)
+        references.update(names.iterator())
+
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name, references=count) for name, count in references.items()], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_image_processed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('references', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_mediafile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basefood',
+            name='barcode',
+            field=models.CharField(blank=True, max_length=14, null=True, unique=True),
+        ),
+    ]
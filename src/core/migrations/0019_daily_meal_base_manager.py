@@ -0,0 +1,17 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:56
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_basefood_barcode'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='dailymeal',
+            options={'base_manager_name': 'objects'},
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:58
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+MEALS = ('breakfast', 'lunch', 'diner', 'snack')
+
+
+def merge_daily_meals(apps, schema_editor):
+    """Merge the daily meals of a user and date into the first of them. Meals
+    taking a slot which the first one already fills are moved into its meal"""
+    DailyMeal = apps.get_model('core', 'DailyMeal')
+    Meal = apps.get_model('core', 'Meal')
+    FoodAmount = apps.get_model('core', 'FoodAmount')
+
+    duplicates = DailyMeal.objects.values('user', 'date').annotate(count=Count('pk')).filter(count__gt=1)
+    for duplicate in duplicates:
+        kept, *merged = DailyMeal.objects.filter(user=duplicate['user'], date=duplicate['date']).order_by('pk')
+        emptied = set()
+        for daily_meal in merged:
+            for name in MEALS:
+                meal_id = getattr(daily_meal, f'{name}_id')
+                kept_id = getattr(kept, f'{name}_id')
+                if meal_id is None or meal_id == kept_id:
+                    continue
+                if kept_id is None:
+                    setattr(kept, f'{name}_id', meal_id)
+                    continue
+
+                calories = Meal.objects.filter(pk=meal_id).values_list('calories', flat=True).get()
+                FoodAmount.objects.filter(belongs_to_meal=meal_id).update(belongs_to_meal=kept_id)
+                Meal.objects.filter(pk=kept_id).update(calories=F('calories') + calories)
+                emptied.add(meal_id)
+
+            kept.water_glasses += daily_meal.water_glasses
+            # Deleting the daily meal leaves its meals
+            daily_meal.delete()
+
+        meal_ids = [getattr(kept, f'{name}_id') for name in MEALS]
+        calories = dict(Meal.objects.filter(pk__in=meal_ids).values_list('pk', 'calories'))
+        kept.calories = sum(calories.get(meal_id, 0) for meal_id in meal_ids)
+        kept.save()
+
+        # Deleting a meal deletes the daily meals holding it
+        held = Q()
+        for name in MEALS:
+            held |= Q(**{f'{name}__in': emptied})
+        for meal_ids in DailyMeal.objects.filter(held).values_list(*MEALS):
+            emptied -= set(meal_ids)
+        Meal.objects.filter(pk__in=emptied).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_daily_meal_base_manager'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_daily_meals, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='dailymeal',
+            name='core_dailym_user_id_587f0a_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='dailymeal',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_daily_meal_per_day'),
+        ),
+    ]
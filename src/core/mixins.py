@@ -0,0 +1,191 @@
+import hashlib
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from core.cache import catalog_cache, response_cache
+from core.fields import ImageVariantsField, UploadKeyField
+from core.uploads import upload_backend
+
+
+class ConditionalGetMixin:
+    """Mixin answering list and retrieve requests with 304 Not Modified when
+    the client's copy is current, without serializing anything.
+
+    The validators of a response are computed from the rows it is built from:
+    the latest updated_at and the number of rows, in one aggregate query.
+    A deleted row changes the count and any other write changes updated_at.
+    Deleting a row may leave the latest updated_at unchanged, so list
+    responses have no Last-Modified and are only validated by their ETag.
+
+    With cache_retrieve, detail responses are kept in core.cache.response_cache
+    and answered without a query while their object is unchanged. With
+    cache_catalog, responses for all users' objects are kept in
+    core.cache.catalog_cache and validated by the catalog generation."""
+    updated_field = 'updated_at'
+    cache_retrieve = False
+    cache_catalog = False
+
+    def list(self, request, *args, **kwargs):
+        if self.is_catalog_request():
+            return self.catalog_response(super().list, *args, **kwargs)
+
+        etag, last_modified = self.get_validators(self.filter_queryset(self.get_queryset()))
+        return self.respond(etag, None, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.is_catalog_request():
+            return self.catalog_response(super().retrieve, *args, **kwargs)
+
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        queryset = self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: lookup})
+        if self.cache_retrieve:
+            return self.cached_response(queryset, lookup, super().retrieve, *args, **kwargs)
+
+        return self.conditional_response(queryset, super().retrieve, *args, **kwargs)
+
+    def get_validators(self, queryset):
+        """Return the ETag and last modification timestamp of the response built from the queryset"""
+        state = queryset.order_by().aggregate(updated=Max(self.updated_field), count=Count('pk'))
+        updated = state['updated']
+        request = self.request
+        etag = hashlib.md5('|'.join([
+            str(request.user.pk),
+            request.get_full_path(),
+            request.accepted_media_type,
+            str(state['count']),
+            updated.isoformat() if updated else '',
+        ]).encode()).hexdigest()
+
+        return f'"{etag}"', int(updated.timestamp()) if updated else None
+
+    def conditional_response(self, queryset, view, *args, **kwargs):
+        """Return 304 Not Modified if the client's copy is current, the response of the view otherwise"""
+        etag, last_modified = self.get_validators(queryset)
+        return self.respond(etag, last_modified, view, *args, **kwargs)
+
+    def cached_response(self, queryset, lookup, view, *args, **kwargs):
+        """Return the conditional response of the object from the response cache,
+        or from the view and cache it"""
+        try:
+            pk = int(lookup)
+        except ValueError:
+            return self.conditional_response(queryset, view, *args, **kwargs)
+
+        request = self.request
+        key = (queryset.model, pk, request.user.pk, f'{request.accepted_media_type}|{request.get_full_path()}')
+        version, entry = response_cache.get(*key)
+        if entry is not None:
+            return self.respond(entry['etag'], entry['last_modified'], lambda *args, **kwargs: Response(entry['data']))
+
+        etag, last_modified = self.get_validators(queryset)
+        response = self.respond(etag, last_modified, view, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.set(*key, version, {'data': response.data, 'etag': etag, 'last_modified': last_modified})
+
+        return response
+
+    def is_catalog_request(self):
+        """Return whether the request is for the objects of all users, which are the same for every user"""
+        return self.cache_catalog and bool(int(self.request.query_params.get('all', 0)))
+
+    def catalog_response(self, view, *args, **kwargs):
+        """Return the conditional response of a catalog request from the catalog cache,
+        or from the view and cache it"""
+        request = self.request
+        # Image URLs are absolute, so responses vary by host
+        key = f'{self.queryset.model._meta.label_lower}|{request.accepted_media_type}|{request.build_absolute_uri()}'
+        generation = catalog_cache.get_generation()
+        etag = hashlib.md5(f'{generation}|{key}'.encode()).hexdigest()
+
+        def cached_view(*args, **kwargs):
+            responses = []
+
+            def build():
+                responses.append(view(request, *args, **kwargs))
+                return responses[0].data if responses[0].status_code == 200 else None
+
+            data = catalog_cache.get_or_set(generation, key, build)
+            return responses[0] if responses else Response(data)
+
+        return self.respond(f'"{etag}"', None, cached_view, *args, **kwargs)
+
+    def respond(self, etag, last_modified, view, *args, **kwargs):
+        """Return 304 Not Modified if the client's copy matches the validators,
+        the response of the view with the validators otherwise"""
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+
+        response = view(self.request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+
+        return response
+
+
+class ImageVariantsMixin:
+    """Serializer mixin adding the URLs of the processed variants of image fields
+    as <field>_variants, see core.images. Lists show the variants only, so they
+    never point at the uploaded originals"""
+    image_fields = ()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for field_name in self.image_fields:
+            fields[f'{field_name}_variants'] = ImageVariantsField(field_name)
+
+        return fields
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if isinstance(self.parent, serializers.ListSerializer):
+            for field_name in self.image_fields:
+                data.pop(field_name, None)
+
+        return data
+
+
+class DirectUploadMixin:
+    """Serializer mixin accepting the key of a direct upload as <field>_upload
+    in place of the file of each image field, see core.uploads. Used uploads
+    are deleted once the object is saved"""
+    image_fields = ()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for field_name in self.image_fields:
+            fields[f'{field_name}_upload'] = UploadKeyField()
+
+        return fields
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        for field_name in self.image_fields:
+            if f'{field_name}_upload' in attrs:
+                attrs[field_name] = attrs.pop(f'{field_name}_upload')
+
+        return attrs
+
+    def save(self, **kwargs):
+        uploads = [
+            self.validated_data[field_name] for field_name in self.image_fields
+            if hasattr(self.validated_data.get(field_name), 'upload_key')
+        ]
+        try:
+            instance = super().save(**kwargs)
+        finally:
+            for file in uploads:
+                file.close()
+
+        for file in uploads:
+            transaction.on_commit(lambda key=file.upload_key: upload_backend.delete(key))
+
+        return instance
@@ -1,10 +1,18 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 from datetime import date
 import uuid
 import os
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core import images
+from core.cache import catalog_cache, response_cache
 
 
 def profile_picture_file_path(instance, filename):
@@ -29,7 +37,30 @@ def measurement_picture_file_path(instance, filename):
 
     return os.path.join('uploads/measurement_picture/', filename)
 
-class UserManager(BaseUserManager):
+
+class UserQuerySet(models.QuerySet):
+    """Bulk updates revoke the cached tokens of the users, like saving them,
+    see core.authentication"""
+
+    def update(self, **kwargs):
+        if kwargs.keys() == {'last_login'}:
+            return super().update(**kwargs)
+
+        from core.authentication import token_cache
+        user_ids = list(self.values_list('pk', flat=True))
+        with transaction.atomic(using=self.db):
+            rows = super().update(**kwargs)
+
+            def revoke():
+                for user_id in user_ids:
+                    token_cache.revoke_user(user_id)
+
+            transaction.on_commit(revoke, using=self.db)
+
+        return rows
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """Custom user manager"""
     def create_user(self, email, password=None, **extra_fields):
         """Create and save a new custom user"""
@@ -73,6 +104,8 @@ class User(AbstractBaseUser, PermissionsMixin):
         default=OTHER,
     )
     profile_picture = models.ImageField(blank=True, null=True, upload_to=profile_picture_file_path)
+    # Whether the variants of the picture are written, see core.images
+    profile_picture_processed = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
 
@@ -99,44 +132,288 @@ class Measurement(models.Model):
     hips  = models.PositiveSmallIntegerField(default=0)
     thigh = models.PositiveSmallIntegerField(default=0)
     image = models.ImageField(blank=True, null=True, upload_to=measurement_picture_file_path)
+    image_processed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
+
 
 class UserGoal(models.Model):
     """Class used to hold user goals
     currently only hosting current and goal weight"""
     current_weight  = models.PositiveSmallIntegerField(default=0)
     goal_weight = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
 
+
+class WeightProjectionQuerySet(models.QuerySet):
+    """Marks fits stale when the intake they were fitted on changes, see measurement.projection"""
+
+    def intake_changed(self, days):
+        """Mark stale the fits over any of the (user id, date) days whose logged calories changed"""
+        first_days = {}
+        for user_id, day in days:
+            first_days[user_id] = min(day, first_days.get(user_id, day))
+
+        # The interval ending with the last measurement does not include its day
+        condition = models.Q()
+        for user_id, day in first_days.items():
+            condition |= models.Q(user=user_id, last_date__gt=day)
+        if condition:
+            self.filter(condition, is_stale=False).update(is_stale=True)
+
+
+class WeightProjection(models.Model):
+    """Class holding the weighted sums of a user's weight regression,
+    updated with every new measurement, see measurement.projection"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    last_date = models.DateField(blank=True, null=True)
+    last_weight = models.PositiveSmallIntegerField(default=0)
+    samples = models.PositiveIntegerField(default=0)
+    weight_sum = models.FloatField(default=0)
+    intake_sum = models.FloatField(default=0)
+    rate_sum = models.FloatField(default=0)
+    intake_sq_sum = models.FloatField(default=0)
+    intake_rate_sum = models.FloatField(default=0)
+    rate_sq_sum = models.FloatField(default=0)
+    is_stale = models.BooleanField(default=False)
+
+    objects = WeightProjectionQuerySet.as_manager()
+
+
+class MeasurementSketch(models.Model):
+    """Class holding the quantile sketch of a measurement metric
+    over all users of a gender, see measurement.sketches"""
+    metric = models.CharField(max_length=10)
+    gender = models.CharField(max_length=6, choices=User.GENDERS)
+    sketch = models.TextField()
+
+    class Meta:
+        unique_together = ('metric', 'gender')
+
+
+class MediaFile(models.Model):
+    """Class counting the objects referencing an uploaded file. With content
+    addressed storage, the same file is shared by all uploads of its content,
+    see core.storage. A file without references is deleted by delete_media()"""
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
+class BaseFoodQuerySet(models.QuerySet):
+    """Keeps meal and recipe calories and updated_at up to date on bulk updates,
+    which do not send model signals, and invalidates the catalog cache and
+    the autocomplete index"""
+    NUTRITION_FIELDS = {'calories', 'serving_size'}
+    # Fields which are not part of the food's representation
+    UNTRACKED_FIELDS = {'usage_count'}
+    # Fields of the autocomplete index, see meal.autocomplete
+    AUTOCOMPLETE_FIELDS = {'name', 'user', 'user_id'}
+
+    def update(self, **kwargs):
+        if kwargs.keys() - self.UNTRACKED_FIELDS:
+            kwargs.setdefault('updated_at', timezone.now())
+            catalog_cache.invalidate()
+        if self.AUTOCOMPLETE_FIELDS & kwargs.keys():
+            from meal.autocomplete import autocomplete
+
+            autocomplete.invalidate()
+        if not self.NUTRITION_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+
+        from core.nutrition import update_recipe_calories
+
+        food_ids = list(self.values_list('pk', flat=True))
+        # Writes keeping derived data up to date never recover from an error,
+        # so they join the caller's transaction without a savepoint
+        with transaction.atomic(using=self.db, savepoint=False):
+            with track_meal_calories(FoodAmount.objects.filter(food__in=food_ids)):
+                rows = super().update(**kwargs)
+            update_recipe_calories(food_ids)
+
+        return rows
+
+    def set_derived_calories(self, calories, stored):
+        """Store derived recipe calories given by food id in place of the stored ones.
+        Keeps meal calories up to date, but does not derive the recipes containing
+        these foods again"""
+        amounts = FoodAmount.objects.filter(food__in=list(calories), belongs_to_meal__isnull=False).values(
+            'belongs_to_meal', 'food',
+        ).annotate(amount=models.Sum('amount')).order_by()
+        catalog_cache.invalidate()
+        with transaction.atomic(using=self.db, savepoint=False):
+            added = defaultdict(int)
+            for row in amounts:
+                added[row['belongs_to_meal']] += row['amount'] * (calories[row['food']] - stored[row['food']])
+            rows = super().update(calories=models.Case(
+                *[models.When(pk=pk, then=value) for pk, value in calories.items()],
+                output_field=models.PositiveSmallIntegerField(),
+            ), updated_at=timezone.now())
+            add_meal_calories({}, added)
+
+        return rows
+
+
 class BaseFood(models.Model):
     """Base food class to be used for a simple food and recipes"""
     name = models.CharField(max_length=255)
     calories = models.PositiveSmallIntegerField(default=0)
     serving_size = models.PositiveSmallIntegerField(default=100)
+    # Normalized EAN or UPC code of packaged foods, see meal.barcodes
+    barcode = models.CharField(max_length=14, blank=True, null=True, unique=True)
     image = models.ImageField(blank=True, null=True, upload_to=food_picture_file_path)
+    image_processed = models.BooleanField(default=False)
     is_recipe = models.BooleanField(default=False)
+    # Number of food amounts of this food, maintained by core.signals
+    usage_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
 
+    objects = BaseFoodQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Save within a transaction, which holds the lock taken on the usage count, see core.signals"""
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """Delete the food amounts of the food and of the recipe in bulk
+        rather than one at a time with the cascade"""
+        with transaction.atomic(savepoint=False):
+            FoodAmount.objects.filter(models.Q(food=self.pk) | models.Q(belongs_to_recipe=self.pk)).delete()
+            return super().delete(*args, **kwargs)
+
 
 class Recipe(BaseFood):
     """Recipe class used for standard meal recipes"""
     instructions = models.TextField(blank=True)
 
 
+def assigned_ids(kwargs, field):
+    """Return the primary keys a bulk update sets the foreign key to, none when it
+    sets it to null, or None when the new value is only known after the update"""
+    value = kwargs.get(field, kwargs.get(f'{field}_id'))
+    value = getattr(value, 'pk', value)
+    if value is None:
+        return set()
+
+    return {value} if isinstance(value, int) else None
+
+
+class FoodAmountQuerySet(models.QuerySet):
+    """Keeps meal and recipe calories, food usage counts and updated_at
+    up to date on bulk inserts, updates and deletes, which do not send model signals"""
+    MEAL_CALORIES_FIELDS = {'amount', 'food', 'food_id', 'belongs_to_meal', 'belongs_to_meal_id'}
+    MEAL_FIELDS = {'belongs_to_meal', 'belongs_to_meal_id'}
+    RECIPE_CALORIES_FIELDS = {'amount', 'food', 'food_id', 'belongs_to_recipe', 'belongs_to_recipe_id'}
+    RECIPE_FIELDS = {'belongs_to_recipe', 'belongs_to_recipe_id'}
+    USAGE_FIELDS = {'food', 'food_id'}
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from core.nutrition import update_recipe_calories
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+
+            meal_objs = [obj for obj in objs if obj.belongs_to_meal_id]
+            if meal_objs:
+                food_calories = dict(
+                    BaseFood.objects.filter(pk__in={obj.food_id for obj in meal_objs}).values_list('pk', 'calories')
+                )
+                added = defaultdict(int)
+                for obj in meal_objs:
+                    added[obj.belongs_to_meal_id] += obj.amount * food_calories[obj.food_id]
+                add_meal_calories({}, added)
+
+            update_recipe_calories({obj.belongs_to_recipe_id for obj in objs if obj.belongs_to_recipe_id}, touch=True)
+            add_food_usage({}, Counter(obj.food_id for obj in objs))
+
+        return objs
+
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', timezone.now())
+        if not (self.MEAL_CALORIES_FIELDS | self.RECIPE_CALORIES_FIELDS | self.USAGE_FIELDS) & kwargs.keys():
+            return super().update(**kwargs)
+
+        from core.nutrition import update_recipe_calories
+
+        food_amounts = FoodAmount.objects.filter(pk__in=list(self.values_list('pk', flat=True)))
+        recipes = food_amounts.filter(belongs_to_recipe__isnull=False).values_list('belongs_to_recipe', flat=True)
+        updates_meals = self.MEAL_CALORIES_FIELDS & kwargs.keys()
+        updates_recipes = self.RECIPE_CALORIES_FIELDS & kwargs.keys()
+        updates_usage = bool(self.USAGE_FIELDS & kwargs.keys())
+        # Meal and recipe the food amounts are moved to, when nothing else changes
+        new_meal_ids = assigned_ids(kwargs, 'belongs_to_meal') if updates_meals <= self.MEAL_FIELDS else None
+        new_recipe_ids = assigned_ids(kwargs, 'belongs_to_recipe') if updates_recipes <= self.RECIPE_FIELDS else None
+        with transaction.atomic(using=self.db, savepoint=False):
+            # Recipes the food amounts belong to and food usage before and after the update
+            recipe_ids = set(recipes.all()) if updates_recipes else set()
+            usage = food_usage(food_amounts) if updates_usage else {}
+            if not updates_meals:
+                rows = super().update(**kwargs)
+            elif new_meal_ids is not None:
+                # Moved food amounts take their calories along
+                totals = dict(food_amounts.values('belongs_to_meal').annotate(
+                    total=models.Sum(models.F('amount') * models.F('food__calories'))
+                ).order_by().values_list('belongs_to_meal', 'total'))
+                moved = {meal_id: sum(totals.values()) for meal_id in new_meal_ids} if totals else {}
+                totals.pop(None, None)
+                rows = super().update(**kwargs)
+                add_meal_calories(totals, moved)
+            else:
+                with track_meal_calories(food_amounts):
+                    rows = super().update(**kwargs)
+            if new_recipe_ids is not None:
+                recipe_ids.update(new_recipe_ids if rows else ())
+            elif updates_recipes:
+                recipe_ids.update(recipes.all())
+            update_recipe_calories(recipe_ids, touch=True)
+            if updates_usage:
+                add_food_usage(usage, food_usage(food_amounts))
+
+        return rows
+
+    def delete(self):
+        from core.nutrition import update_recipe_calories
+
+        food_amounts = FoodAmount.objects.filter(pk__in=list(self.values_list('pk', flat=True)))
+        recipes = food_amounts.filter(belongs_to_recipe__isnull=False).values_list('belongs_to_recipe', flat=True)
+        with transaction.atomic(using=self.db, savepoint=False):
+            recipe_ids = set(recipes)
+            usage = food_usage(food_amounts)
+            with track_meal_calories(food_amounts):
+                # No row references food amounts, so nothing needs to be collected
+                deleted = food_amounts._raw_delete(food_amounts.db)
+            update_recipe_calories(recipe_ids, touch=True)
+            add_food_usage(usage, {})
+
+        return deleted, {FoodAmount._meta.label: deleted}
+
+
 class FoodAmount(models.Model):
     """Class used to quantify food"""
     food = models.ForeignKey(
@@ -158,26 +435,90 @@ class FoodAmount(models.Model):
         null=True,
         blank=True,
     )
+    updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
 
+    objects = FoodAmountQuerySet.as_manager()
+
+    class Meta:
+        # Related managers use the base manager for bulk updates
+        base_manager_name = 'objects'
+
     def __str__(self):
         return f'{self.amount} x {self.food.name}'
 
 
 class Meal(models.Model):
-    """Class for breakfast, lunch, diner and snacks"""
+    """Class for breakfast, lunch, diner and snacks.
+    Calories are maintained from the meal contents, see core.signals"""
     calories = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Save within a transaction, which holds the lock taken on the meal's calories, see core.signals"""
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """Delete the meal contents in bulk rather than one at a time with the cascade"""
+        with transaction.atomic(savepoint=False):
+            FoodAmount.objects.filter(belongs_to_meal=self.pk).delete()
+            return super().delete(*args, **kwargs)
+
+
+class DailyMealQuerySet(models.QuerySet):
+    """Keeps daily meal calories and updated_at up to date on bulk updates
+    of the meal slots, which do not send model signals, and the weight
+    projections fitted over the days whose calories changed"""
+    MEAL_FIELDS = ('breakfast', 'lunch', 'diner', 'snack')
+
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', timezone.now())
+        slots_changed = bool(set(self.MEAL_FIELDS) & kwargs.keys())
+        if not slots_changed and 'date' not in kwargs:
+            return super().update(**kwargs)
+
+        def slot_calories(field):
+            meals = Meal.objects.filter(pk=models.OuterRef(field)).values('calories')[:1]
+            return Coalesce(models.Subquery(meals), 0)
+
+        stored = list(self.values_list('pk', 'user', 'date'))
+        daily_meals = DailyMeal.objects.filter(pk__in=[pk for pk, user_id, day in stored])
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = super().update(**kwargs)
+            if slots_changed:
+                # The slots are read after they are written, so in a second UPDATE
+                daily_meals.update(calories=(
+                    slot_calories('breakfast') + slot_calories('lunch') +
+                    slot_calories('diner') + slot_calories('snack')
+                ))
+
+            from core import live
+
+            daily_meal_rows = list(daily_meals.values('user', *live.DAILY_MEAL_FIELDS))
+            days = [(user_id, day) for pk, user_id, day in stored]
+            WeightProjection.objects.intake_changed(days + [(row['user'], row['date']) for row in daily_meal_rows])
+            response_cache.invalidate(DailyMeal, [row['id'] for row in daily_meal_rows])
+            live.publish_rows('daily_meal', daily_meal_rows)
+
+        return rows
+
 
 class DailyMeal(models.Model):
-    """Class containing all of users meals for one day"""
+    """Class containing all of users meals for one day, one per user and date.
+    Calories are maintained from the meals, see core.signals"""
     date = models.DateField(default=date.today)
     calories = models.PositiveSmallIntegerField(default=0)
     breakfast = models.ForeignKey(
@@ -212,4 +553,137 @@ class DailyMeal(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
-    water_glasses = models.PositiveSmallIntegerField(default=0)
\ No newline at end of file
+    water_glasses = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = DailyMealQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        """Save within a transaction, which holds the lock taken on the calories of the meals, see core.signals"""
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    class Meta:
+        # Related managers use the base manager for bulk updates
+        base_manager_name = 'objects'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_daily_meal_per_day'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
+
+
+def meal_calories(food_amounts):
+    """Return the calories the given food amounts add to each meal, by meal id"""
+    totals = food_amounts.filter(belongs_to_meal__isnull=False).values('belongs_to_meal').annotate(
+        total=models.Sum(models.F('amount') * models.F('food__calories'))
+    ).order_by()
+
+    return {row['belongs_to_meal']: row['total'] for row in totals}
+
+
+def add_meal_calories(before, after):
+    """Apply the difference between two meal_calories() results to the calories
+    of the meals and of the daily meals holding them, in one UPDATE for each.
+    Every meal in the results has its contents changed, so it is marked updated,
+    its cached responses invalidated and its new totals published to the live
+    events of its user even when its calories stay the same"""
+    meals_by_delta = defaultdict(list)
+    for meal_id in before.keys() | after.keys():
+        meals_by_delta[after.get(meal_id, 0) - before.get(meal_id, 0)].append(meal_id)
+    if not meals_by_delta:
+        return
+
+    def delta_of(field):
+        """Return the expression for the calorie delta of the meal referenced by field"""
+        return models.Case(
+            *[models.When(**{f'{field}__in': meal_ids}, then=delta) for delta, meal_ids in meals_by_delta.items()],
+            default=0,
+            output_field=models.IntegerField(),
+        )
+
+    meal_ids = [meal_id for meal_ids in meals_by_delta.values() for meal_id in meal_ids]
+    updated_at = timezone.now()
+    Meal.objects.filter(pk__in=meal_ids).update(calories=models.F('calories') + delta_of('pk'), updated_at=updated_at)
+    daily_meals = DailyMeal.objects.filter(
+        models.Q(breakfast__in=meal_ids) |
+        models.Q(lunch__in=meal_ids) |
+        models.Q(diner__in=meal_ids) |
+        models.Q(snack__in=meal_ids)
+    )
+    daily_meals.update(calories=(
+        models.F('calories') +
+        delta_of('breakfast') + delta_of('lunch') + delta_of('diner') + delta_of('snack')
+    ), updated_at=updated_at)
+
+    from core import live
+
+    meal_rows = list(Meal.objects.filter(pk__in=meal_ids).values('user', *live.MEAL_FIELDS))
+    daily_meal_rows = list(daily_meals.values('user', *live.DAILY_MEAL_FIELDS))
+    response_cache.invalidate(Meal, meal_ids)
+    response_cache.invalidate(DailyMeal, [row['id'] for row in daily_meal_rows])
+    WeightProjection.objects.intake_changed((row['user'], row['date']) for row in daily_meal_rows)
+    live.publish_rows('meal', meal_rows)
+    live.publish_rows('daily_meal', daily_meal_rows)
+
+
+def food_usage(food_amounts):
+    """Return how many of the given food amounts there are of each food, by food id"""
+    return dict(food_amounts.values('food').annotate(count=models.Count('pk')).order_by().values_list('food', 'count'))
+
+
+def add_food_usage(before, after):
+    """Apply the difference between two food_usage() results to the usage counts of the foods"""
+    deltas = {food_id: after.get(food_id, 0) - before.get(food_id, 0) for food_id in before.keys() | after.keys()}
+    deltas = {food_id: delta for food_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    BaseFood.objects.filter(pk__in=list(deltas)).update(usage_count=models.F('usage_count') + models.Case(
+        *[models.When(pk=food_id, then=delta) for food_id, delta in deltas.items()],
+        default=0,
+        output_field=models.IntegerField(),
+    ))
+
+
+@contextmanager
+def track_meal_calories(food_amounts):
+    """Apply the meal calorie changes caused by writes to the given food amounts
+    made inside the block"""
+    with transaction.atomic(using=food_amounts.db, savepoint=False):
+        before = meal_calories(food_amounts)
+        yield
+        add_meal_calories(before, meal_calories(food_amounts))
+
+
+def retain_media(name):
+    """Count a new reference to the uploaded file"""
+    files = MediaFile.objects.filter(name=name)
+    with transaction.atomic():
+        if not files.update(references=models.F('references') + 1):
+            # A concurrent first reference may have created the row
+            MediaFile.objects.bulk_create([MediaFile(name=name, references=0)], ignore_conflicts=True)
+            files.update(references=models.F('references') + 1)
+
+
+def release_media(name):
+    """Drop a reference to the uploaded file, and delete the file and its image variants
+    once the current transaction commits when it was the last one"""
+    files = MediaFile.objects.filter(name=name)
+    with transaction.atomic():
+        files.filter(references__gt=0).update(references=models.F('references') - 1)
+        unreferenced = files.filter(references=0).exists()
+    if unreferenced:
+        transaction.on_commit(lambda: delete_media(name))
+
+
+def delete_media(name):
+    """Delete the uploaded file and its image variants if it is still unreferenced.
+    The row is kept at zero references until then, so a new reference or a new
+    upload of the same content, see core.storage, is seen under its lock"""
+    with transaction.atomic():
+        media_file = MediaFile.objects.select_for_update().filter(name=name, references=0).first()
+        if media_file is not None:
+            images.delete(default_storage, name)
+            media_file.delete()
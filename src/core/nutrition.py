@@ -0,0 +1,115 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import BaseFood, Recipe, FoodAmount
+
+
+# Recipe calories
+#
+# A recipe with ingredients has its calories derived from them: the calories
+# of all ingredients, scaled from the total weight of the ingredients to the
+# serving_size of the recipe. Ingredients can be recipes themselves, so the
+# recipes form a graph which has to stay acyclic.
+#
+# The derived calories are stored in Recipe.calories, which serves as the
+# cache of the evaluation. When a food or an ingredient changes, only the
+# recipes containing it, directly or through other recipes, are evaluated
+# again and stored. A food no food amount refers to, such as a new recipe,
+# is in no recipe, so BaseFood.usage_count spares walking up the graph from it.
+
+MAX_CALORIES = 32767
+
+
+class RecipeCycleError(ValueError):
+    """Raised when a recipe contains itself through its ingredients"""
+
+
+def recipe_ancestors(food_ids):
+    """Return the ids of every recipe containing one of the given foods,
+    directly or through other recipes. Runs one query per level of the graph"""
+    ancestors = set()
+    level = set(food_ids)
+    while level:
+        level = set(FoodAmount.objects.filter(
+            food__in=level,
+            belongs_to_recipe__isnull=False,
+        ).values_list('belongs_to_recipe', flat=True)) - ancestors
+        ancestors |= level
+
+    return ancestors
+
+
+def creates_cycle(recipe_id, food_ids):
+    """Check if adding the given foods as ingredients of the recipe creates a cycle"""
+    return bool(set(food_ids) & (recipe_ancestors([recipe_id]) | {recipe_id}))
+
+
+def derive_recipe_calories(recipe_ids):
+    """Return the derived and the stored calories of the given recipes, by recipe id.
+    Ingredients that are recipes outside of recipe_ids count with their stored
+    calories, and recipes without ingredients keep their stored calories"""
+    recipes = {
+        pk: (calories, serving_size)
+        for pk, calories, serving_size in Recipe.objects.filter(
+            pk__in=recipe_ids,
+        ).values_list('pk', 'calories', 'serving_size')
+    }
+    ingredients = defaultdict(list)
+    for recipe_id, food_id, amount, calories, serving_size in FoodAmount.objects.filter(
+        belongs_to_recipe__in=recipes.keys(),
+    ).values_list('belongs_to_recipe', 'food', 'amount', 'food__calories', 'food__serving_size'):
+        ingredients[recipe_id].append((food_id, amount, calories, serving_size))
+
+    derived = {}
+    evaluating = set()
+
+    def evaluate(recipe_id):
+        if recipe_id in derived:
+            return derived[recipe_id]
+        if recipe_id in evaluating:
+            raise RecipeCycleError(f'Recipe {recipe_id} contains itself')
+
+        evaluating.add(recipe_id)
+        total_calories = 0
+        total_weight = 0
+        for food_id, amount, calories, serving_size in ingredients[recipe_id]:
+            if food_id in recipes:
+                calories = evaluate(food_id)
+            total_calories += amount * calories
+            total_weight += amount * serving_size
+        evaluating.remove(recipe_id)
+
+        calories, serving_size = recipes[recipe_id]
+        if total_weight:
+            calories = min(round(total_calories * serving_size / total_weight), MAX_CALORIES)
+        derived[recipe_id] = calories
+
+        return calories
+
+    for recipe_id in recipes:
+        evaluate(recipe_id)
+
+    return derived, {pk: calories for pk, (calories, serving_size) in recipes.items()}
+
+
+def update_recipe_calories(food_ids, touch=False):
+    """Derive and store the calories of the given foods that are recipes
+    and of every recipe containing one of the given foods. With touch, the
+    given foods had their ingredients changed and are marked updated as well"""
+    food_ids = set(food_ids)
+    if not food_ids:
+        return {}
+
+    with transaction.atomic(savepoint=False):
+        used = BaseFood.objects.filter(pk__in=food_ids, usage_count__gt=0).values_list('pk', flat=True)
+        recipe_ids = recipe_ancestors(list(used)) | food_ids
+        derived, stored = derive_recipe_calories(recipe_ids)
+        changed = {pk: calories for pk, calories in derived.items() if calories != stored[pk]}
+        if changed:
+            BaseFood.objects.filter(pk__in=changed.keys()).set_derived_calories(changed, stored)
+        if touch and food_ids - changed.keys():
+            BaseFood.objects.filter(pk__in=food_ids - changed.keys()).update(updated_at=timezone.now())
+
+    return derived
@@ -0,0 +1,211 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination keyed on every column of the queryset ordering.
+
+    The ordering is taken from the queryset built by the view, which may order
+    on annotations as well, and the primary key is appended when none of the
+    ordering columns is unique, so rows with equal sort values are still paged
+    in a stable order. Every page is fetched with a WHERE clause on the last
+    seen row instead of an OFFSET, so deep pages cost the same as the first one."""
+    cursor_query_param = 'cursor'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+        self.annotations = set(queryset.query.annotations)
+        self.converters = [self.get_converter(queryset, name) for name, descending in self.ordering]
+        position, reverse = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*[
+            ('-' if descending != reverse else '') + name
+            for name, descending in self.ordering
+        ])
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        """Return the page size requested by the client, capped by max_page_size"""
+        if self.page_size_query_param:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+                if page_size > 0:
+                    return min(page_size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        """Return the queryset ordering as a list of (field name, descending) pairs"""
+        opts = queryset.model._meta
+        ordering = []
+        is_unique = False
+        for term in (queryset.query.order_by or opts.ordering):
+            name = term.lstrip('-')
+            ordering.append((name, term.startswith('-')))
+            if name == 'pk':
+                is_unique = True
+                continue
+            if name in queryset.query.annotations:
+                continue
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                raise ValueError(f'Keyset pagination cannot order on "{name}"')
+            is_unique = is_unique or field.primary_key or field.unique
+
+        if not is_unique:
+            descending = ordering[0][1] if ordering else True
+            ordering.append(('pk', descending))
+
+        return ordering
+
+    def get_converter(self, queryset, name):
+        """Return the function converting a cursor value of the ordering column to a query value"""
+        if name in queryset.query.annotations:
+            try:
+                field = queryset.query.annotations[name].output_field
+            except FieldError:
+                return float
+            if isinstance(field, (models.IntegerField, models.AutoField)):
+                return int
+            if isinstance(field, models.FloatField):
+                return float
+        elif name == 'pk':
+            field = queryset.model._meta.pk
+        else:
+            field = queryset.model._meta.get_field(name)
+
+        return field.to_python
+
+    def get_keyset_filter(self, position, reverse):
+        """Return a filter selecting the rows that come after the given position.
+        (a, b) > (x, y) is expanded into a > x OR (a = x AND b > y)"""
+        keyset_filter = Q()
+        equal = {}
+        for (name, descending), value in zip(self.ordering, position):
+            lookup = 'lt' if descending != reverse else 'gt'
+            keyset_filter |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+
+        return keyset_filter
+
+    def get_position(self, instance):
+        """Return the ordering values of the given instance"""
+        opts = instance._meta
+        position = []
+        for name, descending in self.ordering:
+            if name == 'pk':
+                position.append(instance.pk)
+            elif name in self.annotations:
+                position.append(getattr(instance, name))
+            else:
+                position.append(getattr(instance, opts.get_field(name).attname))
+
+        return position
+
+    def decode_cursor(self, request):
+        """Return the (position, reverse) pair encoded in the request cursor"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = cursor['p']
+            reverse = bool(cursor['r'])
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        # The keyset filter cannot compare to NULL, every ordering column of a page is set
+        try:
+            position = [convert(value) for convert, value in zip(self.converters, position)]
+        except (TypeError, ValueError, ArithmeticError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        """Return a link to the page starting after the given position"""
+        cursor = json.dumps({'p': position, 'r': int(reverse)}, cls=DjangoJSONEncoder)
+        encoded = base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'previous': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
@@ -0,0 +1,118 @@
+import re
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Cast
+
+
+# Fuzzy name search
+#
+# Names are matched by trigram word similarity: how many of the three letter
+# sequences of the searched text are found in a run of words of the name, so
+# prefixes, words within longer names and typos still match. On PostgreSQL this
+# is the pg_trgm extension, whose <% operator is served by a GIN trigram index,
+# see migration 0013. Its threshold is set to WORD_SIMILARITY_THRESHOLD when a
+# connection is created. On SQLite the same functions are registered from
+# Python then, so results match.
+
+SEARCH_RANK_SCALE = 500
+
+
+def word_trigrams(text):
+    """Return the trigrams of each word of the text the way pg_trgm extracts them:
+    words of letters and digits, lower cased and padded with two spaces
+    in front and one at the end"""
+    return [
+        [word[i:i + 3] for i in range(len(word) - 2)]
+        for word in (f'  {word} ' for word in re.findall(r'[^\W_]+', text.lower()))
+    ]
+
+
+def similarity(text, other):
+    """Return the share of the trigrams of both texts the texts have in common"""
+    if text is None or other is None:
+        return None
+
+    text = {trigram for word in word_trigrams(text) for trigram in word}
+    other = {trigram for word in word_trigrams(other) for trigram in word}
+    if not text or not other:
+        return 0.0
+
+    return len(text & other) / len(text | other)
+
+
+def word_similarity(text, other):
+    """Return the greatest similarity of the trigrams of the text
+    to the trigrams of a continuous extent of the other text"""
+    if text is None or other is None:
+        return None
+
+    text = {trigram for word in word_trigrams(text) for trigram in word}
+    other = [trigram for word in word_trigrams(other) for trigram in word]
+    best = 0.0
+    # The best extent starts and ends with a trigram of the text
+    for start, first in enumerate(other):
+        if first not in text:
+            continue
+        extent = set()
+        for trigram in other[start:]:
+            extent.add(trigram)
+            if trigram in text:
+                common = len(text & extent)
+                best = max(best, common / (len(text) + len(extent) - common))
+
+    return best
+
+
+def setup_connection(sender, connection, **kwargs):
+    """Set the threshold of the <% operator on PostgreSQL connections,
+    make similarity() and word_similarity() available on SQLite connections"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET pg_trgm.word_similarity_threshold = %s', [settings.WORD_SIMILARITY_THRESHOLD])
+    elif connection.vendor == 'sqlite':
+        connection.connection.create_function('similarity', 2, similarity, deterministic=True)
+        connection.connection.create_function('word_similarity', 2, word_similarity, deterministic=True)
+
+
+class Similarity(models.Func):
+    """Trigram similarity of an expression to a text"""
+    function = 'similarity'
+    output_field = models.FloatField()
+
+
+class WordSimilarity(models.Func):
+    """Trigram word similarity of a text to an expression"""
+    function = 'word_similarity'
+    output_field = models.FloatField()
+
+
+@models.CharField.register_lookup
+class WordSimilarLookup(models.Lookup):
+    """Match texts with a word similarity to the searched text of at least settings.WORD_SIMILARITY_THRESHOLD"""
+    lookup_name = 'word_similar'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        params = [*rhs_params, *lhs_params, settings.WORD_SIMILARITY_THRESHOLD]
+        return f'word_similarity({rhs}, {lhs}) >= %s', params
+
+    def as_postgresql(self, compiler, connection):
+        # The <% operator uses pg_trgm.word_similarity_threshold, set by setup_connection()
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{rhs} <%% {lhs}', rhs_params + lhs_params
+
+
+def search(queryset, field, text):
+    """Filter the queryset to rows whose field matches the text, best matches
+    first: closest words, then closest whole text. The rank is an integer,
+    so it can be paged on"""
+    return queryset.filter(**{f'{field}__word_similar': text}).annotate(
+        search_rank=Cast(
+            (WordSimilarity(Value(text), field) + Similarity(field, Value(text))) * SEARCH_RANK_SCALE,
+            models.IntegerField(),
+        ),
+    ).order_by('-search_rank', field)
@@ -0,0 +1,316 @@
+from django.db.models import Sum
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core import images, live
+from core.authentication import token_cache
+from core.cache import catalog_cache, response_cache
+from core.models import (
+    User, BaseFood, Recipe, FoodAmount, Meal, DailyMeal, Measurement, meal_calories, add_meal_calories, add_food_usage,
+    retain_media, release_media,
+)
+from core.nutrition import update_recipe_calories
+
+
+# Calorie totals
+#
+# Meal.calories is the sum of amount * food calories of its contents and
+# DailyMeal.calories the sum of its meals' calories. Writes to food amounts
+# and food calories apply the difference to both totals with F() updates,
+# so the totals never need a full recompute. Bulk writes are handled by
+# FoodAmountQuerySet and BaseFoodQuerySet.
+#
+# The same writes derive the calories of the recipes affected by them,
+# see core.nutrition, and count the food amounts of each food in
+# BaseFood.usage_count.
+
+def remember_food_amount(instance):
+    """Remember what the stored food amount adds to its meal, which recipe it belongs to and its food"""
+    instance._meal_calories = {}
+    instance._recipe_id = None
+    instance._food_id = None
+    old = FoodAmount.objects.filter(pk=instance.pk).values(
+        'belongs_to_meal', 'belongs_to_recipe', 'amount', 'food', 'food__calories',
+    ).first()
+    if old is None:
+        return
+
+    if old['belongs_to_meal'] is not None:
+        instance._meal_calories = {old['belongs_to_meal']: old['amount'] * old['food__calories']}
+    instance._recipe_id = old['belongs_to_recipe']
+    instance._food_id = old['food']
+
+
+@receiver(pre_save, sender=FoodAmount)
+def food_amount_pre_save(sender, instance, raw, **kwargs):
+    """Remember the food amount as it was before the save"""
+    instance._meal_calories = {}
+    instance._recipe_id = None
+    instance._food_id = None
+    if not raw and instance.pk is not None:
+        remember_food_amount(instance)
+
+
+@receiver(post_save, sender=FoodAmount)
+def food_amount_post_save(sender, instance, raw, **kwargs):
+    """Apply the change of the food amount's calories to its old and new meal and recipe,
+    and count it for its food"""
+    if raw:
+        return
+
+    if instance._meal_calories or instance.belongs_to_meal_id is not None:
+        add_meal_calories(instance._meal_calories, meal_calories(FoodAmount.objects.filter(pk=instance.pk)))
+    update_recipe_calories({instance._recipe_id, instance.belongs_to_recipe_id} - {None}, touch=True)
+    if instance._food_id != instance.food_id:
+        add_food_usage({instance._food_id: 1} if instance._food_id else {}, {instance.food_id: 1})
+
+
+@receiver(pre_delete, sender=FoodAmount)
+def food_amount_pre_delete(sender, instance, **kwargs):
+    """Remember the food amount before it is deleted"""
+    remember_food_amount(instance)
+
+
+@receiver(post_delete, sender=FoodAmount)
+def food_amount_post_delete(sender, instance, **kwargs):
+    """Remove the food amount's calories from its meal and recipe, and its count from its food"""
+    add_meal_calories(instance._meal_calories, {})
+    update_recipe_calories({instance._recipe_id} - {None}, touch=True)
+    if instance._food_id:
+        add_food_usage({instance._food_id: 1}, {})
+
+
+@receiver(pre_save, sender=BaseFood)
+@receiver(pre_save, sender=Recipe)
+def food_pre_save(sender, instance, raw, **kwargs):
+    """Remember the food calories and serving size before the save. The usage count
+    only changes through food amounts, so a save never overwrites the stored count.
+    The food is locked until the save commits, so counts added meanwhile wait for it"""
+    instance._nutrition = None
+    if not raw and instance.pk is not None:
+        stored = sender.objects.select_for_update().filter(pk=instance.pk).values_list(
+            'calories', 'serving_size', 'usage_count',
+        ).first()
+        if stored is not None:
+            instance._nutrition = stored[:2]
+            instance.usage_count = stored[2]
+
+
+@receiver(post_save, sender=BaseFood)
+@receiver(post_save, sender=Recipe)
+def food_post_save(sender, instance, created, raw, **kwargs):
+    """Apply the change of the food calories to every meal containing the food
+    and derive the calories of the recipe and of the recipes containing the food"""
+    if raw:
+        return
+
+    calories, serving_size = instance._nutrition or (instance.calories, instance.serving_size)
+    delta = instance.calories - calories
+    if delta:
+        amounts = FoodAmount.objects.filter(food=instance.pk, belongs_to_meal__isnull=False).values(
+            'belongs_to_meal'
+        ).annotate(amount=Sum('amount')).order_by()
+        add_meal_calories({}, {row['belongs_to_meal']: row['amount'] * delta for row in amounts})
+
+    # A new food cannot be an ingredient yet, and a new recipe has no ingredients yet
+    if not created and (isinstance(instance, Recipe) or delta or serving_size != instance.serving_size):
+        derived = update_recipe_calories([instance.pk])
+        instance.calories = derived.get(instance.pk, instance.calories)
+
+
+# Saves of meals and daily meals write calories read from the meals. The meals
+# are locked until the save commits, see Meal.save and DailyMeal.save, so
+# calories added by add_meal_calories() meanwhile wait for the save rather
+# than being overwritten, and the save reads calories already added.
+
+@receiver(pre_save, sender=Meal)
+def meal_pre_save(sender, instance, raw, **kwargs):
+    """Meal calories only change through the meal contents,
+    so a save never overwrites the stored total"""
+    if raw:
+        return
+
+    calories = None
+    if instance.pk is not None:
+        calories = Meal.objects.select_for_update().filter(pk=instance.pk).values_list('calories', flat=True).first()
+    instance.calories = calories or 0
+
+
+@receiver(pre_save, sender=DailyMeal)
+def daily_meal_pre_save(sender, instance, raw, **kwargs):
+    """Set the daily meal calories from the meals it holds"""
+    if raw:
+        return
+
+    meal_ids = [instance.breakfast_id, instance.lunch_id, instance.diner_id, instance.snack_id]
+    meal_ids = [meal_id for meal_id in meal_ids if meal_id is not None]
+    calories = {}
+    if meal_ids:
+        calories = dict(Meal.objects.select_for_update().filter(pk__in=meal_ids).values_list('pk', 'calories'))
+    instance.calories = sum(calories.get(meal_id, 0) for meal_id in meal_ids)
+
+
+# Response cache
+#
+# Writes to meals and daily meals invalidate their cached responses. Changes
+# of the meal contents and calories invalidate them in add_meal_calories().
+# Writes to foods and recipes invalidate the whole cached food catalog.
+
+@receiver(post_save, sender=Meal)
+@receiver(post_save, sender=DailyMeal)
+@receiver(post_delete, sender=Meal)
+@receiver(post_delete, sender=DailyMeal)
+def meal_changed(sender, instance, **kwargs):
+    """Invalidate the cached responses of the written meal or daily meal"""
+    response_cache.invalidate(sender, [instance.pk])
+
+
+@receiver(post_save, sender=BaseFood)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=BaseFood)
+@receiver(post_delete, sender=Recipe)
+def catalog_changed(sender, instance, **kwargs):
+    """Invalidate the cached food catalog. Bulk writes invalidate it in BaseFoodQuerySet"""
+    catalog_cache.invalidate()
+
+
+# Live events
+#
+# Writes to meals and daily meals publish their new totals to the live events
+# of their user, see core.live. Changes of the meal contents and calories
+# publish them in add_meal_calories().
+
+@receiver(post_save, sender=Meal)
+def meal_post_save(sender, instance, raw, **kwargs):
+    """Publish the saved meal"""
+    if not raw:
+        live.publish(instance.user_id, 'meal', {field: getattr(instance, field) for field in live.MEAL_FIELDS})
+
+
+@receiver(post_save, sender=DailyMeal)
+def daily_meal_post_save(sender, instance, raw, **kwargs):
+    """Publish the saved daily meal"""
+    if not raw:
+        live.publish(
+            instance.user_id, 'daily_meal', {field: getattr(instance, field) for field in live.DAILY_MEAL_FIELDS}
+        )
+
+
+@receiver(post_delete, sender=Meal)
+@receiver(post_delete, sender=DailyMeal)
+def meal_post_delete(sender, instance, **kwargs):
+    """Publish the deletion of the meal or daily meal"""
+    event_type = 'meal' if sender is Meal else 'daily_meal'
+    live.publish(instance.user_id, event_type, {'id': instance.pk, 'deleted': True})
+
+
+# Images
+#
+# New uploads of pictures are processed in the background, see core.images.
+# References to the stored files are counted in MediaFile, a file is deleted
+# when no object references it anymore.
+
+IMAGE_FIELDS = {User: ('profile_picture',), BaseFood: ('image',), Recipe: ('image',), Measurement: ('image',)}
+
+
+def stored_image_names(sender, pk, field_names):
+    """Return the stored files of the pictures of the object by field, read from its row
+    since the instance may have been loaded before another write"""
+    stored = sender.objects.filter(pk=pk).values(*field_names).first() or {}
+    return {field_name: name or None for field_name, name in stored.items()}
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=BaseFood)
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=Measurement)
+def image_pre_save(sender, instance, raw, update_fields, **kwargs):
+    """Read the stored files of the saved pictures and mark new uploads of pictures not processed yet"""
+    instance._image_names = {}
+    instance._new_images = []
+    if raw:
+        return
+
+    field_names = [
+        field_name for field_name in IMAGE_FIELDS[sender] if update_fields is None or field_name in update_fields
+    ]
+    if field_names and not instance._state.adding:
+        instance._image_names = stored_image_names(sender, instance.pk, field_names)
+
+    for field_name in IMAGE_FIELDS[sender]:
+        field_file = getattr(instance, field_name)
+        if not field_file or not field_file._committed:
+            setattr(instance, images.processed_field(field_name), False)
+        if field_file and not field_file._committed:
+            instance._new_images.append(field_name)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=BaseFood)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Measurement)
+def image_post_save(sender, instance, raw, update_fields, **kwargs):
+    """Process the new uploads of pictures once they are committed,
+    and move the references of changed pictures to their new files"""
+    if raw:
+        return
+
+    for field_name in IMAGE_FIELDS[sender]:
+        if update_fields is not None and field_name not in update_fields:
+            continue
+
+        old = instance._image_names.get(field_name)
+        new = getattr(instance, field_name).name or None
+        if old != new:
+            if new:
+                retain_media(new)
+            if old:
+                release_media(old)
+
+    for field_name in instance._new_images:
+        images.schedule(instance, field_name)
+
+
+@receiver(pre_delete, sender=User)
+@receiver(pre_delete, sender=BaseFood)
+@receiver(pre_delete, sender=Measurement)
+def image_pre_delete(sender, instance, **kwargs):
+    """Read the stored files of the pictures of the object about to be deleted"""
+    instance._image_names = stored_image_names(sender, instance.pk, IMAGE_FIELDS[sender])
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=BaseFood)
+@receiver(post_delete, sender=Measurement)
+def image_post_delete(sender, instance, **kwargs):
+    """Release the stored files of the pictures of the deleted object.
+    Deleting a recipe also deletes its BaseFood row, which releases the picture"""
+    for name in instance._image_names.values():
+        if name:
+            release_media(name)
+
+
+# Token cache
+#
+# Cached tokens stop being accepted as soon as they are deleted or their user
+# changes, see core.authentication.
+
+@receiver(post_delete, sender=Token)
+def token_post_delete(sender, instance, **kwargs):
+    """Revoke the deleted token"""
+    token_cache.revoke_token(instance.key, instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def user_post_save(sender, instance, created, update_fields, **kwargs):
+    """Revoke the cached tokens of a changed user, which may have been deactivated.
+    Logging in only updates last_login"""
+    if not created and update_fields != frozenset({'last_login'}):
+        token_cache.revoke_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_post_delete(sender, instance, **kwargs):
+    """Revoke the cached tokens of the deleted user"""
+    token_cache.revoke_user(instance.pk)
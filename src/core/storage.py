@@ -0,0 +1,70 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+
+class MediaStorage(FileSystemStorage):
+    """File system storage of uploads. Stored files are never rewritten,
+    changed content is saved under a new name"""
+
+    def write_temporary(self, directory, content, digest=None):
+        """Write the content to a new temporary file in the directory and return its path,
+        streaming it through the digest if there is one"""
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, mode=self.directory_permissions_mode or 0o777, exist_ok=True)
+
+        fd, path = tempfile.mkstemp(dir=full_directory, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    if digest is not None:
+                        digest.update(chunk)
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            os.remove(path)
+            raise
+
+        return path
+
+    def save_derived(self, name, content):
+        """Write a file derived from a stored file, such as an image variant,
+        under exactly the given name"""
+        os.replace(self.write_temporary(os.path.dirname(name), content), self.path(name))
+        return name
+
+
+class ContentAddressedStorage(MediaStorage):
+    """Stores every distinct content once, named by the SHA-256 of the content
+    in the directory and with the extension of the name it is saved under.
+    The hash is computed while the content is written. A stored file is kept
+    as is while it is referenced, see core.models.MediaFile"""
+
+    def get_available_name(self, name, max_length=None):
+        # Names only collide for the same content
+        return name
+
+    def _save(self, name, content):
+        from core.models import MediaFile
+
+        directory, filename = os.path.split(name)
+        digest = hashlib.sha256()
+        path = self.write_temporary(directory, content, digest)
+
+        name = os.path.join(directory, digest.hexdigest() + os.path.splitext(filename)[1].lower()).replace('\\', '/')
+        with transaction.atomic():
+            media_file = MediaFile.objects.select_for_update().filter(name=name).first()
+            if media_file is not None and media_file.references:
+                # Referenced, so the stored file stays
+                os.remove(path)
+            else:
+                # An unreferenced file is about to be deleted, see core.models.delete_media
+                if media_file is not None:
+                    media_file.delete()
+                os.replace(path, self.path(name))
+
+        return name
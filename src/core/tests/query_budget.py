@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.models import BaseFood, FoodAmount, Recipe, Meal, DailyMeal, Measurement, UserGoal
+
+
+class QueryBudgetTestCase(TestCase):
+    """Base class of the tests holding every API action to a fixed
+    number of SQL queries, regardless of how many rows the user has"""
+    rows = 1
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='budget@test.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        for i in range(self.rows):
+            self.food = BaseFood.objects.create(name=f'Food {i}', calories=10, user=self.user)
+            self.recipe = Recipe.objects.create(name=f'Recipe {i}', user=self.user)
+            self.food_amount = FoodAmount.objects.create(food=self.food, user=self.user)
+            slots = {}
+            for slot in ('breakfast', 'lunch', 'diner', 'snack'):
+                self.meal = Meal.objects.create(user=self.user)
+                for j in range(self.rows):
+                    FoodAmount.objects.create(food=self.food, belongs_to_meal=self.meal, user=self.user)
+                    FoodAmount.objects.create(food=self.food, belongs_to_recipe=self.recipe, user=self.user)
+                slots[slot] = self.meal
+            self.daily_meal = DailyMeal.objects.create(user=self.user, date=date.today() - timedelta(days=i), **slots)
+            self.measurement = Measurement.objects.create(weight=80, user=self.user)
+            self.goal = UserGoal.objects.create(goal_weight=75, user=self.user)
+
+    def assertQueryBudget(self, budget, method, url, data=None):
+        """Assert that the request succeeds using at most `budget` queries"""
+        with CaptureQueriesContext(connection) as context:
+            res = getattr(self.client, method)(url, data, format='json')
+
+        self.assertLess(res.status_code, 400, res.content)
+        self.assertLessEqual(
+            len(context.captured_queries), budget,
+            f'{method.upper()} {url} ran {len(context.captured_queries)} queries, budget is {budget}:\n' +
+            '\n'.join(query['sql'] for query in context.captured_queries)
+        )
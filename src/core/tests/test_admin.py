@@ -0,0 +1,25 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+
+from core.models import BaseFood, Recipe
+
+
+class FoodAdminTests(TestCase):
+    """Foods and recipes edited in the admin store normalized barcodes"""
+
+    def setUp(self):
+        self.request = RequestFactory().get('/admin/')
+        self.request.user = get_user_model().objects.create_superuser(email='admin@test.com', password='testpass123')
+
+    def test_barcode(self):
+        for model in (BaseFood, Recipe):
+            form_class = admin.site._registry[model].get_form(self.request)
+
+            form = form_class(data={'barcode': '036000291452'})
+            form.is_valid()
+            self.assertEqual(form.cleaned_data['barcode'], '0036000291452', model)
+
+            form = form_class(data={'barcode': '036000291453'})
+            form.is_valid()
+            self.assertIn('barcode', form.errors, model)
@@ -0,0 +1,64 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import token_cache
+
+
+class TokenCacheTests(TransactionTestCase):
+    """Cached tokens stop being accepted once they are revoked.
+    Revocations run when the write commits, so the tests commit"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='token@test.com', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('meal:basefood-list')
+
+    def assertStatus(self, status):
+        self.assertEqual(self.client.get(self.url).status_code, status)
+
+    def test_token_deletion(self):
+        self.assertStatus(200)
+        self.token.delete()
+        self.assertStatus(401)
+
+    def test_deactivation(self):
+        self.assertStatus(200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertStatus(401)
+
+    def test_user_deletion(self):
+        self.assertStatus(200)
+        self.user.delete()
+        self.assertStatus(401)
+
+    def test_other_token_stays_cached(self):
+        other = get_user_model().objects.create_user(email='other@test.com', password='testpass123')
+        Token.objects.create(user=other).delete()
+        self.assertStatus(200)
+        self.assertIsNotNone(token_cache.get(self.token.key))
+
+    def test_bulk_deactivation(self):
+        self.assertStatus(200)
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertStatus(401)
+
+    def test_evicted_version(self):
+        self.assertStatus(200)
+        token_cache.cache.delete(token_cache.version_key(self.user.pk))
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertStatus(200)
+        self.assertIsNotNone(token_cache.get(self.token.key))
+
+    @override_settings(LOCAL_CACHE_TIMEOUT=60)
+    def test_process_local_timeout(self):
+        token_cache.set(self.token, token_cache.get_version(self.user.pk))
+        entry = token_cache.cache.get(token_cache.entry_key(self.token.key))
+        self.assertLessEqual(entry['expires'], time.time() + 60)
@@ -0,0 +1,103 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.cache import catalog_cache
+from core.models import BaseFood
+
+
+@override_settings(CATALOG_CACHE_LOCK_TIMEOUT=1, CATALOG_CACHE_STATS_RATE=1)
+class CatalogCacheTests(SimpleTestCase):
+    """Entries are built by the worker holding their lock, while the others
+    wait for a missing entry and keep serving an expired one"""
+
+    def setUp(self):
+        catalog_cache.cache.clear()
+        self.generation = catalog_cache.get_generation()
+        self.entry_key = catalog_cache.entry_key(self.generation, 'foods')
+        self.build = mock.Mock(return_value='built')
+
+    def get(self):
+        return catalog_cache.get_or_set(self.generation, 'foods', self.build)
+
+    def hold_lock(self):
+        catalog_cache.cache.add(self.entry_key + ':lock', 1, 1)
+
+    def test_built_once(self):
+        self.assertEqual(self.get(), 'built')
+        self.assertEqual(self.get(), 'built')
+        self.build.assert_called_once()
+        self.assertEqual(catalog_cache.get_stats(), {'hits': 1, 'misses': 1})
+        catalog_cache.reset_stats()
+        self.assertEqual(catalog_cache.get_stats(), {'hits': 0, 'misses': 0})
+
+    @override_settings(CATALOG_CACHE_STATS_RATE=0)
+    def test_stats_disabled(self):
+        self.get()
+        self.get()
+        self.assertEqual(catalog_cache.cache.get('catalog:stats:hits'), None)
+        self.assertEqual(catalog_cache.get_stats(), {'hits': 0, 'misses': 0})
+
+    def test_waits_for_the_worker_holding_the_lock(self):
+        self.hold_lock()
+
+        def built_by_other_worker(seconds):
+            catalog_cache.cache.set(self.entry_key, {'value': 'other', 'expires': time.time() + 60})
+
+        with mock.patch('core.cache.time.sleep', side_effect=built_by_other_worker):
+            self.assertEqual(self.get(), 'other')
+        self.build.assert_not_called()
+
+    @override_settings(CATALOG_CACHE_LOCK_TIMEOUT=0.1)
+    def test_builds_when_the_lock_is_not_released(self):
+        self.hold_lock()
+        self.assertEqual(self.get(), 'built')
+        self.assertIsNone(catalog_cache.cache.get(self.entry_key + ':lock'))
+
+    @override_settings(CATALOG_CACHE_TIMEOUT=0)
+    def test_serves_the_expired_entry_while_it_is_rebuilt(self):
+        self.get()
+        self.hold_lock()
+        self.build.return_value = 'rebuilt'
+        self.assertEqual(self.get(), 'built')
+
+        catalog_cache.cache.delete(self.entry_key + ':lock')
+        self.assertEqual(self.get(), 'rebuilt')
+        self.assertEqual(self.build.call_count, 2)
+
+    def test_none_is_not_cached(self):
+        self.build.return_value = None
+        self.get()
+        self.get()
+        self.assertEqual(self.build.call_count, 2)
+
+
+class CatalogInvalidationTests(TransactionTestCase):
+    """Writes to foods move the catalog to a new generation once they commit"""
+
+    def setUp(self):
+        catalog_cache.cache.clear()
+        self.user = get_user_model().objects.create_user(email='catalog@test.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def names(self):
+        return [food['name'] for food in self.client.get(reverse('meal:basefood-list') + '?all=1').data['results']]
+
+    def test_write_changes_the_generation(self):
+        BaseFood.objects.create(name='Apple', calories=52, user=self.user)
+        self.assertEqual(self.names(), ['Apple'])
+
+        generation = catalog_cache.get_generation()
+        food = BaseFood.objects.create(name='Banana', calories=89, user=self.user)
+        self.assertGreater(catalog_cache.get_generation(), generation)
+        self.assertEqual(sorted(self.names()), ['Apple', 'Banana'])
+
+        generation = catalog_cache.get_generation()
+        BaseFood.objects.filter(pk=food.pk).update(name='Plantain')
+        self.assertGreater(catalog_cache.get_generation(), generation)
+        self.assertEqual(sorted(self.names()), ['Apple', 'Plantain'])
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from core.models import BaseFood
+
+
+class ConditionalGetTests(TestCase):
+    """Conditional requests are answered with 304 only while the response is unchanged"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='conditional@test.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.old_food = BaseFood.objects.create(name='Apple', calories=10, user=self.user)
+        self.food = BaseFood.objects.create(name='Pear', calories=10, user=self.user)
+        self.url = reverse('meal:basefood-list')
+
+    def test_list_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_after_deleting_an_older_row(self):
+        etag = self.client.get(self.url)['ETag']
+        self.old_food.delete()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        since = http_date((timezone.now() + timedelta(minutes=1)).timestamp())
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import BaseFood, FoodAmount, Meal
+
+
+class UserPrimaryKeyRelatedFieldTests(TestCase):
+    """Food amount keys are resolved at once, among the user's own food amounts only"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='fields@test.com', password='testpass123')
+        self.other = get_user_model().objects.create_user(email='other@test.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.food = BaseFood.objects.create(name='Apple', calories=50, user=self.user)
+        self.food_amounts = [FoodAmount.objects.create(food=self.food, user=self.user) for i in range(40)]
+        other_food = BaseFood.objects.create(name='Pear', calories=40, user=self.other)
+        self.other_food_amount = FoodAmount.objects.create(food=other_food, user=self.other)
+
+    def test_ingredients_resolved_at_once(self):
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.post(reverse('meal:recipe-list'), {
+                'name': 'Salad', 'ingredients': [food_amount.id for food_amount in self.food_amounts],
+            }, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(res.data['calories'], 50)
+        # The food amounts and their foods are loaded in one query
+        selects = [query['sql'] for query in context.captured_queries if 'core_basefood"."name' in query['sql']]
+        self.assertEqual(len(selects), 1)
+        # The rest writes the recipe, derives its calories and renders it
+        self.assertLessEqual(len(context.captured_queries), 13)
+
+    def test_food_amount_of_another_user(self):
+        ids = [self.food_amounts[0].id, self.other_food_amount.id]
+        res = self.client.post(reverse('meal:recipe-list'), {'name': 'Salad', 'ingredients': ids}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data['ingredients'][0].code, 'does_not_exist')
+
+        res = self.client.post(reverse('meal:meal-list'), {'meal_contents': ids}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data['meal_contents'][0].code, 'does_not_exist')
+        self.other_food_amount.refresh_from_db()
+        self.assertIsNone(self.other_food_amount.belongs_to_recipe)
+        self.assertIsNone(self.other_food_amount.belongs_to_meal)
+
+    def test_meal_of_another_user(self):
+        meal = Meal.objects.create(user=self.other)
+        res = self.client.post(reverse('meal:dailymeal-list'), {'breakfast': meal.id}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data['breakfast'][0].code, 'does_not_exist')
+
+    def test_invalid_keys(self):
+        for ids in (['a'], [True], 'not a list'):
+            res = self.client.post(reverse('meal:meal-list'), {'meal_contents': ids}, format='json')
+            self.assertEqual(res.status_code, 400, ids)
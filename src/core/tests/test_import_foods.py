@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import BaseFood, FoodAmount, Meal, Recipe
+
+
+class ImportFoodsTests(TestCase):
+    """Imported foods are upserted on their name among the foods of the user"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='import@test.com', password='testpass123')
+        self.other = get_user_model().objects.create_user(email='other@test.com', password='testpass123')
+        self.apple = BaseFood.objects.create(name='Apple', calories=50, user=self.user)
+        self.pear = BaseFood.objects.create(name='Pear', calories=40, user=self.user)
+        BaseFood.objects.create(name='Banana', calories=90, user=self.other)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'foods.csv')
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write(
+                'name,calories,serving_size\n'
+                'Apple,52,100\n'
+                'Pear,40,100\n'
+                'Banana,89,100\n'
+                'Bread,,100\n'
+                'Kiwi,60,100\n'
+                'Kiwi,61,120\n'
+            )
+
+    def import_foods(self):
+        out = StringIO()
+        call_command('import_foods', self.path, '--user', self.user.email, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def foods(self):
+        return dict(BaseFood.objects.filter(user=self.user).values_list('name', 'calories'))
+
+    def test_upsert(self):
+        meal = Meal.objects.create(user=self.user)
+        FoodAmount.objects.create(food=self.apple, amount=2, belongs_to_meal=meal, user=self.user)
+
+        out = self.import_foods()
+        self.assertIn('2 created, 1 updated, 1 unchanged, 1 invalid', out)
+        # The last row of a name wins, foods of other users are not matched
+        self.assertEqual(self.foods(), {'Apple': 52, 'Pear': 40, 'Banana': 89, 'Kiwi': 61})
+        self.assertEqual(BaseFood.objects.get(user=self.user, name='Kiwi').serving_size, 120)
+        meal.refresh_from_db()
+        self.assertEqual(meal.calories, 104)
+
+        out = self.import_foods()
+        self.assertIn('0 created, 0 updated, 4 unchanged, 1 invalid', out)
+        self.assertEqual(BaseFood.objects.filter(user=self.user).count(), 4)
+
+    def test_recipe_of_the_same_name(self):
+        recipe = Recipe.objects.create(name='Pancakes', calories=300, serving_size=250, user=self.user)
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write('name,calories,serving_size\nPancakes,10,100\n')
+
+        out = self.import_foods()
+        self.assertIn('1 created, 0 updated', out)
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.calories, recipe.serving_size), (300, 250))
+        self.assertTrue(BaseFood.objects.filter(name='Pancakes', recipe__isnull=True, calories=10).exists())
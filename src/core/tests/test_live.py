@@ -0,0 +1,119 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import live
+
+
+class LocalBrokerTests(SimpleTestCase):
+    """LocalBroker hands events published from any thread to the subscribers of their user"""
+
+    def test_publish_and_subscribe(self):
+        async def subscribe():
+            broker = live.LocalBroker()
+            subscription = broker.subscribe(1)
+            other = broker.subscribe(2)
+            publisher = threading.Thread(target=broker.publish, args=(1, {'type': 'meal', 'id': 1}))
+            publisher.start()
+            publisher.join()
+            events = await subscription.get(1)
+            self.assertEqual(await other.get(0.01), [])
+
+            subscription.close()
+            other.close()
+            self.assertEqual(broker.subscribers, {})
+            return events
+
+        self.assertEqual(asyncio.run(subscribe()), [{'type': 'meal', 'id': 1}])
+
+    @override_settings(LIVE_QUEUE_SIZE=2)
+    def test_slow_subscriber_drops_the_oldest_events(self):
+        async def subscribe():
+            broker = live.LocalBroker()
+            subscription = broker.subscribe(1)
+            for number in range(3):
+                broker.publish(1, {'type': 'meal', 'id': number})
+            await asyncio.sleep(0)
+            return await subscription.get(1)
+
+        self.assertEqual([event['id'] for event in asyncio.run(subscribe())], [1, 2])
+
+
+@override_settings(LIVE_POLL_SECONDS=0.01)
+class CacheBrokerTests(SimpleTestCase):
+    """CacheBroker subscribers poll the cache for the events published after they subscribed"""
+
+    def setUp(self):
+        caches[live.settings.LIVE_CACHE_ALIAS].clear()
+
+    def test_publish_and_subscribe(self):
+        broker = live.CacheBroker()
+        broker.publish(1, {'type': 'meal', 'id': 1})
+
+        async def subscribe():
+            subscription = broker.subscribe(1)
+            self.assertEqual(await subscription.get(0), [])
+            broker.publish(1, {'type': 'meal', 'id': 2})
+            broker.publish(2, {'type': 'meal', 'id': 3})
+            broker.publish(1, {'type': 'meal', 'id': 4})
+            return await subscription.get(1), await subscription.get(0.02)
+
+        self.assertEqual(asyncio.run(subscribe()), ([{'type': 'meal', 'id': 2}, {'type': 'meal', 'id': 4}], []))
+
+
+class EventStreamTests(TestCase):
+    """The ASGI application streams the events of the token's user, WSGI answers 501"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='live@test.com', password='testpass123')
+
+    def stream(self, headers, publish=()):
+        """Return the messages sent by the stream until the client disconnects"""
+        messages = []
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if len(messages) == 2:
+                # Published once the stream subscribed, after this message
+                for event in publish:
+                    asyncio.get_running_loop().call_soon(live.broker.publish, self.user.pk, event)
+            elif len(messages) > 2:
+                disconnect.set()
+
+        async def run():
+            scope = {'type': 'http', 'path': live.settings.LIVE_EVENTS_PATH, 'headers': headers}
+            await asyncio.wait_for(live.events_application(scope, receive, send), 5)
+
+        asyncio.run(run())
+        return messages
+
+    def test_stream(self):
+        with mock.patch('core.live.authenticate', return_value=self.user):
+            messages = self.stream([(b'authorization', b'Token key')], [{'type': 'meal', 'id': 1, 'calories': 250}])
+
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertEqual(messages[2]['body'], b'event: meal\ndata: ' + json.dumps({'id': 1, 'calories': 250}).encode()
+                         + b'\n\n')
+        self.assertEqual(live.broker.subscribers, {})
+
+    def test_invalid_token(self):
+        messages = self.stream([(b'authorization', b'Bearer key')])
+        self.assertEqual(messages[0]['status'], 401)
+
+    def test_wsgi(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('live-events')).status_code, 401)
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get(reverse('live-events')).status_code, 501)
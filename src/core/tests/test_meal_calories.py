@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core.models import BaseFood, FoodAmount, Meal, DailyMeal, Recipe
+
+
+class DailyMealCaloriesTests(TestCase):
+    """Daily meal calories are the sum of the calories of their meals
+    after every kind of write"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='calories@test.com', password='testpass123')
+        self.food = BaseFood.objects.create(name='Apple', calories=50, user=self.user)
+        self.meal = Meal.objects.create(user=self.user)
+        self.other_meal = Meal.objects.create(user=self.user)
+        FoodAmount.objects.create(food=self.food, amount=2, belongs_to_meal=self.meal, user=self.user)
+        FoodAmount.objects.create(food=self.food, amount=1, belongs_to_meal=self.other_meal, user=self.user)
+
+    def assertCalories(self, daily_meal, calories):
+        daily_meal.refresh_from_db()
+        self.assertEqual(daily_meal.calories, calories)
+
+    def test_save(self):
+        daily_meal = DailyMeal.objects.create(user=self.user, breakfast=self.meal)
+        self.assertCalories(daily_meal, 100)
+
+        daily_meal.lunch = self.other_meal
+        daily_meal.save()
+        self.assertCalories(daily_meal, 150)
+
+    def test_stale_save(self):
+        daily_meal = DailyMeal.objects.create(user=self.user, breakfast=self.meal)
+        stale_meal = Meal.objects.get(pk=self.meal.pk)
+        stale_daily_meal = DailyMeal.objects.get(pk=daily_meal.pk)
+        FoodAmount.objects.create(food=self.food, amount=1, belongs_to_meal=self.meal, user=self.user)
+
+        stale_meal.save()
+        stale_daily_meal.save()
+        self.assertEqual(stale_meal.calories, 150)
+        self.assertCalories(self.meal, 150)
+        self.assertCalories(daily_meal, 150)
+
+    def test_food_amount_delete(self):
+        daily_meal = DailyMeal.objects.create(user=self.user, breakfast=self.meal, lunch=self.other_meal)
+        self.meal.meal_contents.get().delete()
+        self.assertCalories(daily_meal, 50)
+
+    def test_bulk_update(self):
+        daily_meal = DailyMeal.objects.create(user=self.user)
+        DailyMeal.objects.filter(pk=daily_meal.pk).update(breakfast=self.meal)
+        self.assertCalories(daily_meal, 100)
+
+        DailyMeal.objects.filter(pk=daily_meal.pk).update(breakfast=None, snack=self.other_meal)
+        self.assertCalories(daily_meal, 50)
+
+    def test_bulk_update_of_other_fields(self):
+        daily_meal = DailyMeal.objects.create(user=self.user, breakfast=self.meal)
+        DailyMeal.objects.filter(pk=daily_meal.pk).update(water_glasses=3)
+        self.assertCalories(daily_meal, 100)
+
+    def test_bulk_move_to_another_meal(self):
+        daily_meal = DailyMeal.objects.create(user=self.user, breakfast=self.meal, lunch=self.other_meal)
+        FoodAmount.objects.filter(belongs_to_meal=self.meal).update(belongs_to_meal=self.other_meal)
+        self.assertCalories(daily_meal, 150)
+        self.meal.refresh_from_db()
+        self.other_meal.refresh_from_db()
+        self.assertEqual((self.meal.calories, self.other_meal.calories), (0, 150))
+
+        self.other_meal.meal_contents.update(belongs_to_meal=None)
+        self.assertCalories(daily_meal, 0)
+
+
+class RecipeCaloriesTests(TestCase):
+    """Recipe calories follow ingredients moved between recipes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='recipes@test.com', password='testpass123')
+        self.food = BaseFood.objects.create(name='Apple', calories=50, user=self.user)
+        self.sauce = Recipe.objects.create(name='Sauce', user=self.user)
+        self.ingredient = FoodAmount.objects.create(
+            food=self.food, amount=2, belongs_to_recipe=self.sauce, user=self.user,
+        )
+        self.pasta = Recipe.objects.create(name='Pasta', user=self.user)
+        FoodAmount.objects.create(food=self.sauce, belongs_to_recipe=self.pasta, user=self.user)
+        self.meal = Meal.objects.create(user=self.user)
+        FoodAmount.objects.create(food=self.pasta, belongs_to_meal=self.meal, user=self.user)
+
+    def assertCalories(self, food, calories):
+        food.refresh_from_db()
+        self.assertEqual(food.calories, calories)
+
+    def test_ingredient_moved_to_a_new_recipe(self):
+        self.assertCalories(self.pasta, 50)
+        self.assertCalories(self.meal, 50)
+
+        other = Recipe.objects.create(name='Salad', user=self.user)
+        FoodAmount.objects.filter(pk=self.ingredient.pk).update(belongs_to_recipe=other)
+        self.assertCalories(other, 50)
+        # The recipes containing the recipe the ingredient left are derived again
+        self.assertCalories(self.sauce, 50)
+        self.ingredient.refresh_from_db()
+        self.ingredient.amount = 4
+        self.ingredient.save()
+        self.assertCalories(other, 50)
+
+        # A stale food keeps the usage count which the calories of other depend on
+        self.food.calories = 100
+        self.food.save()
+        self.assertCalories(other, 100)
+        self.assertCalories(self.pasta, 50)
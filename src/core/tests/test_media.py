@@ -0,0 +1,133 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import BaseFood, MediaFile, Measurement
+
+
+@mock.patch('core.images.executor')
+class MediaFileTests(TransactionTestCase):
+    """Stored files are deleted once no object references them, and only then.
+    Deletions run when the write commits, so the tests commit"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = get_user_model().objects.create_user(email='media@test.com', password='testpass123')
+
+    def create_food(self, content):
+        food = BaseFood(name='Apple', user=self.user)
+        food.image.save('apple.jpg', ContentFile(content))
+        return food
+
+    def references(self, name):
+        return MediaFile.objects.filter(name=name).values_list('references', flat=True).first()
+
+    def test_stale_instance_releases_the_stored_file(self, executor):
+        food = self.create_food(b'first')
+        stale = BaseFood.objects.get(pk=food.pk)
+        food.image.save('apple.jpg', ContentFile(b'second'))
+        first, second = stale.image.name, food.image.name
+        self.assertFalse(default_storage.exists(first))
+
+        stale.delete()
+        self.assertIsNone(self.references(second))
+        self.assertFalse(default_storage.exists(second))
+
+    def test_new_upload_of_a_file_pending_deletion(self, executor):
+        food = self.create_food(b'content')
+        name = food.image.name
+        with transaction.atomic():
+            food.delete()
+            other = self.create_food(b'content')
+
+        self.assertEqual(other.image.name, name)
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(default_storage.exists(name))
+
+
+@mock.patch('core.images.executor')
+class MediaViewTests(TestCase):
+    """Pictures are served to the users allowed to see them, with byte ranges"""
+    content = b'0123456789'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, MEDIA_SERVER='')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = get_user_model().objects.create_user(email='media@test.com', password='testpass123')
+        self.other = get_user_model().objects.create_user(email='other@test.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_picture(self, model, user):
+        instance = model(user=user, **({'name': 'Apple'} if model is BaseFood else {'weight': 80}))
+        instance.image.save('picture.jpg', ContentFile(self.content))
+        return reverse('media', kwargs={'path': instance.image.name})
+
+    def get(self, url, **headers):
+        res = self.client.get(url, **headers)
+        content = b''.join(res.streaming_content) if res.streaming else res.content
+        res.close()
+        return res, content
+
+    def test_own_picture(self, executor):
+        url = self.create_picture(Measurement, self.user)
+        res, content = self.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(content, self.content)
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('private', res['Cache-Control'])
+
+        res, content = self.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+
+    def test_picture_of_another_user(self, executor):
+        res, content = self.get(self.create_picture(Measurement, self.other))
+        self.assertEqual(res.status_code, 404)
+
+        # Foods are shown in the catalog
+        res, content = self.get(self.create_picture(BaseFood, self.other))
+        self.assertEqual(res.status_code, 200)
+
+    def test_path_outside_the_picture(self, executor):
+        url = self.create_picture(Measurement, self.user)
+        res, content = self.get(url.replace('/uploads/', '/uploads/measurement_picture/../'))
+        self.assertEqual(res.status_code, 404)
+
+    def test_range(self, executor):
+        url = self.create_picture(Measurement, self.user)
+        res, content = self.get(url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(content, b'2345')
+        self.assertEqual(res['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(res['Content-Length'], '4')
+
+        res, content = self.get(url, HTTP_RANGE='bytes=7-')
+        self.assertEqual((res.status_code, content), (206, b'789'))
+
+        res, content = self.get(url, HTTP_RANGE='bytes=-3')
+        self.assertEqual((res.status_code, content), (206, b'789'))
+
+    def test_unsatisfiable_range(self, executor):
+        res, content = self.get(self.create_picture(Measurement, self.user), HTTP_RANGE='bytes=10-')
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res['Content-Range'], 'bytes */10')
+
+    def test_range_of_a_changed_file(self, executor):
+        url = self.create_picture(Measurement, self.user)
+        res, content = self.get(url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((res.status_code, content), (200, self.content))
@@ -0,0 +1,67 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import BaseFood
+
+
+class KeysetPaginationTests(TestCase):
+    """Pages follow the ordering across rows with equal sort values,
+    and invalid cursors are not found"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='pages@test.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Foods are ordered by descending name, then descending id
+        for name in ('Apple', 'Pear', 'Pear', 'Pear', 'Pear', 'Plum'):
+            BaseFood.objects.create(name=name, calories=10, user=self.user)
+        self.expected = list(BaseFood.objects.order_by('-name', '-id').values_list('id', flat=True))
+        self.url = reverse('meal:basefood-list')
+
+    def get_page(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_pages_across_ties(self):
+        ids = []
+        pages = []
+        url, params = self.url, {'page_size': 2}
+        while url:
+            page = self.get_page(url, params)
+            ids += [food['id'] for food in page['results']]
+            pages.append(page)
+            url, params = page['next'], None
+        self.assertEqual(ids, self.expected)
+
+        ids = []
+        url = pages[-1]['previous']
+        while url:
+            page = self.get_page(url)
+            ids = [food['id'] for food in page['results']] + ids
+            url = page['previous']
+        self.assertEqual(ids, self.expected[:-2])
+
+    def encode(self, cursor):
+        return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+    def test_invalid_cursor(self):
+        for cursor in (
+            'not a cursor',
+            self.encode({'p': ['Pear'], 'r': 0}),
+            self.encode({'p': ['Pear', 'abc'], 'r': 0}),
+            self.encode({'p': [None, 1], 'r': 0}),
+            self.encode({'p': ['Pear', None], 'r': 0}),
+            self.encode({'p': ['Pear', [1]], 'r': 0}),
+        ):
+            response = self.client.get(self.url, {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+    def test_valid_cursor_value_as_string(self):
+        page = self.get_page(self.url, {'cursor': self.encode({'p': ['Pear', str(self.expected[2])], 'r': 0})})
+        self.assertEqual([food['id'] for food in page['results']], self.expected[3:])
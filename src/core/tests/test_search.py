@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import BaseFood
+from core.search import search, similarity, word_similarity
+
+
+class TrigramTests(SimpleTestCase):
+    """The SQLite functions give the values pg_trgm documents"""
+
+    def test_similarity(self):
+        self.assertAlmostEqual(similarity('word', 'two words'), 4 / 11)
+        self.assertEqual(similarity('apple', 'Apple'), 1)
+        self.assertEqual(similarity('', 'apple'), 0)
+        self.assertIsNone(similarity(None, 'apple'))
+
+    def test_word_similarity(self):
+        self.assertAlmostEqual(word_similarity('word', 'two words'), 0.8)
+        self.assertEqual(word_similarity('apple', 'Green apple pie'), 1)
+        self.assertEqual(word_similarity('kiwi', 'Apple'), 0)
+
+
+class SearchTests(TestCase):
+    """Searches tolerate typos and rank the closest names first"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='search@test.com', password='testpass123')
+        for name in ('Apple', 'Apple pie', 'Green apple pie', 'Pineapple', 'Banana', 'Chocolate'):
+            BaseFood.objects.create(name=name, calories=100, user=self.user)
+
+    def names(self, text):
+        return list(search(BaseFood.objects.all(), 'name', text).values_list('name', flat=True))
+
+    def test_typos(self):
+        self.assertEqual(self.names('chocolat'), ['Chocolate'])
+        self.assertEqual(self.names('bananna'), ['Banana'])
+        self.assertEqual(self.names('xyz'), [])
+
+    def test_ranking(self):
+        self.assertEqual(self.names('apple'), ['Apple', 'Apple pie', 'Green apple pie', 'Pineapple'])
+        self.assertEqual(self.names('apple pie'), ['Apple pie', 'Green apple pie', 'Apple'])
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('meal:basefood-list'), {'q': 'aple'})
+        self.assertEqual([food['name'] for food in response.data['results']][:1], ['Apple'])
@@ -0,0 +1,105 @@
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.uploads import upload_application, upload_backend
+
+
+def png():
+    content = io.BytesIO()
+    Image.new('RGB', (4, 4)).save(content, 'PNG')
+    return content.getvalue()
+
+
+@mock.patch('core.images.executor')
+class DirectUploadTests(TestCase):
+    """Signed upload URLs accept one image of the user, who then sends its key"""
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(MEDIA_ROOT=os.path.join(root, 'media'), UPLOAD_ROOT=os.path.join(root, 'uploads'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = get_user_model().objects.create_user(email='upload@test.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sign(self):
+        upload = self.client.post(reverse('user:uploads-list')).data
+        url = urlsplit(upload['url'])
+        return upload['key'], f'{url.path}?{url.query}'
+
+    def put(self, url, content, content_type='image/png'):
+        return self.client.generic('PUT', url, content, content_type=content_type)
+
+    def test_upload(self, executor):
+        key, url = self.sign()
+        self.assertEqual(self.put(url, png()).status_code, 200)
+        self.assertTrue(upload_backend.exists(key))
+
+        response = self.client.patch(reverse('user:me-list'), {'profile_picture_upload': key})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.profile_picture.name.endswith('.png'))
+
+    def test_expired_or_tampered_url(self, executor):
+        key, url = self.sign()
+        self.assertEqual(self.put(url + 'x', png()).status_code, 403)
+        self.assertEqual(self.put(url.replace(key, upload_backend.create_key(self.user.pk)), png()).status_code, 403)
+        with override_settings(UPLOAD_URL_TIMEOUT=-1):
+            self.assertEqual(self.put(url, png()).status_code, 403)
+        self.assertFalse(upload_backend.exists(key))
+
+    def test_refused_uploads(self, executor):
+        key, url = self.sign()
+        self.assertEqual(self.put(url, b'text', 'text/plain').status_code, 415)
+        with override_settings(UPLOAD_MAX_SIZE=10):
+            self.assertEqual(self.put(url, png()).status_code, 413)
+        self.assertFalse(upload_backend.exists(key))
+
+    @override_settings(UPLOAD_MAX_SIZE=10)
+    def test_too_large_without_content_length(self, executor):
+        key, url = self.sign()
+        path, query = url.split('?')
+        messages = []
+        chunks = [{'type': 'http.request', 'body': b'x' * 8, 'more_body': True}] * 2
+
+        async def receive():
+            return chunks.pop()
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'PUT', 'path': path, 'query_string': query.encode(),
+            'headers': [(b'content-type', b'image/png')],
+        }
+        asyncio.run(upload_application(scope, receive, send))
+        self.assertEqual(messages[0]['status'], 413)
+        self.assertFalse(upload_backend.exists(key))
+        self.assertEqual(os.listdir(os.path.dirname(upload_backend.path(key))), [])
+
+    def test_upload_of_another_user(self, executor):
+        other = get_user_model().objects.create_user(email='other@test.com', password='testpass123')
+        self.client.force_authenticate(other)
+        key, url = self.sign()
+        self.assertEqual(self.put(url, png()).status_code, 200)
+
+        self.client.force_authenticate(self.user)
+        for invalid in (key, f'{self.user.pk}/../{key}', 'invalid'):
+            response = self.client.patch(reverse('user:me-list'), {'profile_picture_upload': invalid})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['profile_picture_upload'][0].code, 'not_found')
+        self.assertTrue(upload_backend.exists(key))
@@ -0,0 +1,167 @@
+import os
+import tempfile
+import time
+import uuid
+from urllib.parse import parse_qs, quote
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.utils.module_loading import import_string
+
+
+# Direct uploads
+#
+# Pictures are uploaded in two steps, so the API never parses multipart
+# bodies of pictures. The API creates a key and signs an upload URL for it, valid for
+# UPLOAD_URL_TIMEOUT seconds, see user.views.UploadView. The client PUTs the
+# bytes to the URL, then sends the key as <field>_upload instead of the file,
+# see core.mixins.DirectUploadMixin, and the finished upload is moved to the
+# media storage.
+#
+# UPLOAD_BACKEND holds the uploads until then. LocalUploadBackend stands in
+# for an object store: it keeps them under UPLOAD_ROOT and receives them at
+# UPLOAD_PATH. Under ASGI an application of its own receives them, see
+# activity_tracker.asgi, so slow uploads hold no thread. Under WSGI
+# core.views.DirectUploadView does. Uploads which are never used are deleted
+# by the clear_uploads command.
+
+class LocalUploadBackend:
+    """Keeps uploads in the local file system"""
+    SALT = 'core.uploads'
+
+    def create_key(self, user_id):
+        """Return a new upload key of the user"""
+        return f'{user_id}/{uuid.uuid4().hex}'
+
+    def get_upload_url(self, request, key):
+        token = signing.TimestampSigner(salt=self.SALT).sign(key)
+        return request.build_absolute_uri(f'{settings.UPLOAD_PATH}{key}?token={quote(token)}')
+
+    def check_token(self, key, token):
+        """Return whether the token signs an upload URL of the key which has not expired"""
+        try:
+            return signing.TimestampSigner(salt=self.SALT).unsign(
+                token, max_age=settings.UPLOAD_URL_TIMEOUT
+            ) == key
+        except signing.BadSignature:
+            return False
+
+    def path(self, key):
+        user_id, name = key.split('/')
+        if not user_id.isdigit() or not name.isalnum():
+            raise ValueError(f'Invalid upload key {key}')
+
+        return os.path.join(settings.UPLOAD_ROOT, user_id, name)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def open(self, key):
+        return File(open(self.path(key), 'rb'))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def delete_expired(self):
+        """Delete the uploads older than UPLOAD_EXPIRE_SECONDS and return how many there were"""
+        deleted = 0
+        limit = time.time() - settings.UPLOAD_EXPIRE_SECONDS
+        for directory, _, filenames in os.walk(settings.UPLOAD_ROOT):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if os.stat(path).st_mtime < limit:
+                    os.remove(path)
+                    deleted += 1
+
+        return deleted
+
+
+upload_backend = import_string(settings.UPLOAD_BACKEND)()
+
+
+class UploadError(Exception):
+    """Refused upload, with the HTTP status of the response"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def check_upload(key, token, content_type, length):
+    """Raise UploadError if the upload to the signed URL must be refused before reading it"""
+    if not upload_backend.check_token(key, token):
+        raise UploadError(403, 'Invalid or expired upload URL')
+    if not content_type.startswith('image/'):
+        raise UploadError(415, 'Uploads must be images')
+    if length.isdigit() and int(length) > settings.UPLOAD_MAX_SIZE:
+        raise UploadError(413, 'Upload too large')
+
+
+class UploadWriter:
+    """Writes the chunks of an upload to a temporary file, moved to the path
+    of its key by commit() once it is complete"""
+
+    def __init__(self, key):
+        self.path = upload_backend.path(key)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, self.temporary_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.part')
+        self.file = os.fdopen(fd, 'wb')
+        self.size = 0
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > settings.UPLOAD_MAX_SIZE:
+            raise UploadError(413, 'Upload too large')
+        self.file.write(chunk)
+
+    def commit(self):
+        self.file.close()
+        os.replace(self.temporary_path, self.path)
+
+    def close(self):
+        """Delete the temporary file unless the upload was committed"""
+        self.file.close()
+        if os.path.exists(self.temporary_path):
+            os.remove(self.temporary_path)
+
+
+async def respond(send, status, body=b''):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def upload_application(scope, receive, send):
+    """ASGI application receiving the PUT requests of signed upload URLs into LocalUploadBackend.
+    Under WSGI core.views.DirectUploadView receives them"""
+    if scope['method'] != 'PUT':
+        return await respond(send, 405, b'Method not allowed')
+
+    key = scope['path'][len(settings.UPLOAD_PATH):]
+    token = parse_qs(scope['query_string'].decode('latin1')).get('token', [''])[0]
+    headers = dict(scope['headers'])
+    try:
+        check_upload(
+            key, token, headers.get(b'content-type', b'').decode('latin1'),
+            headers.get(b'content-length', b'').decode('latin1'),
+        )
+        writer = UploadWriter(key)
+        try:
+            # Chunks are small and written to a local disk, the event loop is not held for long
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                writer.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            writer.commit()
+        finally:
+            writer.close()
+    except UploadError as error:
+        return await respond(send, error.status, str(error).encode())
+
+    await respond(send, 200)
@@ -0,0 +1,192 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import images
+from core.authentication import CachedTokenAuthentication
+from core.models import User, BaseFood, Measurement
+from core.uploads import UploadError, UploadWriter, check_upload
+
+
+class RangeFile:
+    """Reads up to length bytes of an open file from its current position.
+    Exposes the file descriptor, so servers sending files with sendfile
+    still do, limited to the Content-Length of the response"""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class MediaView(APIView):
+    """Serve an uploaded picture to the users allowed to see it.
+
+    Profile pictures are shown to their user and to admins, measurement
+    pictures to their user, food pictures to every user since foods are shown
+    in the catalog. With MEDIA_SERVER, sending the file is handed off to the
+    front server. Stored files never change, see core.storage, so responses
+    have a strong ETag and may be cached for MEDIA_CACHE_MAX_AGE seconds."""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+    def get_pictures(self, directory):
+        """Return the image field and the objects of the user's pictures in the upload directory"""
+        user = self.request.user
+        if directory == 'uploads/profile_picture':
+            return 'profile_picture', User.objects.all() if user.is_staff else User.objects.filter(pk=user.pk)
+        if directory == 'uploads/food_picture':
+            return 'image', BaseFood.objects.all()
+        if directory == 'uploads/measurement_picture':
+            return 'image', Measurement.objects.filter(user=user)
+
+        return None, None
+
+    def has_access(self, name):
+        field_name, pictures = self.get_pictures(posixpath.dirname(name))
+        if pictures is None:
+            return False
+
+        # Variants are shown with their image
+        source = images.variant_source(name)
+        lookup = {f'{field_name}__startswith': f'{source}.'} if source else {field_name: name}
+        return pictures.filter(**lookup).exists()
+
+    def get(self, request, path):
+        name = posixpath.normpath(path)
+        if name != path or not self.has_access(name):
+            raise Http404
+        try:
+            full_path = default_storage.path(name)
+            stat = os.stat(full_path)
+        except (SuspiciousFileOperation, FileNotFoundError):
+            raise Http404
+
+        etag = '"' + hashlib.md5(f'{name}|{stat.st_size}|{stat.st_mtime_ns}'.encode()).hexdigest() + '"'
+        last_modified = int(stat.st_mtime)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.send(request, name, full_path, stat.st_size, etag)
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, max_age=settings.MEDIA_CACHE_MAX_AGE, immutable=True)
+
+        return response
+
+    def send(self, request, name, full_path, size, etag):
+        """Return the response sending the file, or handing it off to the front server"""
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if settings.MEDIA_SERVER == 'nginx':
+            # nginx answers byte ranges itself
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + name
+            return response
+        if settings.MEDIA_SERVER == 'apache':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = full_path
+            return response
+
+        byte_range = self.get_range(request, size, etag)
+        if byte_range is None:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        elif byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        else:
+            start, end = byte_range
+            file = open(full_path, 'rb')
+            file.seek(start)
+            response = FileResponse(RangeFile(file, end - start + 1), status=206, content_type=content_type)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Accept-Ranges'] = 'bytes'
+
+        return response
+
+    def get_range(self, request, size, etag):
+        """Return the first and last byte of the single range requested, None for the whole file,
+        False if the range is not satisfiable. Several ranges are answered with the whole file"""
+        match = self.RANGE_RE.match(request.META.get('HTTP_RANGE', '').replace(' ', ''))
+        if match is None or request.META.get('HTTP_IF_RANGE', etag) != etag:
+            return None
+
+        start, end = match.groups()
+        if not start:
+            if not end:
+                return None
+            # The last bytes of the file
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+        if start > end or start >= size:
+            return False
+
+        return start, end
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DirectUploadView(View):
+    """Receive the PUT request of a signed upload URL into LocalUploadBackend under WSGI,
+    streaming the body. Under ASGI core.uploads.upload_application receives it"""
+    http_method_names = ['put']
+    CHUNK_SIZE = 64 * 1024
+
+    def put(self, request, key):
+        try:
+            check_upload(
+                key, request.GET.get('token', ''), request.META.get('CONTENT_TYPE', ''),
+                request.META.get('CONTENT_LENGTH', ''),
+            )
+            writer = UploadWriter(key)
+            try:
+                for chunk in iter(lambda: request.read(self.CHUNK_SIZE), b''):
+                    writer.write(chunk)
+                writer.commit()
+            finally:
+                writer.close()
+        except UploadError as error:
+            return HttpResponse(str(error), status=error.status, content_type='text/plain')
+
+        return HttpResponse(content_type='text/plain')
+
+
+class LiveEventsView(APIView):
+    """Answer requests for the live event stream under WSGI, which cannot hold
+    idle streams open. Under ASGI core.live.events_application serves them"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        return Response(
+            {'detail': 'Live events are only served by the ASGI application, see activity_tracker.asgi.'},
+            status=status.HTTP_501_NOT_IMPLEMENTED,
+        )
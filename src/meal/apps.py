@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MealsConfig(AppConfig):
     name = 'meal'
+
+    def ready(self):
+        from meal import signals  # noqa: F401
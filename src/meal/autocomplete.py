@@ -0,0 +1,129 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from core.models import BaseFood
+
+
+# Food name autocomplete
+#
+# Every worker keeps the food names in memory as a sorted array holding each
+# name from the start of every word, so a prefix matches a range found by
+# binary search and no query runs per keystroke. Matches are ranked by
+# BaseFood.usage_count, the number of food amounts of the food.
+#
+# Writes to foods increment a generation number in the AUTOCOMPLETE_CACHE_ALIAS
+# cache once they commit, see meal.signals and BaseFoodQuerySet, and an index
+# built for an older generation is rebuilt on the next lookup. With a shared
+# cache this reaches every worker. Usage counts change with every food amount,
+# so they are only refreshed when the index is rebuilt, at least every
+# REFRESH_SECONDS.
+
+GENERATION_KEY = 'meal:autocomplete:generation'
+REFRESH_SECONDS = 300
+MAX_CACHED_PREFIXES = 10000
+
+
+def normalize(text):
+    """Lower case the text and collapse its whitespace"""
+    return ' '.join(text.casefold().split())
+
+
+class PrefixIndex:
+    """Sorted array of food names starting at each of their words"""
+
+    def __init__(self, foods):
+        self.foods = {}
+        entries = []
+        for pk, name, user_id, usage_count in foods:
+            self.foods[pk] = (name, user_id, usage_count)
+            words = normalize(name).split(' ')
+            entries.extend((' '.join(words[i:]), pk) for i in range(len(words)))
+        entries.sort()
+
+        self.keys = [key for key, pk in entries]
+        self.pks = [pk for key, pk in entries]
+        self.results = {}
+
+    def lookup(self, prefix, user_id=None, limit=10):
+        """Return (id, name) of the most used foods with a word starting with the prefix,
+        only of the given user if there is one"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        cache_key = (prefix, user_id, limit)
+        if cache_key not in self.results:
+            if len(self.results) >= MAX_CACHED_PREFIXES:
+                self.results.clear()
+            self.results[cache_key] = self.find(prefix, user_id, limit)
+
+        return self.results[cache_key]
+
+    def find(self, prefix, user_id, limit):
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+        pks = set(self.pks[start:end])
+        if user_id is not None:
+            pks = {pk for pk in pks if self.foods[pk][1] == user_id}
+
+        def rank(pk):
+            name, user_id, usage_count = self.foods[pk]
+            return -usage_count, len(name), name, pk
+
+        return [(pk, self.foods[pk][0]) for pk in heapq.nsmallest(limit, pks, key=rank)]
+
+
+class Autocomplete:
+    """Holds the prefix index of this worker and rebuilds it when it is outdated"""
+
+    def __init__(self):
+        self.index = None
+        self.generation = None
+        self.built_at = 0
+        self.lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.AUTOCOMPLETE_CACHE_ALIAS]
+
+    def is_outdated(self, generation):
+        return (
+            self.index is None or
+            generation != self.generation or
+            time.monotonic() - self.built_at > REFRESH_SECONDS
+        )
+
+    def get_index(self):
+        generation = self.cache.get(GENERATION_KEY, 0)
+        if self.is_outdated(generation):
+            with self.lock:
+                if self.is_outdated(generation):
+                    foods = BaseFood.objects.values_list('pk', 'name', 'user', 'usage_count')
+                    self.index = PrefixIndex(foods.iterator())
+                    self.generation = generation
+                    self.built_at = time.monotonic()
+
+        return self.index
+
+    def lookup(self, prefix, user_id=None, limit=10):
+        return self.get_index().lookup(prefix, user_id, limit)
+
+    def invalidate(self):
+        """Make every worker rebuild its index on the next lookup once the current transaction commits"""
+        transaction.on_commit(self.increment_generation)
+
+    def increment_generation(self):
+        self.generation = None
+        try:
+            self.cache.incr(GENERATION_KEY)
+        except ValueError:
+            self.cache.set(GENERATION_KEY, 1, None)
+
+
+autocomplete = Autocomplete()
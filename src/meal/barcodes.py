@@ -0,0 +1,77 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from core.cache import catalog_cache, entry_timeout
+
+
+# Barcodes
+#
+# BaseFood.barcode holds the EAN-8, EAN-13, UPC-A or GTIN-14 code of packaged
+# foods, normalized so every way of writing a product's code finds it: UPC-A
+# codes are stored as EAN-13 with a leading zero, and GTIN-14 codes of a
+# single item without their leading zero. Lookups hit the unique index of the
+# column.
+#
+# Scanned products are often not in the catalog, so every worker remembers
+# the barcodes without a food. Every write to a food increments the catalog
+# generation, see core.cache.CatalogCache, which forgets them all. Misses are
+# also forgotten after MISS_SECONDS, or LOCAL_CACHE_TIMEOUT with a catalog
+# cache local to each process, which writes of other processes do not reach.
+
+MISS_SECONDS = 300
+MAX_MISSES = 10000
+
+
+def normalize_barcode(code):
+    """Return the normalized barcode, raise ValueError if the code is not a valid barcode"""
+    code = re.sub(r'[\s-]', '', code)
+    if not code.isdigit() or len(code) not in (8, 12, 13, 14):
+        raise ValueError('Enter an EAN-8, EAN-13, UPC-A or GTIN-14 barcode.')
+
+    # Weights alternate between 3 and 1 from the digit before the check digit
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1) for i, digit in enumerate(reversed(code[:-1])))
+    if (10 - total % 10) % 10 != int(code[-1]):
+        raise ValueError('The check digit of the barcode is wrong.')
+
+    if len(code) == 12:
+        return '0' + code
+    if len(code) == 14 and code[0] == '0':
+        return code[1:]
+
+    return code
+
+
+class BarcodeMisses:
+    """Barcodes without a food, remembered by this worker for a catalog generation"""
+
+    def __init__(self):
+        self.generation = None
+        self.misses = OrderedDict()
+        self.lock = threading.Lock()
+
+    def contains(self, generation, code):
+        with self.lock:
+            if generation != self.generation:
+                self.misses.clear()
+                self.generation = generation
+                return False
+
+            missed_at = self.misses.get(code)
+            timeout = entry_timeout(catalog_cache.cache, MISS_SECONDS)
+            return missed_at is not None and time.monotonic() - missed_at < timeout
+
+    def add(self, generation, code):
+        """Remember a barcode found without a food in the given generation"""
+        with self.lock:
+            if generation != self.generation:
+                return
+
+            self.misses.pop(code, None)
+            self.misses[code] = time.monotonic()
+            if len(self.misses) > MAX_MISSES:
+                self.misses.popitem(last=False)
+
+
+barcode_misses = BarcodeMisses()
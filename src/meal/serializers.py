@@ -1,18 +1,77 @@
+from datetime import date
+
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.validators import UniqueValidator
 
+from core.fields import UserPrimaryKeyRelatedField
+from core.mixins import DirectUploadMixin, ImageVariantsMixin
 from core.models import BaseFood, FoodAmount, Recipe, Meal, DailyMeal
+from core.nutrition import creates_cycle
+from meal.barcodes import normalize_barcode
+
+
+class EagerLoadingMixin:
+    """Mixin declaring the relations a serializer renders, so that viewsets
+    can load them up front instead of once per serialized object"""
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Return the queryset with the relations used by this serializer loaded"""
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+
+        return queryset
+
+
+class BarcodeField(serializers.CharField):
+    """Barcode field storing the normalized code, see meal.barcodes.
+    Blank codes are stored as NULL, which the unique column allows more than once"""
 
+    def run_validation(self, data=empty):
+        return super().run_validation(data) or None
 
-class BaseFoodSerializer(serializers.ModelSerializer):
+    def to_internal_value(self, data):
+        code = super().to_internal_value(data)
+        try:
+            return normalize_barcode(code)
+        except ValueError as error:
+            raise serializers.ValidationError(str(error))
+
+
+class BaseFoodSerializer(DirectUploadMixin, ImageVariantsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for BaseFood objects"""
+    image_fields = ('image',)
+    # Declared to check uniqueness of the normalized code
+    barcode = BarcodeField(
+        required=False, allow_null=True, allow_blank=True, max_length=20,
+        validators=[UniqueValidator(queryset=BaseFood.objects.all())],
+    )
 
     class Meta:
         model = BaseFood
-        fields = ('id', 'name', 'calories', 'serving_size', 'is_recipe', 'image')
+        fields = ('id', 'name', 'calories', 'serving_size', 'barcode', 'is_recipe', 'image')
         read_only_fields = ('id', 'is_recipe')
 
 
-class FoodAmountSerializer(serializers.ModelSerializer):
+class FoodImportSerializer(serializers.ModelSerializer):
+    """Serializer for a row of a food catalog import, see the import_foods command"""
+    # Bulk writes fail as a whole on an out of range value
+    calories = serializers.IntegerField(min_value=0, max_value=32767)
+    serving_size = serializers.IntegerField(min_value=0, max_value=32767, required=False)
+
+    class Meta:
+        model = BaseFood
+        fields = ('name', 'calories', 'serving_size')
+
+
+class FoodAmountSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for FoodAmount objects"""
 
     food = serializers.PrimaryKeyRelatedField(
@@ -25,61 +84,102 @@ class FoodAmountSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount', 'food')
         read_only_fields = ('id',)
 
+    def validate_food(self, food):
+        """Check that a recipe ingredient does not make the recipe contain itself"""
+        recipe_id = self.instance.belongs_to_recipe_id if self.instance is not None else None
+        if recipe_id is not None and creates_cycle(recipe_id, [food.pk]):
+            raise serializers.ValidationError(_('A recipe cannot contain itself'), code='cycle')
+
+        return food
 
-class RecipeSerializer(serializers.ModelSerializer):
-    """Serializer for Recipe objects"""
-    ingredients = serializers.PrimaryKeyRelatedField(
+
+class RecipeSerializer(DirectUploadMixin, ImageVariantsMixin, EagerLoadingMixin, serializers.ModelSerializer):
+    """Serializer for Recipe objects.
+    Calories of a recipe with ingredients are derived from them"""
+    image_fields = ('image',)
+    ingredients = UserPrimaryKeyRelatedField(
         many=True,
-        queryset=FoodAmount.objects.all()
+        queryset=FoodAmount.objects.select_related('food')
     )
+    prefetch_related_fields = ('ingredients',)
 
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'calories', 'serving_size', 'is_recipe', 'image', 'instructions', 'ingredients')
         read_only_fields = ('id', 'is_recipe')
 
+    def validate_ingredients(self, ingredients):
+        """Check that the recipe does not contain itself"""
+        if self.instance is not None and creates_cycle(self.instance.pk, [item.food_id for item in ingredients]):
+            raise serializers.ValidationError(_('A recipe cannot contain itself'), code='cycle')
+
+        return ingredients
+
+    def create(self, validated_data):
+        """Create the recipe and move the ingredients to it in one update,
+        as a new recipe has no ingredients to replace"""
+        ingredients = validated_data.pop('ingredients')
+        with transaction.atomic(savepoint=False):
+            recipe = super().create(validated_data)
+            if ingredients:
+                FoodAmount.objects.filter(pk__in=[item.pk for item in ingredients]).update(belongs_to_recipe=recipe)
+
+        return recipe
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for Recipe detail view"""
     ingredients = FoodAmountSerializer(many=True)
 
 
-class MealSerializer(serializers.ModelSerializer):
+class MealSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for Meal objects"""
-    meal_contents = serializers.PrimaryKeyRelatedField(
+    meal_contents = UserPrimaryKeyRelatedField(
         many=True,
-        queryset=FoodAmount.objects.all()
+        queryset=FoodAmount.objects.select_related('food')
     )
+    prefetch_related_fields = ('meal_contents',)
 
     class Meta:
         model = Meal
         fields = ('id', 'calories', 'meal_contents')
-        read_only_fields = ('id',)
+        read_only_fields = ('id', 'calories')
+
+    def create(self, validated_data):
+        """Create the meal and move the meal contents to it in one update,
+        as a new meal has no contents to replace"""
+        meal_contents = validated_data.pop('meal_contents')
+        with transaction.atomic(savepoint=False):
+            meal = super().create(validated_data)
+            if meal_contents:
+                FoodAmount.objects.filter(pk__in=[item.pk for item in meal_contents]).update(belongs_to_meal=meal)
+
+        return meal
 
 
-class MealDetailSerializer(RecipeSerializer):
+class MealDetailSerializer(MealSerializer):
     """Serializer for Meal detail view"""
     meal_contents = FoodAmountSerializer(many=True)
 
 
-class DailyMealSerializer(serializers.ModelSerializer):
+class DailyMealSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for DailyMeal objects"""
-    breakfast = serializers.PrimaryKeyRelatedField(
+    breakfast = UserPrimaryKeyRelatedField(
         many=False,
         allow_null=True,
         queryset=Meal.objects.all()
     )
-    lunch = serializers.PrimaryKeyRelatedField(
+    lunch = UserPrimaryKeyRelatedField(
         many=False,
         allow_null=True,
         queryset=Meal.objects.all()
     )
-    diner = serializers.PrimaryKeyRelatedField(
+    diner = UserPrimaryKeyRelatedField(
         many=False,
         allow_null=True,
         queryset=Meal.objects.all()
     )
-    snack = serializers.PrimaryKeyRelatedField(
+    snack = UserPrimaryKeyRelatedField(
         many=False,
         allow_null=True,
         queryset=Meal.objects.all()
@@ -88,12 +188,138 @@ class DailyMealSerializer(serializers.ModelSerializer):
     class Meta:
         model = DailyMeal
         fields = ('id', 'date', 'calories', 'breakfast', 'lunch', 'diner', 'snack', 'water_glasses')
-        read_only_fields = ('id',)
+        read_only_fields = ('id', 'calories')
+
+    def validate_date(self, value):
+        """Check that the user has no other daily meal of the date"""
+        if self.instance is not None and self.instance.date == value:
+            return value
+        if DailyMeal.objects.filter(user=self.context['request'].user, date=value).exists():
+            raise serializers.ValidationError(_('A daily meal of this date already exists.'))
+
+        return value
 
 
-class DailyMealDetailSerializer(RecipeSerializer):
+class DailyMealDetailSerializer(DailyMealSerializer):
     """Serializer for DailyMeal detail view"""
     breakfast = MealSerializer(many=False)
     lunch = MealSerializer(many=False)
     diner = MealSerializer(many=False)
     snack = MealSerializer(many=False)
+    select_related_fields = ('breakfast', 'lunch', 'diner', 'snack')
+    prefetch_related_fields = (
+        'breakfast__meal_contents',
+        'lunch__meal_contents',
+        'diner__meal_contents',
+        'snack__meal_contents',
+    )
+
+
+class FoodAmountLogSerializer(serializers.ModelSerializer):
+    """Serializer for a food amount logged inline with a meal.
+    Foods are resolved for all meals at once by DailyMealLogSerializer"""
+    food = serializers.IntegerField()
+
+    class Meta:
+        model = FoodAmount
+        fields = ('amount', 'food')
+        extra_kwargs = {'amount': {'default': 1}}
+
+
+class DailyMealLogSerializer(EagerLoadingMixin, serializers.Serializer):
+    """Serializer for logging the food of one or more meals of a day at once"""
+    MEALS = ('breakfast', 'lunch', 'diner', 'snack')
+
+    date = serializers.DateField(default=date.today)
+    water_glasses = serializers.IntegerField(min_value=0, max_value=32767, required=False)
+    breakfast = FoodAmountLogSerializer(many=True, required=False)
+    lunch = FoodAmountLogSerializer(many=True, required=False)
+    diner = FoodAmountLogSerializer(many=True, required=False)
+    snack = FoodAmountLogSerializer(many=True, required=False)
+    select_related_fields = DailyMealDetailSerializer.select_related_fields
+    prefetch_related_fields = DailyMealDetailSerializer.prefetch_related_fields
+
+    def validate(self, data):
+        """Check that something is logged and resolve all foods in one query"""
+        if 'water_glasses' not in data and not any(data.get(meal) for meal in self.MEALS):
+            msg = _('Nothing to log, provide food for at least one meal or water_glasses')
+            raise serializers.ValidationError(msg)
+
+        items = [item for meal in self.MEALS for item in data.get(meal, [])]
+        foods = BaseFood.objects.in_bulk({item['food'] for item in items})
+        for item in items:
+            if item['food'] not in foods:
+                msg = _('Invalid pk "{pk_value}" - object does not exist.').format(pk_value=item['food'])
+                raise serializers.ValidationError(msg, code='does_not_exist')
+            item['food'] = foods[item['food']]
+
+        return data
+
+    def create(self, validated_data):
+        """Add the logged food to the meals of the user's daily meal for the given date,
+        creating the daily meal and its meals where they do not exist yet"""
+        user = validated_data['user']
+        with transaction.atomic():
+            # Locks the daily meal, or waits for a concurrent log creating it
+            daily_meal, created = DailyMeal.objects.select_related(*self.MEALS).select_for_update(
+                of=('self',),
+            ).get_or_create(user=user, date=validated_data['date'])
+            changed = 'water_glasses' in validated_data
+            if changed:
+                daily_meal.water_glasses = validated_data['water_glasses']
+
+            for name in self.MEALS:
+                if validated_data.get(name) and getattr(daily_meal, name) is None:
+                    setattr(daily_meal, name, Meal.objects.create(user=user))
+                    changed = True
+            if changed:
+                daily_meal.save()
+
+            # Adds the calories to the meals and the daily meal
+            FoodAmount.objects.bulk_create([
+                FoodAmount(
+                    food=item['food'],
+                    amount=item['amount'],
+                    belongs_to_meal=getattr(daily_meal, name),
+                    user=user,
+                )
+                for name in self.MEALS
+                for item in validated_data.get(name, [])
+            ])
+
+        return daily_meal
+
+
+class DailyMealSummaryQuerySerializer(serializers.Serializer):
+    """Serializer for the query parameters of DailyMeal summaries"""
+    period = serializers.ChoiceField(choices=('day', 'week', 'month'), default='day')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        """Check that the date range is not reversed"""
+        if 'start' in data and 'end' in data and data['start'] > data['end']:
+            raise serializers.ValidationError(_('start must not be after end'))
+
+        return data
+
+
+class DailyMealSummarySerializer(serializers.Serializer):
+    """Serializer for the calories and water glasses of a day, ISO week or month"""
+    period = serializers.DateField()
+    calories = serializers.IntegerField()
+    water_glasses = serializers.IntegerField()
+    days = serializers.IntegerField()
+
+
+class AutocompleteQuerySerializer(serializers.Serializer):
+    """Serializer for the query parameters of food autocomplete"""
+    q = serializers.CharField()
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+    all = serializers.IntegerField(default=0)
+
+
+class AutocompleteSerializer(serializers.Serializer):
+    """Serializer for an autocompleted food"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.models import BaseFood, Recipe
+from meal.autocomplete import autocomplete
+
+
+@receiver(post_save, sender=BaseFood)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=BaseFood)
+@receiver(post_delete, sender=Recipe)
+def food_changed(sender, instance, **kwargs):
+    """Rebuild the autocomplete index after a food is written"""
+    autocomplete.invalidate()
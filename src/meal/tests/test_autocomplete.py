@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.core.cache import caches
+from django.test import TransactionTestCase, override_settings
+
+from core.models import BaseFood
+from meal.autocomplete import GENERATION_KEY, autocomplete
+
+
+class AutocompleteTests(TransactionTestCase):
+    """The index is rebuilt once writes to food names commit.
+    The tests commit, since invalidations wait for it"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='autocomplete@test.com', password='testpass123')
+        self.food = BaseFood.objects.create(name='Green apple', user=self.user)
+
+    def names(self, prefix):
+        return [name for pk, name in autocomplete.lookup(prefix)]
+
+    def test_save(self):
+        self.assertEqual(self.names('app'), ['Green apple'])
+        with transaction.atomic():
+            self.food.name = 'Red pear'
+            self.food.save()
+            # Not rebuilt from uncommitted rows
+            self.assertEqual(self.names('app'), ['Green apple'])
+        self.assertEqual(self.names('app'), [])
+        self.assertEqual(self.names('pea'), ['Red pear'])
+
+    def test_bulk_update(self):
+        self.assertEqual(self.names('app'), ['Green apple'])
+        BaseFood.objects.filter(pk=self.food.pk).update(name='Red pear')
+        self.assertEqual(self.names('pea'), ['Red pear'])
+
+    @override_settings(
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'autocomplete': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'autocomplete'},
+        },
+        AUTOCOMPLETE_CACHE_ALIAS='autocomplete',
+    )
+    def test_cache_alias(self):
+        default_generation = caches['default'].get(GENERATION_KEY)
+        self.assertEqual(self.names('app'), ['Green apple'])
+        self.food.name = 'Red pear'
+        self.food.save()
+        self.assertEqual(caches['autocomplete'].get(GENERATION_KEY), 1)
+        self.assertEqual(caches['default'].get(GENERATION_KEY), default_generation)
+        self.assertEqual(self.names('pea'), ['Red pear'])
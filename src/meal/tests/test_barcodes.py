@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import BaseFood
+from meal.barcodes import normalize_barcode
+
+
+class NormalizeBarcodeTests(TestCase):
+    """Every way of writing a product's code is stored as the same code"""
+
+    def test_normalization(self):
+        self.assertEqual(normalize_barcode('4006381333931'), '4006381333931')
+        self.assertEqual(normalize_barcode('4006-3813 33931'), '4006381333931')
+        self.assertEqual(normalize_barcode('96385074'), '96385074')
+        # UPC-A as EAN-13, GTIN-14 of a single item without its leading zero
+        self.assertEqual(normalize_barcode('036000291452'), '0036000291452')
+        self.assertEqual(normalize_barcode('00036000291452'), '0036000291452')
+        self.assertEqual(normalize_barcode('10036000291459'), '10036000291459')
+
+    def test_check_digit(self):
+        for code in ('4006381333932', '96385075', '036000291453'):
+            with self.assertRaisesMessage(ValueError, 'check digit'):
+                normalize_barcode(code)
+
+    def test_invalid(self):
+        for code in ('', '1234567', '123456789', 'abcdefgh', '40063813339310'):
+            with self.assertRaises(ValueError):
+                normalize_barcode(code)
+
+
+class BarcodeApiTests(TestCase):
+    """Foods are found by any way of writing their barcode, which is unique"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='barcode@test.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('meal:basefood-list')
+
+    def create(self, barcode):
+        return self.client.post(self.url, {'name': 'Cereal', 'calories': 380, 'barcode': barcode}, format='json')
+
+    def test_create_and_lookup(self):
+        response = self.create('036000291452')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['barcode'], '0036000291452')
+
+        response = self.client.get(reverse('meal:basefood-barcode', args=['00036000291452']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Cereal')
+
+    def test_uniqueness_conflict(self):
+        self.create('0036000291452')
+        response = self.create('036000291452')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('barcode', response.data)
+
+    def test_blank(self):
+        for barcode in ('', '', None):
+            response = self.create(barcode)
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNone(response.data['barcode'])
+        self.assertEqual(BaseFood.objects.filter(barcode__isnull=True).count(), 3)
+
+    def test_invalid(self):
+        response = self.create('4006381333932')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('barcode', response.data)
@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import BaseFood, DailyMeal
+
+
+class DailyMealLogTests(TestCase):
+    """Logging adds food to the meals of the user's one daily meal of the date"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='log@test.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.bread = BaseFood.objects.create(name='Bread', calories=100, user=self.user)
+        self.apple = BaseFood.objects.create(name='Apple', calories=50, user=self.user)
+        self.url = reverse('meal:dailymeal-log')
+
+    def log(self, data):
+        response = self.client.post(self.url, dict(data, date='2024-01-01'), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.data
+
+    def test_calories(self):
+        data = self.log({
+            'breakfast': [{'food': self.bread.id, 'amount': 2}, {'food': self.apple.id}],
+            'snack': [{'food': self.apple.id, 'amount': 3}],
+        })
+        self.assertEqual(data['breakfast']['calories'], 250)
+        self.assertEqual(data['snack']['calories'], 150)
+        self.assertIsNone(data['lunch'])
+        self.assertEqual(data['calories'], 400)
+        self.assertEqual(DailyMeal.objects.get().calories, 400)
+
+    def test_appends_to_the_meal_of_the_slot(self):
+        first = self.log({'breakfast': [{'food': self.bread.id}]})
+        second = self.log({'breakfast': [{'food': self.apple.id}], 'lunch': [{'food': self.bread.id}]})
+
+        self.assertEqual(second['id'], first['id'])
+        self.assertEqual(second['breakfast']['id'], first['breakfast']['id'])
+        self.assertEqual(len(second['breakfast']['meal_contents']), 2)
+        self.assertEqual(second['breakfast']['calories'], 150)
+        self.assertEqual(second['calories'], 250)
+        self.assertEqual(DailyMeal.objects.count(), 1)
+
+    def test_water_glasses_only(self):
+        self.log({'breakfast': [{'food': self.bread.id}], 'water_glasses': 2})
+        data = self.log({'water_glasses': 5})
+        self.assertEqual(data['water_glasses'], 5)
+        self.assertEqual(data['calories'], 100)
+
+        self.assertEqual(self.client.post(self.url, {}, format='json').status_code, 400)
+
+    def test_one_daily_meal_per_date(self):
+        self.log({'water_glasses': 1})
+        url = reverse('meal:dailymeal-list')
+        slots = {'breakfast': None, 'lunch': None, 'diner': None, 'snack': None}
+        response = self.client.post(url, dict(slots, date='2024-01-01'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.data)
+
+        daily_meal = self.client.post(url, dict(slots, date='2024-01-02'), format='json').data
+        detail = reverse('meal:dailymeal-detail', args=[daily_meal['id']])
+        self.assertEqual(self.client.patch(detail, {'date': '2024-01-01'}, format='json').status_code, 400)
+        self.assertEqual(self.client.patch(detail, {'date': '2024-01-02'}, format='json').status_code, 200)
+        self.assertEqual(self.client.patch(detail, {'date': '2024-01-03'}, format='json').status_code, 200)
@@ -0,0 +1,84 @@
+from django.urls import reverse
+
+from core.models import BaseFood, FoodAmount
+from core.tests.query_budget import QueryBudgetTestCase
+
+
+class MealQueryBudgetTests(QueryBudgetTestCase):
+    """Query budgets of the food and meal API"""
+
+    def test_base_food_budget(self):
+        self.assertQueryBudget(2, 'get', reverse('meal:basefood-list'))
+        self.assertQueryBudget(2, 'get', reverse('meal:basefood-list') + '?all=1')
+        self.assertQueryBudget(2, 'get', reverse('meal:basefood-list') + '?all=1&q=fod')
+        self.assertQueryBudget(1, 'get', reverse('meal:basefood-autocomplete') + '?all=1&q=fo')
+        self.assertQueryBudget(2, 'get', reverse('meal:basefood-detail', args=[self.food.id]))
+        BaseFood.objects.filter(pk=self.food.id).update(barcode='4006381333931')
+        self.assertQueryBudget(1, 'get', reverse('meal:basefood-barcode', args=['4006381333931']))
+        self.assertQueryBudget(1, 'post', reverse('meal:basefood-list'), {'name': 'Apple', 'calories': 52})
+        url = reverse('meal:basefood-detail', args=[self.food.id])
+        self.assertQueryBudget(17, 'put', url, {'name': 'Food', 'calories': 20})
+        self.assertQueryBudget(17, 'patch', url, {'calories': 30})
+        self.assertQueryBudget(21, 'delete', url)
+
+    def test_food_amount_budget(self):
+        self.assertQueryBudget(2, 'get', reverse('meal:foodamount-list'))
+        self.assertQueryBudget(2, 'get', reverse('meal:foodamount-detail', args=[self.food_amount.id]))
+        self.assertQueryBudget(3, 'post', reverse('meal:foodamount-list'), {'food': self.food.id, 'amount': 2})
+        url = reverse('meal:foodamount-detail', args=[self.food_amount.id])
+        self.assertQueryBudget(4, 'put', url, {'food': self.food.id, 'amount': 3})
+        self.assertQueryBudget(3, 'patch', url, {'amount': 4})
+        self.assertQueryBudget(4, 'delete', url)
+
+    def test_recipe_budget(self):
+        self.assertQueryBudget(3, 'get', reverse('meal:recipe-list'))
+        self.assertQueryBudget(3, 'get', reverse('meal:recipe-list') + '?q=recipe')
+        self.assertQueryBudget(3, 'get', reverse('meal:recipe-detail', args=[self.recipe.id]))
+        self.assertQueryBudget(14, 'post', reverse('meal:recipe-list'), {
+            'name': 'Salad',
+            'ingredients': [food_amount.id for food_amount in FoodAmount.objects.filter(user=self.user)],
+        })
+        url = reverse('meal:recipe-detail', args=[self.recipe.id])
+        ingredients = FoodAmount.objects.filter(belongs_to_recipe=self.recipe)
+        self.assertQueryBudget(13, 'put', url, {
+            'name': 'Soup',
+            'ingredients': [food_amount.id for food_amount in ingredients],
+        })
+        self.assertQueryBudget(11, 'patch', url, {'name': 'Stew'})
+        self.assertQueryBudget(8, 'delete', url)
+
+    def test_meal_budget(self):
+        self.assertQueryBudget(3, 'get', reverse('meal:meal-list'))
+        self.assertQueryBudget(3, 'get', reverse('meal:meal-detail', args=[self.meal.id]))
+        self.assertQueryBudget(0, 'get', reverse('meal:meal-detail', args=[self.meal.id]))
+        self.assertQueryBudget(12, 'post', reverse('meal:meal-list'), {
+            'meal_contents': [food_amount.id for food_amount in FoodAmount.objects.filter(user=self.user)],
+        })
+        url = reverse('meal:meal-detail', args=[self.meal.id])
+        meal_contents = [food_amount.id for food_amount in FoodAmount.objects.filter(belongs_to_meal=self.meal)]
+        self.assertQueryBudget(7, 'put', url, {'meal_contents': meal_contents})
+        self.assertQueryBudget(7, 'patch', url, {'meal_contents': meal_contents[:1]})
+        self.assertQueryBudget(10, 'delete', url)
+
+    def test_daily_meal_budget(self):
+        self.assertQueryBudget(2, 'get', reverse('meal:dailymeal-list'))
+        self.assertQueryBudget(6, 'get', reverse('meal:dailymeal-detail', args=[self.daily_meal.id]))
+        self.assertQueryBudget(0, 'get', reverse('meal:dailymeal-detail', args=[self.daily_meal.id]))
+        self.assertQueryBudget(1, 'get', reverse('meal:dailymeal-summary') + '?period=week')
+        self.assertQueryBudget(17, 'post', reverse('meal:dailymeal-log'), {
+            'breakfast': [{'food': self.food.id, 'amount': 2}] * self.rows,
+            'snack': [{'food': food.id} for food in BaseFood.objects.filter(user=self.user)],
+        })
+        url = reverse('meal:dailymeal-detail', args=[self.daily_meal.id])
+        self.assertQueryBudget(8, 'put', url, {
+            'date': str(self.daily_meal.date), 'breakfast': self.daily_meal.breakfast_id,
+            'lunch': self.daily_meal.lunch_id, 'diner': self.daily_meal.diner_id, 'snack': self.meal.id,
+            'water_glasses': 2,
+        })
+        self.assertQueryBudget(4, 'patch', url, {'water_glasses': 3})
+        self.assertQueryBudget(3, 'delete', url)
+
+
+class LargeMealQueryBudgetTests(MealQueryBudgetTests):
+    """Same budgets with many rows per user"""
+    rows = 12
@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import BaseFood, FoodAmount, Recipe
+
+
+class RecipeCycleTests(TestCase):
+    """A recipe cannot contain itself, directly or through other recipes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='cycle@test.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.food = BaseFood.objects.create(name='Apple', calories=50, user=self.user)
+        self.inner = Recipe.objects.create(name='Sauce', user=self.user)
+        self.outer = Recipe.objects.create(name='Pasta', user=self.user)
+        self.ingredient = FoodAmount.objects.create(food=self.food, belongs_to_recipe=self.inner, user=self.user)
+        FoodAmount.objects.create(food=self.inner, belongs_to_recipe=self.outer, user=self.user)
+
+    def assertCycle(self, res, field):
+        self.assertEqual(res.status_code, 400, res.content)
+        self.assertEqual(res.data[field][0].code, 'cycle')
+
+    def test_recipe_containing_itself(self):
+        food_amount = FoodAmount.objects.create(food=self.inner, user=self.user)
+        res = self.client.patch(
+            reverse('meal:recipe-detail', args=[self.inner.id]),
+            {'ingredients': [self.ingredient.id, food_amount.id]},
+            format='json',
+        )
+        self.assertCycle(res, 'ingredients')
+
+    def test_recipe_containing_itself_through_another_recipe(self):
+        food_amount = FoodAmount.objects.create(food=self.outer, user=self.user)
+        res = self.client.patch(
+            reverse('meal:recipe-detail', args=[self.inner.id]),
+            {'ingredients': [self.ingredient.id, food_amount.id]},
+            format='json',
+        )
+        self.assertCycle(res, 'ingredients')
+        self.assertEqual(list(self.inner.ingredients.all()), [self.ingredient])
+
+    def test_ingredient_changed_to_a_containing_recipe(self):
+        res = self.client.patch(
+            reverse('meal:foodamount-detail', args=[self.ingredient.id]), {'food': self.outer.id}, format='json',
+        )
+        self.assertCycle(res, 'food')
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.food_id, self.food.id)
+
+    def test_recipe_ingredients_without_cycle(self):
+        food_amount = FoodAmount.objects.create(food=self.inner, user=self.user)
+        res = self.client.patch(
+            reverse('meal:recipe-detail', args=[self.outer.id]),
+            {'ingredients': [food_amount.id]},
+            format='json',
+        )
+        self.assertEqual(res.status_code, 200, res.content)
@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import BaseFood, DailyMeal
+
+
+class DailyMealSummaryTests(TestCase):
+    """Summaries add up the calories and water glasses of the days of each period"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='summary@test.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        food = BaseFood.objects.create(name='Bread', calories=100, user=self.user)
+
+        # Monday and Wednesday of one ISO week, the Monday after and a day of the next month
+        for day, amount, water_glasses in [
+            ('2024-01-01', 1, 2), ('2024-01-03', 2, 3), ('2024-01-08', 3, 4), ('2024-02-01', 4, 5),
+        ]:
+            self.client.post(reverse('meal:dailymeal-log'), {
+                'date': day, 'water_glasses': water_glasses, 'breakfast': [{'food': food.id, 'amount': amount}],
+            }, format='json')
+
+        other = get_user_model().objects.create_user(email='other@test.com', password='testpass123')
+        DailyMeal.objects.create(user=other, date='2024-01-01', water_glasses=8)
+
+    def summary(self, **params):
+        response = self.client.get(reverse('meal:dailymeal-summary'), params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['period'], row['calories'], row['water_glasses'], row['days']) for row in response.data]
+
+    def test_days(self):
+        self.assertEqual(self.summary(period='day'), [
+            ('2024-01-01', 100, 2, 1), ('2024-01-03', 200, 3, 1), ('2024-01-08', 300, 4, 1), ('2024-02-01', 400, 5, 1),
+        ])
+
+    def test_weeks(self):
+        self.assertEqual(self.summary(period='week'), [
+            ('2024-01-01', 300, 5, 2), ('2024-01-08', 300, 4, 1), ('2024-01-29', 400, 5, 1),
+        ])
+
+    def test_months(self):
+        self.assertEqual(self.summary(period='month'), [('2024-01-01', 600, 9, 3), ('2024-02-01', 400, 5, 1)])
+
+    def test_date_range(self):
+        self.assertEqual(self.summary(period='month', start='2024-01-02', end='2024-01-31'), [
+            ('2024-01-01', 500, 7, 2),
+        ])
+        response = self.client.get(reverse('meal:dailymeal-summary'), {'start': '2024-02-01', 'end': '2024-01-01'})
+        self.assertEqual(response.status_code, 400)
@@ -16,18 +16,24 @@ router.register('daily_meals', views.DailyMealViewSet)
 # Authenticated users
 # /api/meal/base_foods[/all] - list BaseFoods for current user [or for all users]
 # /api/meal/base_foods/<id> - view detail of BaseFood
+# /api/meal/base_foods?q=<text>[&all=1] - BaseFoods with a name similar to or containing the text, best first
+# /api/meal/base_foods/autocomplete?q=<prefix>[&all=1&limit=] - most used BaseFoods with a word starting with prefix
+# /api/meal/base_foods/barcode/<code> - BaseFood of any user with the EAN or UPC barcode
 #
 # /api/meal/food_amounts[/all] - list FoodAmounts for current user
 # /api/meal/food_amounts/<id> - view detail of FoodAmount
 #
 # /api/meal/recipes[/all] - list Recipes for current user [or for all users]
 # /api/meal/recipes/<id> - view detail of Recipe
+# /api/meal/recipes?q=<text>[&all=1] - Recipes with a name similar to or containing the text, best first
 #
 # /api/meal/meals[/all] - list Meals for current user
 # /api/meal/meals/<id> - view detail of Meal
 #
 # /api/meal/daily_meals[/all] - list DailyMeals for current user
 # /api/meal/daily_meals/<id> - view detail of DailyMeal
+# /api/meal/daily_meals/log - log food for one or more meals of a day in one request
+# /api/meal/daily_meals/summary[?period=day|week|month&start=&end=] - calories and water per period
 #
 
 urlpatterns = [
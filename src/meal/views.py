@@ -1,17 +1,27 @@
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core.authentication import CachedTokenAuthentication
+from core.cache import catalog_cache
+from core.mixins import ConditionalGetMixin
 from core.models import BaseFood, FoodAmount, Recipe, Meal, DailyMeal
+from core.pagination import KeysetPagination
+from core.search import search
 from . import serializers
+from .autocomplete import autocomplete
+from .barcodes import barcode_misses, normalize_barcode
 
 
-class DefaultViewSet(viewsets.ModelViewSet):
+class DefaultViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Default ViewSet for food"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """Return objects for the current authenticated user only or all"""
@@ -21,6 +31,7 @@ class DefaultViewSet(viewsets.ModelViewSet):
         queryset = self.queryset
         if not all:
             queryset = queryset.filter(user=self.request.user)
+        queryset = self.get_serializer_class().setup_eager_loading(queryset)
 
         return queryset.order_by('-name').distinct()
 
@@ -33,6 +44,52 @@ class BaseFoodViewSet(DefaultViewSet):
     """Manage BaseFood in the database"""
     queryset = BaseFood.objects.all()
     serializer_class = serializers.BaseFoodSerializer
+    cache_catalog = True
+
+    def get_queryset(self):
+        """Return objects for the current authenticated user only or all,
+        best matches first when searching by name"""
+        queryset = super().get_queryset()
+        text = self.request.query_params.get('q')
+        if text:
+            queryset = search(queryset, 'name', text)
+
+        return queryset
+
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request):
+        """Most used foods with a word starting with the given text,
+        answered from the in-memory index of this worker"""
+        query = serializers.AutocompleteQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        user_id = None if params['all'] else self.request.user.id
+        foods = autocomplete.lookup(params['q'], user_id, params['limit'])
+        return Response(serializers.AutocompleteSerializer(
+            [{'id': pk, 'name': name} for pk, name in foods], many=True
+        ).data)
+
+    @action(methods=['GET'], detail=False, url_path=r'barcode/(?P<code>[^/]+)')
+    def barcode(self, request, code):
+        """Food of any user with the given barcode. Barcodes without a food
+        are remembered by this worker until the catalog changes"""
+        try:
+            code = normalize_barcode(code)
+        except ValueError as error:
+            raise ValidationError({'code': [str(error)]})
+
+        # Read before the food, so a food written meanwhile forgets the miss
+        generation = catalog_cache.get_generation()
+        food = None
+        if not barcode_misses.contains(generation, code):
+            food = BaseFood.objects.filter(barcode=code).first()
+            if food is None:
+                barcode_misses.add(generation, code)
+        if food is None:
+            raise NotFound('No food with this barcode.')
+
+        return Response(self.get_serializer(food).data)
 
 
 class FoodAmountViewSet(DefaultViewSet):
@@ -48,16 +105,19 @@ class FoodAmountViewSet(DefaultViewSet):
         queryset = self.queryset
         if not all:
             queryset = queryset.filter(user=self.request.user)
+        queryset = self.get_serializer_class().setup_eager_loading(queryset)
 
         return queryset.order_by('-id')
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Manage recipes in the database"""
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    cache_catalog = True
 
     def get_queryset(self):
         """Retrieve the recipes for the authenticated user only or all"""
@@ -67,7 +127,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
         queryset = self.queryset
         if not all:
             queryset = queryset.filter(user=self.request.user)
-        
+        queryset = self.get_serializer_class().setup_eager_loading(queryset)
+
+        text = self.request.query_params.get('q')
+        if text:
+            return search(queryset, 'name', text)
+
         return queryset.order_by('-id')
 
     def get_serializer_class(self):
@@ -79,19 +144,27 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         """Create a new recipe"""
-        print(f'Dimitrije {serializer.data}')
-        serializer.save(user=self.request.user)
+        recipe = serializer.save(user=self.request.user)
+        # Calories are derived once the ingredients are added
+        recipe.refresh_from_db(fields=['calories'])
+
+    def perform_update(self, serializer):
+        """Update a recipe"""
+        recipe = serializer.save()
+        recipe.refresh_from_db(fields=['calories'])
 
-class MealViewSet(viewsets.ModelViewSet):
+class MealViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Manage meals in the database"""
     serializer_class = serializers.MealSerializer
     queryset = Meal.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    cache_retrieve = True
 
     def get_queryset(self):
         """Retrieve meals for the authenticated user only"""
-        queryset = self.queryset
+        queryset = self.get_serializer_class().setup_eager_loading(self.queryset)
         return queryset.filter(user=self.request.user).order_by('-id')
 
     def get_serializer_class(self):
@@ -102,44 +175,69 @@ class MealViewSet(viewsets.ModelViewSet):
         return self.serializer_class
 
     def perform_create(self, serializer):
-        """Create a new meal"""
-        meal_calories_sum = 0
-        for food_amount in  serializer.validated_data['meal_contents']:
-            meal_calories_sum = meal_calories_sum + food_amount.amount * food_amount.food.calories
-        serializer.save(user=self.request.user, calories=meal_calories_sum)
+        """Create a new meal, its calories are added up from the meal contents"""
+        meal = serializer.save(user=self.request.user)
+        meal.refresh_from_db(fields=['calories'])
+
+    def perform_update(self, serializer):
+        """Update a meal"""
+        meal = serializer.save()
+        meal.refresh_from_db(fields=['calories'])
 
-class DailyMealViewSet(viewsets.ModelViewSet):
+class DailyMealViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Manage daily meals in the database"""
     serializer_class = serializers.DailyMealSerializer
     queryset = DailyMeal.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    cache_retrieve = True
 
     def get_queryset(self):
         """Retrieve daily meals for the authenticated user only"""
-        queryset = self.queryset
+        queryset = self.get_serializer_class().setup_eager_loading(self.queryset)
         return queryset.filter(user=self.request.user).order_by('-date')
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
         if self.action == 'retrieve':
             return serializers.DailyMealDetailSerializer
+        elif self.action == 'log':
+            return serializers.DailyMealLogSerializer
 
         return self.serializer_class
 
+    @action(methods=['POST'], detail=False)
+    def log(self, request):
+        """Log the food of one or more meals of a day in a single request"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        daily_meal = serializer.save(user=self.request.user)
+
+        daily_meal = self.get_queryset().get(pk=daily_meal.pk)
+        data = serializers.DailyMealDetailSerializer(daily_meal, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(methods=['GET'], detail=False)
+    def summary(self, request):
+        """Sum calories and water glasses per day, ISO week or month of a date range"""
+        query = serializers.DailyMealSummaryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        truncate = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}[query.validated_data['period']]
+
+        queryset = self.queryset.filter(user=self.request.user)
+        if 'start' in query.validated_data:
+            queryset = queryset.filter(date__gte=query.validated_data['start'])
+        if 'end' in query.validated_data:
+            queryset = queryset.filter(date__lte=query.validated_data['end'])
+
+        rows = queryset.annotate(period=truncate('date')).values('period').annotate(
+            calories=Sum('calories'),
+            water_glasses=Sum('water_glasses'),
+            days=Count('date', distinct=True),
+        ).order_by('period')
+        return Response(serializers.DailyMealSummarySerializer(rows, many=True).data)
+
     def perform_create(self, serializer):
-        """Create a new daily meal"""
-        daily_meal_calories_sum = 0
-        breakfast = serializer.validated_data['breakfast']
-        lunch = serializer.validated_data['lunch']
-        diner = serializer.validated_data['diner']
-        snack = serializer.validated_data['snack']
-        if (breakfast):
-            daily_meal_calories_sum = daily_meal_calories_sum + breakfast.calories
-        if (lunch):
-            daily_meal_calories_sum = daily_meal_calories_sum + lunch.calories
-        if (diner):
-            daily_meal_calories_sum = daily_meal_calories_sum + diner.calories
-        if (snack):
-            daily_meal_calories_sum = daily_meal_calories_sum + snack.calories
-        serializer.save(user=self.request.user, calories=daily_meal_calories_sum)
\ No newline at end of file
+        """Create a new daily meal, its calories are added up from the meals"""
+        serializer.save(user=self.request.user)
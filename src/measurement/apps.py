@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MeasurementConfig(AppConfig):
     name = 'measurement'
+
+    def ready(self):
+        from measurement import signals  # noqa: F401
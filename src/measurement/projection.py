@@ -0,0 +1,171 @@
+import math
+from bisect import bisect_left
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.db.models import Count, Sum
+
+from core.models import Measurement, DailyMeal, WeightProjection
+
+
+# Goal date projection
+#
+# Between two consecutive weight measurements the weight changes at a daily
+# rate, which is regressed on the mean calorie intake logged in DailyMeal over
+# the same days: rate = a + b * intake. Older intervals count less, every day
+# multiplies their weight by DECAY, so the fit follows recent measurements.
+#
+# WeightProjection stores the weighted sums of the regression. A measurement
+# newer than the last one adds a single interval to the sums, so the fit is
+# refreshed incrementally. Edited, deleted or backdated measurements, and
+# changed calories of days already fitted, mark the sums stale and they are
+# rebuilt from all measurements on the next request, see measurement.signals
+# and WeightProjectionQuerySet. The intake of an interval is logged from the
+# day of its first measurement to the day before its last one. Intervals
+# without logged intake are left out of the fit.
+
+DECAY = 0.98
+INTAKE_DAYS = 7
+MAX_DAYS = 3650
+Z_SCORE = 1.96
+SUM_FIELDS = ('weight_sum', 'intake_sum', 'rate_sum', 'intake_sq_sum', 'intake_rate_sum', 'rate_sq_sum')
+
+
+def mean_intake(user, since, until):
+    """Return the mean calories of the days logged from `since` up to and
+    excluding `until`, None when no day was logged"""
+    logged = DailyMeal.objects.filter(
+        user=user, date__gte=since, date__lt=until, calories__gt=0,
+    ).aggregate(calories=Sum('calories'), days=Count('date', distinct=True))
+    if not logged['days']:
+        return None
+
+    return logged['calories'] / logged['days']
+
+
+def add_measurement(fit, day, weight, intake):
+    """Add the interval ending with a weight measured on `day` to the fit.
+    `day` must not be before fit.last_date. Intervals without logged intake,
+    None, are not added, older intervals still decay over their days"""
+    if fit.last_date is not None and day > fit.last_date:
+        elapsed = (day - fit.last_date).days
+        decay = DECAY ** elapsed
+        for field in SUM_FIELDS:
+            setattr(fit, field, getattr(fit, field) * decay)
+
+        if intake is not None:
+            rate = (weight - fit.last_weight) / elapsed
+            fit.weight_sum += 1
+            fit.intake_sum += intake
+            fit.rate_sum += rate
+            fit.intake_sq_sum += intake * intake
+            fit.intake_rate_sum += intake * rate
+            fit.rate_sq_sum += rate * rate
+            fit.samples += 1
+
+    fit.last_date = day
+    fit.last_weight = weight
+
+
+def rebuild(fit):
+    """Fit again from all weight measurements and daily meals of the user"""
+    measurements = Measurement.objects.filter(user=fit.user_id, weight__gt=0).order_by('date', 'id')
+    days = DailyMeal.objects.filter(user=fit.user_id, calories__gt=0).values('date').annotate(
+        calories=Sum('calories'),
+    ).order_by('date').values_list('date', 'calories')
+    logged = [day for day, calories in days]
+    totals = [0, *accumulate(calories for day, calories in days)]
+
+    for field in SUM_FIELDS:
+        setattr(fit, field, 0)
+    fit.samples = 0
+    fit.last_date = None
+    fit.last_weight = 0
+
+    for day, weight in measurements.values_list('date', 'weight'):
+        intake = None
+        if fit.last_date is not None:
+            first = bisect_left(logged, fit.last_date)
+            last = bisect_left(logged, day)
+            if last > first:
+                intake = (totals[last] - totals[first]) / (last - first)
+        add_measurement(fit, day, weight, intake)
+
+    fit.is_stale = False
+    fit.save()
+
+
+def get_fit(user):
+    """Return the up to date fit of the user"""
+    fit, created = WeightProjection.objects.get_or_create(user=user)
+    if created or fit.is_stale:
+        rebuild(fit)
+
+    return fit
+
+
+def project(fit, goal_weight, intake=None):
+    """Project the date the goal weight is reached at the given daily intake,
+    the mean intake of the fit by default, with a confidence band"""
+    projection = {
+        'current_weight': fit.last_weight,
+        'goal_weight': goal_weight,
+        'intake': None,
+        'rate': None,
+        'estimated_date': None,
+        'earliest_date': None,
+        'latest_date': None,
+        'samples': fit.samples,
+    }
+    if fit.last_date is None:
+        return projection
+    if fit.last_weight == goal_weight:
+        last_date = fit.last_date
+        projection.update(estimated_date=last_date, earliest_date=last_date, latest_date=last_date)
+        return projection
+    if fit.samples < 3 or fit.weight_sum <= 2:
+        return projection
+
+    total = fit.weight_sum
+    intake_mean = fit.intake_sum / total
+    rate_mean = fit.rate_sum / total
+    intake_var = fit.intake_sq_sum - total * intake_mean ** 2
+    covar = fit.intake_rate_sum - total * intake_mean * rate_mean
+    rate_var = fit.rate_sq_sum - total * rate_mean ** 2
+    if intake is None:
+        intake = intake_mean
+
+    # Without spread in the logged intake only the mean rate can be fitted
+    if intake_var > 1e-6 * max(1, fit.intake_sq_sum):
+        slope = covar / intake_var
+        residual = max(rate_var - slope * covar, 0) / (total - 2)
+        error = math.sqrt(residual * (1 / total + (intake - intake_mean) ** 2 / intake_var))
+    else:
+        slope = 0
+        residual = max(rate_var, 0) / (total - 1)
+        error = math.sqrt(residual / total)
+    rate = rate_mean + slope * (intake - intake_mean)
+    projection.update(intake=round(intake), rate=rate)
+
+    remaining = goal_weight - fit.last_weight
+
+    def reached(rate):
+        if rate * remaining <= 0:
+            return None
+        days = remaining / rate
+        if days > MAX_DAYS:
+            return None
+        return fit.last_date + timedelta(days=math.ceil(days))
+
+    slow, fast = rate - Z_SCORE * error, rate + Z_SCORE * error
+    if remaining < 0:
+        slow, fast = fast, slow
+    projection.update(estimated_date=reached(rate), earliest_date=reached(fast), latest_date=reached(slow))
+
+    return projection
+
+
+def recent_intake(user, today=None):
+    """Return the mean intake of the days logged within the INTAKE_DAYS days before today"""
+    today = today or date.today()
+    return mean_intake(user, today - timedelta(days=INTAKE_DAYS), today)
@@ -1,6 +1,8 @@
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
-from core.models import UserGoal, Measurement
+from core.mixins import DirectUploadMixin, ImageVariantsMixin
+from core.models import User, UserGoal, Measurement
 
 
 class UserGoalSerializer(serializers.ModelSerializer):
@@ -12,11 +14,77 @@ class UserGoalSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class MeasurementSerializer(serializers.ModelSerializer):
+class MeasurementSerializer(DirectUploadMixin, ImageVariantsMixin, serializers.ModelSerializer):
     """Serializer for Measurement objects"""
+    image_fields = ('image',)
 
     class Meta:
         model = Measurement
         fields = ('id', 'date', 'weight', 'height', 'neck', 'chest', 'biceps',
                   'forearm', 'abdomen', 'hips', 'thigh', 'image')
         read_only_fields = ('id',)
+
+
+class MetricsQuerySerializer(serializers.Serializer):
+    """Serializer for query parameters choosing measurement metrics"""
+    METRICS = ('weight', 'height', 'neck', 'chest', 'biceps', 'forearm', 'abdomen', 'hips', 'thigh')
+
+    metrics = serializers.CharField(default='weight')
+
+    def validate_metrics(self, value):
+        """Split the comma separated metrics and check that they exist"""
+        metrics = [metric.strip() for metric in value.split(',') if metric.strip()]
+        unknown = [metric for metric in metrics if metric not in self.METRICS]
+        if not metrics or unknown:
+            msg = _('Choose metrics from: {metrics}').format(metrics=', '.join(self.METRICS))
+            raise serializers.ValidationError(msg)
+
+        return list(dict.fromkeys(metrics))
+
+
+class MeasurementTrendsQuerySerializer(MetricsQuerySerializer):
+    """Serializer for the query parameters of measurement trends"""
+    window = serializers.IntegerField(min_value=1, max_value=3650, default=7)
+    alpha = serializers.FloatField(min_value=0, max_value=1, default=0.1)
+    points = serializers.IntegerField(min_value=2, max_value=1000, default=200)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate_alpha(self, value):
+        """Smoothing needs a positive alpha"""
+        if value <= 0:
+            raise serializers.ValidationError(_('Ensure this value is greater than 0.'))
+
+        return value
+
+    def validate(self, data):
+        """Check that the date range is not reversed"""
+        if 'start' in data and 'end' in data and data['start'] > data['end']:
+            raise serializers.ValidationError(_('start must not be after end'))
+
+        return data
+
+
+class MeasurementPercentilesQuerySerializer(MetricsQuerySerializer):
+    """Serializer for the query parameters of measurement percentiles"""
+    ALL = 'all'
+
+    metrics = serializers.CharField(default=','.join(MetricsQuerySerializer.METRICS))
+    gender = serializers.ChoiceField(choices=[gender for gender, name in User.GENDERS] + [ALL], required=False)
+
+
+class GoalProjectionQuerySerializer(serializers.Serializer):
+    """Serializer for the query parameters of the goal projection"""
+    intake = serializers.IntegerField(min_value=0, max_value=32767, required=False)
+
+
+class GoalProjectionSerializer(serializers.Serializer):
+    """Serializer for the projected date of reaching the goal weight"""
+    current_weight = serializers.IntegerField()
+    goal_weight = serializers.IntegerField()
+    intake = serializers.IntegerField(allow_null=True)
+    rate = serializers.FloatField(allow_null=True)
+    estimated_date = serializers.DateField(allow_null=True)
+    earliest_date = serializers.DateField(allow_null=True)
+    latest_date = serializers.DateField(allow_null=True)
+    samples = serializers.IntegerField()
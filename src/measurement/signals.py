@@ -0,0 +1,88 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from core import live
+from core.models import Measurement, DailyMeal, WeightProjection
+from measurement import sketches
+from measurement.serializers import MeasurementSerializer
+from measurement.projection import mean_intake, add_measurement
+
+
+@receiver(post_save, sender=Measurement)
+def measurement_sketches_post_save(sender, instance, created, raw, **kwargs):
+    """Add a new measurement to the population sketches. Sketches cannot
+    remove values, edits and deletes count from the next rebuild"""
+    if created and not raw:
+        sketches.add_measurement(instance)
+
+
+@receiver(post_save, sender=Measurement)
+def measurement_post_save(sender, instance, created, raw, update_fields, **kwargs):
+    """Add a new latest weight to the user's fit, any other change
+    of the weights makes the fit stale"""
+    if raw or (created and not instance.weight):
+        return
+    if update_fields is not None and not {'date', 'weight'} & update_fields:
+        return
+
+    fit = WeightProjection.objects.filter(user=instance.user_id).first()
+    if fit is None or fit.is_stale:
+        return
+
+    if created and (fit.last_date is None or instance.date >= fit.last_date):
+        intake = None
+        if fit.last_date is not None:
+            intake = mean_intake(instance.user_id, fit.last_date, instance.date)
+        add_measurement(fit, instance.date, instance.weight, intake)
+        fit.save()
+    else:
+        WeightProjection.objects.filter(pk=fit.pk).update(is_stale=True)
+
+
+@receiver(post_delete, sender=Measurement)
+def measurement_post_delete(sender, instance, **kwargs):
+    """Removing a weight makes the user's fit stale"""
+    if instance.weight:
+        WeightProjection.objects.filter(user=instance.user_id).update(is_stale=True)
+
+
+@receiver(pre_save, sender=DailyMeal)
+def daily_meal_projection_pre_save(sender, instance, raw, **kwargs):
+    """Remember the stored day and calories of the daily meal"""
+    instance._stored_intake = None
+    if not raw and instance.pk is not None:
+        instance._stored_intake = DailyMeal.objects.filter(pk=instance.pk).values_list('date', 'calories').first()
+
+
+@receiver(post_save, sender=DailyMeal)
+def daily_meal_projection_post_save(sender, instance, raw, **kwargs):
+    """Changed calories of a day make the user's fit stale if it covers the day.
+    Bulk writes mark it in WeightProjectionQuerySet.intake_changed()"""
+    if raw:
+        return
+
+    stored = instance._stored_intake
+    if stored is None and instance.calories:
+        WeightProjection.objects.intake_changed([(instance.user_id, instance.date)])
+    elif stored is not None and stored != (instance.date, instance.calories):
+        WeightProjection.objects.intake_changed([(instance.user_id, stored[0]), (instance.user_id, instance.date)])
+
+
+@receiver(post_delete, sender=DailyMeal)
+def daily_meal_projection_post_delete(sender, instance, **kwargs):
+    """Removing the calories of a day makes the user's fit stale if it covers the day"""
+    if instance.calories:
+        WeightProjection.objects.intake_changed([(instance.user_id, instance.date)])
+
+
+@receiver(post_save, sender=Measurement)
+def measurement_live_post_save(sender, instance, raw, **kwargs):
+    """Publish the saved measurement to the live events of its user"""
+    if not raw:
+        live.publish(instance.user_id, 'measurement', MeasurementSerializer(instance).data)
+
+
+@receiver(post_delete, sender=Measurement)
+def measurement_live_post_delete(sender, instance, **kwargs):
+    """Publish the deletion of the measurement to the live events of its user"""
+    live.publish(instance.user_id, 'measurement', {'id': instance.pk, 'deleted': True})
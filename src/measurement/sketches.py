@@ -0,0 +1,172 @@
+import json
+import math
+import random
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from django.db import transaction
+
+from core.models import Measurement, MeasurementSketch, User
+
+
+# Population percentiles
+#
+# Every metric keeps a KLL quantile sketch per gender (Karnin, Lang, Liberty).
+# A sketch holds levels of values where a value on level h stands for 2^h of
+# the original values. A full level is sorted and every other value, starting
+# at a random offset, moves up a level. The size of the sketch depends only on
+# K, so a percentile lookup costs the same however many measurements exist,
+# and sketches of different genders merge into the sketch of everyone.
+
+METRICS = ('weight', 'height', 'neck', 'chest', 'biceps', 'forearm', 'abdomen', 'hips', 'thigh')
+K = 200
+C = 2 / 3
+
+
+class KLLSketch:
+    """Mergeable approximate quantile sketch"""
+
+    def __init__(self, k=K, levels=None):
+        self.k = k
+        self.levels = levels or [[]]
+        self._ranks = None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['k'], data['levels'])
+
+    def to_dict(self):
+        return {'k': self.k, 'levels': self.levels}
+
+    def __len__(self):
+        """Return the number of values added to the sketch"""
+        return sum(len(level) << height for height, level in enumerate(self.levels))
+
+    def capacity(self, height):
+        """Return how many values level `height` holds before it is compacted"""
+        depth = len(self.levels) - height - 1
+        return int(math.ceil(self.k * C ** depth)) + 1
+
+    def update(self, value):
+        self.levels[0].append(value)
+        self._ranks = None
+        self.compress()
+
+    def merge(self, other):
+        """Add all values of the other sketch to this one"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, values in zip(self.levels, other.levels):
+            level.extend(values)
+        self._ranks = None
+        self.compress()
+
+        return self
+
+    def compress(self):
+        """Compact full levels until the sketch is within its capacity"""
+        while sum(map(len, self.levels)) >= sum(map(self.capacity, range(len(self.levels)))):
+            for height, level in enumerate(self.levels):
+                if len(level) >= self.capacity(height):
+                    if height + 1 == len(self.levels):
+                        self.levels.append([])
+                    level.sort()
+                    leftover = [level.pop()] if len(level) % 2 else []
+                    self.levels[height + 1].extend(level[random.randint(0, 1)::2])
+                    level[:] = leftover
+                    break
+
+    def ranks(self):
+        """Return the sorted values of the sketch and the weight of the values up to each"""
+        if self._ranks is None:
+            weighted = sorted(
+                (value, 1 << height)
+                for height, level in enumerate(self.levels)
+                for value in level
+            )
+            self._ranks = (
+                [value for value, weight in weighted],
+                list(accumulate(weight for value, weight in weighted)),
+            )
+
+        return self._ranks
+
+    def percentile(self, value):
+        """Return the percentage of values below the given value,
+        counting values equal to it as half below"""
+        values, weights = self.ranks()
+        if not values:
+            return None
+
+        below = bisect_left(values, value)
+        up_to = bisect_right(values, value)
+        below = weights[below - 1] if below else 0
+        up_to = weights[up_to - 1] if up_to else 0
+
+        return 100 * (below + up_to) / 2 / weights[-1]
+
+
+def user_gender(measurement):
+    """Return the gender of the measurement's user, without a query when the user is loaded"""
+    if Measurement.user.is_cached(measurement):
+        return measurement.user.gender
+
+    return User.objects.filter(pk=measurement.user_id).values_list('gender', flat=True).get()
+
+
+def add_measurement(measurement):
+    """Add the recorded metrics of a new measurement to the sketches of its user's gender"""
+    values = {metric: getattr(measurement, metric) for metric in METRICS if getattr(measurement, metric)}
+    if not values:
+        return
+
+    gender = user_gender(measurement)
+    with transaction.atomic():
+        rows = {
+            row.metric: row
+            for row in MeasurementSketch.objects.select_for_update().filter(gender=gender, metric__in=values)
+        }
+        new_rows = []
+        for metric, value in values.items():
+            if metric in rows:
+                sketch = KLLSketch.from_dict(json.loads(rows[metric].sketch))
+            else:
+                sketch = KLLSketch()
+                new_rows.append(MeasurementSketch(metric=metric, gender=gender))
+                rows[metric] = new_rows[-1]
+            sketch.update(value)
+            rows[metric].sketch = json.dumps(sketch.to_dict())
+
+        MeasurementSketch.objects.bulk_update([row for row in rows.values() if row.pk], ['sketch'])
+        # A concurrent first measurement of the metric may have created the row
+        MeasurementSketch.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+
+def rebuild_sketches():
+    """Build the sketches of every metric and gender again from all measurements"""
+    sketches = {}
+    for gender, *values in Measurement.objects.values_list('user__gender', *METRICS).iterator():
+        for metric, value in zip(METRICS, values):
+            if value:
+                sketches.setdefault((metric, gender), KLLSketch()).update(value)
+
+    with transaction.atomic():
+        MeasurementSketch.objects.all().delete()
+        MeasurementSketch.objects.bulk_create([
+            MeasurementSketch(metric=metric, gender=gender, sketch=json.dumps(sketch.to_dict()))
+            for (metric, gender), sketch in sketches.items()
+        ])
+
+    return sketches
+
+
+def load_sketches(metrics, genders):
+    """Return the sketch of each metric, merged over the given genders"""
+    sketches = {}
+    for metric, sketch in MeasurementSketch.objects.filter(
+        metric__in=metrics, gender__in=genders,
+    ).values_list('metric', 'sketch'):
+        sketch = KLLSketch.from_dict(json.loads(sketch))
+        sketches[metric] = sketches[metric].merge(sketch) if metric in sketches else sketch
+
+    return sketches
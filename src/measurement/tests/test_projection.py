@@ -0,0 +1,55 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core.models import BaseFood, FoodAmount, Meal, DailyMeal, Measurement, WeightProjection
+from measurement.projection import get_fit, mean_intake
+
+
+class WeightProjectionTests(TestCase):
+    """The fit regresses the weight change of each interval between measurements
+    on the intake logged over it, and goes stale when that intake changes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='projection@test.com', password='testpass123')
+        self.food = BaseFood.objects.create(name='Bread', calories=100, user=self.user)
+
+    def log(self, day, amount):
+        meal = Meal.objects.create(user=self.user)
+        FoodAmount.objects.create(food=self.food, amount=amount, belongs_to_meal=meal, user=self.user)
+        return DailyMeal.objects.create(user=self.user, date=day, breakfast=meal)
+
+    def measure(self, day, weight):
+        Measurement.objects.create(user=self.user, date=day, weight=weight)
+
+    def test_mean_intake_excludes_the_last_day(self):
+        self.log(date(2024, 1, 1), 10)
+        self.log(date(2024, 1, 2), 20)
+        self.assertEqual(mean_intake(self.user.pk, date(2024, 1, 1), date(2024, 1, 2)), 1000)
+        self.assertIsNone(mean_intake(self.user.pk, date(2024, 1, 2), date(2024, 1, 2)))
+
+    def test_intervals_without_intake_are_skipped(self):
+        self.log(date(2024, 1, 1), 20)
+        self.measure(date(2024, 1, 1), 80)
+        self.measure(date(2024, 1, 8), 79)
+        self.measure(date(2024, 1, 15), 78)
+        fit = get_fit(self.user)
+        self.assertEqual(fit.samples, 1)
+        self.assertEqual(fit.intake_sum / fit.weight_sum, 2000)
+
+    def test_changed_intake_of_fitted_days(self):
+        self.measure(date(2024, 1, 1), 80)
+        self.measure(date(2024, 1, 8), 79)
+        get_fit(self.user)
+
+        self.log(date(2024, 1, 8), 20)
+        self.assertFalse(WeightProjection.objects.get(user=self.user).is_stale)
+
+        daily_meal = self.log(date(2024, 1, 3), 20)
+        self.assertTrue(WeightProjection.objects.get(user=self.user).is_stale)
+        self.assertEqual(get_fit(self.user).samples, 1)
+
+        daily_meal.breakfast.meal_contents.get().delete()
+        self.assertTrue(WeightProjection.objects.get(user=self.user).is_stale)
+        self.assertEqual(get_fit(self.user).samples, 0)
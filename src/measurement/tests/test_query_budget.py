@@ -0,0 +1,33 @@
+from django.urls import reverse
+
+from core.tests.query_budget import QueryBudgetTestCase
+
+
+class MeasurementQueryBudgetTests(QueryBudgetTestCase):
+    """Query budgets of the measurement and goal API"""
+
+    def test_measurement_budget(self):
+        self.assertQueryBudget(2, 'get', reverse('measurement:measurement-list'))
+        self.assertQueryBudget(2, 'get', reverse('measurement:measurement-detail', args=[self.measurement.id]))
+        self.assertQueryBudget(6, 'post', reverse('measurement:measurement-list'), {'weight': 79})
+        url = reverse('measurement:measurement-detail', args=[self.measurement.id])
+        self.assertQueryBudget(4, 'put', url, {'weight': 78, 'hips': 90})
+        self.assertQueryBudget(4, 'patch', url, {'weight': 77})
+        self.assertQueryBudget(4, 'delete', url)
+        self.assertQueryBudget(1, 'get', reverse('measurement:measurement-trends') + '?metrics=weight,hips')
+        self.assertQueryBudget(2, 'get', reverse('measurement:measurement-percentiles') + '?gender=all')
+
+    def test_user_goal_budget(self):
+        self.assertQueryBudget(2, 'get', reverse('measurement:usergoal-list'))
+        self.assertQueryBudget(2, 'get', reverse('measurement:usergoal-detail', args=[self.goal.id]))
+        self.assertQueryBudget(9, 'get', reverse('measurement:usergoal-projection'))
+        self.assertQueryBudget(3, 'get', reverse('measurement:usergoal-projection'))
+        url = reverse('measurement:usergoal-detail', args=[self.goal.id])
+        self.assertQueryBudget(2, 'put', url, {'current_weight': 80, 'goal_weight': 70})
+        self.assertQueryBudget(2, 'patch', url, {'goal_weight': 72})
+        self.assertQueryBudget(2, 'delete', url)
+
+
+class LargeMeasurementQueryBudgetTests(MeasurementQueryBudgetTests):
+    """Same budgets with many rows per user"""
+    rows = 12
@@ -0,0 +1,82 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Measurement
+from measurement.sketches import K, KLLSketch, load_sketches
+
+
+class KLLSketchTests(SimpleTestCase):
+    """Percentiles of a sketch stay within a small rank error of the exact
+    ones, and its size does not grow with the number of values"""
+    count = 20000
+    # Percentage points, several times the error expected with K values per level
+    max_error = 2
+
+    def setUp(self):
+        random.seed(0)
+        self.values = list(range(self.count))
+        random.shuffle(self.values)
+
+    def sketch(self, values):
+        sketch = KLLSketch()
+        for value in values:
+            sketch.update(value)
+        return sketch
+
+    def assertRankError(self, sketch):
+        self.assertEqual(len(sketch), self.count)
+        for percent in range(1, 100):
+            # Exactly `percent` percent of the values are below
+            value = percent * self.count / 100 - 0.5
+            self.assertAlmostEqual(sketch.percentile(value), percent, delta=self.max_error)
+
+    def test_rank_error(self):
+        sketch = self.sketch(self.values)
+        self.assertRankError(sketch)
+        self.assertLess(sum(map(len, sketch.levels)), 3 * K)
+
+    def test_merged_rank_error(self):
+        split = self.count * 3 // 5
+        sketch = self.sketch(self.values[:split]).merge(self.sketch(self.values[split:]))
+        self.assertRankError(sketch)
+        self.assertLess(sum(map(len, sketch.levels)), 3 * K)
+
+    def test_serialized_sketch(self):
+        sketch = self.sketch(self.values)
+        self.assertRankError(KLLSketch.from_dict(sketch.to_dict()))
+
+    def test_equal_values_count_half_below(self):
+        sketch = self.sketch([1, 2, 2, 3])
+        self.assertEqual(sketch.percentile(2), 50)
+        self.assertEqual(sketch.percentile(0), 0)
+        self.assertEqual(sketch.percentile(4), 100)
+        self.assertIsNone(KLLSketch().percentile(1))
+
+
+class MeasurementSketchTests(TestCase):
+    """New measurements are added to the sketches of their user's gender"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='sketch@test.com', password='testpass123', gender='female',
+        )
+
+    def test_loaded_user(self):
+        with CaptureQueriesContext(connection) as context:
+            Measurement.objects.create(user=self.user, weight=60)
+        self.assertFalse([query for query in context.captured_queries if 'core_user' in query['sql']])
+        self.assertEqual(load_sketches(['weight'], ['female'])['weight'].percentile(60), 50)
+
+    def test_no_metrics(self):
+        with CaptureQueriesContext(connection) as context:
+            Measurement.objects.create(user_id=self.user.pk)
+        self.assertFalse([query for query in context.captured_queries if 'core_user' in query['sql']])
+
+    def test_user_id(self):
+        Measurement.objects.create(user_id=self.user.pk, hips=90)
+        self.assertEqual(load_sketches(['hips'], ['female'])['hips'].percentile(90), 50)
+        self.assertEqual(load_sketches(['hips'], ['male']), {})
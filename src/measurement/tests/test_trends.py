@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Measurement
+from measurement.trends import downsample, exponential_smoothing, moving_average, rate_of_change
+
+
+class TrendFunctionTests(SimpleTestCase):
+    """The vectorised trend functions match a naive evaluation of their definition"""
+
+    def setUp(self):
+        random = np.random.default_rng(0)
+        self.days = np.cumsum(random.integers(0, 4, 500))
+        self.values = random.uniform(50, 100, 500)
+
+    def test_moving_average(self):
+        for window in (1, 7, 30):
+            expected = [
+                np.mean([x for d, x in zip(self.days[:i + 1], self.values[:i + 1]) if d > day - window])
+                for i, day in enumerate(self.days)
+            ]
+            np.testing.assert_allclose(moving_average(self.days, self.values, window), expected)
+
+    def test_exponential_smoothing(self):
+        for alpha in (0.001, 0.1, 0.9, 1):
+            expected = [self.values[0]]
+            for x in self.values[1:]:
+                expected.append(alpha * x + (1 - alpha) * expected[-1])
+            np.testing.assert_allclose(exponential_smoothing(self.values, alpha), expected)
+
+    def test_exponential_smoothing_of_long_series(self):
+        values = np.full(100000, 80.0)
+        smoothed = exponential_smoothing(values, 0.5)
+        self.assertTrue(np.all(np.isfinite(smoothed)))
+        np.testing.assert_allclose(smoothed, values)
+
+    def test_rate_of_change(self):
+        expected = [np.nan] + [
+            (x - previous) / (day - previous_day) if day > previous_day else np.nan
+            for previous_day, day, previous, x in zip(self.days, self.days[1:], self.values, self.values[1:])
+        ]
+        np.testing.assert_allclose(rate_of_change(self.days, self.values), expected)
+
+    def test_downsample(self):
+        column = np.arange(10, dtype=float)
+        column[[2, 3]] = np.nan
+        averaged, = downsample([column], 5)
+        np.testing.assert_allclose(averaged, [0.5, np.nan, 4.5, 6.5, 8.5])
+        self.assertIs(downsample([column], 10)[0], column)
+
+
+class TrendsEndpointTests(TestCase):
+    """The trends endpoint validates its parameters and skips unrecorded metrics"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='trends@test.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('measurement:measurement-trends')
+
+    def test_invalid_parameters(self):
+        for params in ({'window': 0}, {'alpha': 0}, {'alpha': 1.5}, {'points': 1}, {'metrics': 'tail'},
+                       {'start': '2024-02-01', 'end': '2024-01-01'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_zero_is_missing(self):
+        start = date(2024, 1, 1)
+        for i, (weight, hips) in enumerate([(80, 0), (0, 100), (78, 0), (0, 98)]):
+            Measurement.objects.create(user=self.user, date=start + timedelta(days=i), weight=weight, hips=hips)
+
+        response = self.client.get(self.url, {'metrics': 'weight,hips,neck', 'alpha': 0.5, 'window': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['weight'], {
+            'date': ['2024-01-01', '2024-01-03'],
+            'value': [80, 78],
+            'moving_average': [80, 79],
+            'smoothed': [80, 79],
+            'rate': [None, -0.5],
+        })
+        self.assertEqual(response.data['hips']['date'], ['2024-01-02', '2024-01-04'])
+        self.assertEqual(response.data['neck'], {key: [] for key in response.data['neck']})
+
+    def test_own_measurements_only(self):
+        other = get_user_model().objects.create_user(email='other@test.com', password='testpass123')
+        Measurement.objects.create(user=other, weight=90)
+        self.assertEqual(self.client.get(self.url).data['weight']['value'], [])
@@ -0,0 +1,112 @@
+import math
+
+import numpy as np
+
+
+# Trend analytics for measurement series
+#
+# Every metric is computed on its own series, the measurements where the metric
+# was recorded (unrecorded metrics are stored as 0). All computations work on
+# whole NumPy arrays; the only Python loops are over metrics and smoothing blocks.
+
+TREND_KEYS = ('date', 'value', 'moving_average', 'smoothed', 'rate')
+
+
+def moving_average(days, values, window):
+    """Return the mean of the values measured within `window` days
+    up to and including the day of each value"""
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    first = np.searchsorted(days, days - window, side='right')
+    last = np.arange(1, len(values) + 1)
+
+    return (sums[last] - sums[first]) / (last - first)
+
+
+def exponential_smoothing(values, alpha):
+    """Return s[0] = x[0], s[t] = alpha * x[t] + (1 - alpha) * s[t - 1].
+    The recurrence is evaluated in closed form per block, with blocks short
+    enough for the powers of (1 - alpha) to stay within float range"""
+    if alpha >= 1:
+        return values.copy()
+
+    # (1 - alpha)^n stays above e^-200 for n up to 200 / -log(1 - alpha)
+    rate = -math.log1p(-alpha)
+    block = len(values) if rate * len(values) <= 200 else max(1, int(200 / rate))
+    smoothed = np.empty_like(values)
+    level = values[0]
+    for start in range(0, len(values), block):
+        x = values[start:start + block]
+        decay = (1 - alpha) ** np.arange(len(x) + 1)
+        # s[t] = (1 - alpha)^(t + 1) * level + alpha * sum((1 - alpha)^(t - k) * x[k] for k <= t)
+        smoothed[start:start + block] = decay[1:] * level + alpha * decay[:-1] * np.cumsum(x / decay[:-1])
+        level = smoothed[start + len(x) - 1]
+
+    return smoothed
+
+
+def rate_of_change(days, values):
+    """Return the change per day since the previous value, NaN for the first
+    value and for values measured on the same day as the previous one"""
+    rate = np.full(len(values), np.nan)
+    elapsed = np.diff(days)
+    np.divide(np.diff(values), elapsed, out=rate[1:], where=elapsed > 0)
+
+    return rate
+
+
+def downsample(columns, points):
+    """Average the columns over `points` buckets of consecutive values, ignoring NaN"""
+    length = len(columns[0])
+    if length <= points:
+        return columns
+
+    bounds = np.linspace(0, length, points, endpoint=False).astype(int)
+    downsampled = []
+    for column in columns:
+        missing = np.isnan(column)
+        sums = np.add.reduceat(np.where(missing, 0, column), bounds)
+        counts = np.add.reduceat(~missing, bounds)
+        downsampled.append(np.divide(sums, counts, out=np.full(points, np.nan), where=counts > 0))
+
+    return downsampled
+
+
+def to_list(column):
+    """Return the column rounded to two decimals, with None for NaN"""
+    column = np.round(column, 2)
+    return np.where(np.isnan(column), None, column).tolist()
+
+
+def measurement_trends(rows, metrics, window, alpha, points):
+    """Return the trends of each metric from (date, *metrics) rows ordered by date"""
+    trends = {metric: {key: [] for key in TREND_KEYS} for metric in metrics}
+    if not rows:
+        return trends
+
+    dates, *series = zip(*rows)
+    all_days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+    for metric, values in zip(metrics, np.array(series, dtype=float)):
+        recorded = values > 0
+        days = all_days[recorded]
+        values = values[recorded]
+        if not len(values):
+            continue
+
+        smoothed = exponential_smoothing(values, alpha)
+        days, values, average, smoothed, rate = downsample([
+            days.astype(float),
+            values,
+            moving_average(days, values, window),
+            smoothed,
+            rate_of_change(days, smoothed),
+        ], points)
+
+        trends[metric] = {
+            'date': np.round(days).astype(np.int64).astype('datetime64[D]').astype(str).tolist(),
+            'value': to_list(values),
+            'moving_average': to_list(average),
+            'smoothed': to_list(smoothed),
+            'rate': to_list(rate),
+        }
+
+    return trends
@@ -13,9 +13,15 @@ router.register('measurements', views.MeasurementViewSet)
 # Authenticated users
 # /api/measurement/goals[/all] - list UserGoal for current user
 # /api/measurement/goals/<id> - view detail of UserGoal
+# /api/measurement/goals/projection[?intake=] - projected date of reaching the latest goal weight,
+#   at the given daily intake or the intake logged over the last week
 #
 # /api/measurement/measurements[/all] - list Measurement for current user
 # /api/measurement/measurements/<id> - view detail of Measurement
+# /api/measurement/measurements/trends[?metrics=weight,hips&window=&alpha=&points=&start=&end=]
+#   - moving average, smoothed values and rate of change per metric
+# /api/measurement/measurements/percentiles[?metrics=chest,hips&gender=male|female|other|all]
+#   - population percentile of the latest value of each metric, by default among users of the same gender
 #
 
 urlpatterns = [
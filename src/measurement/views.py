@@ -1,17 +1,23 @@
+from django.db.models import OuterRef, Subquery
+from django.utils.translation import gettext_lazy as _
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import UserGoal, Measurement
-from . import serializers
+from core.authentication import CachedTokenAuthentication
+from core.mixins import ConditionalGetMixin
+from core.models import User, UserGoal, Measurement
+from core.pagination import KeysetPagination
+from . import serializers, trends, projection, sketches
 
 
-class DefaultViewSet(viewsets.ModelViewSet):
+class DefaultViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Default ViewSet for measurements and goals"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
@@ -28,8 +34,79 @@ class UserGoalViewSet(DefaultViewSet):
     queryset = UserGoal.objects.all()
     serializer_class = serializers.UserGoalSerializer
 
+    def get_queryset(self):
+        """Return goals for the current authenticated user only"""
+        queryset = self.queryset
+        return queryset.filter(user=self.request.user).order_by('-id')
+
+    @action(methods=['GET'], detail=False)
+    def projection(self, request):
+        """Projected date of reaching the latest goal weight"""
+        query = serializers.GoalProjectionQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        goal = self.get_queryset().first()
+        if goal is None:
+            raise NotFound(_('No goal set'))
+
+        intake = query.validated_data.get('intake')
+        if intake is None:
+            intake = projection.recent_intake(self.request.user)
+        fit = projection.get_fit(self.request.user)
+
+        return Response(serializers.GoalProjectionSerializer(
+            projection.project(fit, goal.goal_weight, intake)
+        ).data)
+
 
 class MeasurementViewSet(DefaultViewSet):
     """Manage user measurements in the database"""
     queryset = Measurement.objects.all()
     serializer_class = serializers.MeasurementSerializer
+
+    @action(methods=['GET'], detail=False)
+    def trends(self, request):
+        """Moving averages, smoothed values and rate of change of measurement series"""
+        query = serializers.MeasurementTrendsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        queryset = self.queryset.filter(user=self.request.user)
+        if 'start' in params:
+            queryset = queryset.filter(date__gte=params['start'])
+        if 'end' in params:
+            queryset = queryset.filter(date__lte=params['end'])
+        rows = list(queryset.order_by('date', 'id').values_list('date', *params['metrics']))
+
+        return Response(trends.measurement_trends(
+            rows, params['metrics'], params['window'], params['alpha'], params['points']
+        ))
+
+    @action(methods=['GET'], detail=False)
+    def percentiles(self, request):
+        """Percentiles of the latest recorded metrics among all users of a gender"""
+        query = serializers.MeasurementPercentilesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        metrics = query.validated_data['metrics']
+        gender = query.validated_data.get('gender', self.request.user.gender)
+        genders = [gender] if gender != query.ALL else [gender for gender, name in User.GENDERS]
+
+        latest = User.objects.filter(pk=self.request.user.pk).values(**{
+            metric: Subquery(self.queryset.filter(
+                user=OuterRef('pk'), **{f'{metric}__gt': 0},
+            ).order_by('-date', '-id').values(metric)[:1])
+            for metric in metrics
+        }).get()
+        population = sketches.load_sketches(metrics, genders)
+
+        percentiles = {}
+        for metric in metrics:
+            sketch = population.get(metric)
+            value = latest[metric]
+            percentiles[metric] = {
+                'value': value,
+                'percentile': sketch.percentile(value) if sketch and value else None,
+                'count': len(sketch) if sketch else 0,
+            }
+
+        return Response({'gender': gender, 'metrics': percentiles})
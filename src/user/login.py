@@ -0,0 +1,68 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model, user_login_failed
+from django.contrib.auth.hashers import make_password
+from django.db.models import Q
+from django.utils.translation import gettext as _
+from rest_framework import exceptions
+
+
+# Login
+#
+# authenticate() tries ModelBackend and then the allauth backend, which look
+# the user up twice and hash the password twice for a failed login. Logins
+# for tokens resolve the user once, by email or by an allauth email address,
+# and hash once, also for unknown emails so their response takes as long.
+# Emails match regardless of case, as with the allauth backend authenticate()
+# falls back to, preferring an exact match as ModelBackend finds it first.
+# check_password() rehashes passwords of an older hasher or iteration count
+# with the first of PASSWORD_HASHERS.
+#
+# At most LOGIN_HASH_CONCURRENCY passwords are hashed at once per process.
+# Logins waiting longer than LOGIN_HASH_TIMEOUT seconds for their turn are
+# throttled, so a burst of logins cannot occupy every worker thread.
+
+hash_slots = threading.BoundedSemaphore(settings.LOGIN_HASH_CONCURRENCY)
+
+
+@contextmanager
+def hash_slot():
+    """Wait for a turn to hash a password"""
+    if not hash_slots.acquire(timeout=settings.LOGIN_HASH_TIMEOUT):
+        raise exceptions.Throttled(
+            wait=settings.LOGIN_HASH_TIMEOUT,
+            detail=_('Too many logins at once, try again shortly.'),
+        )
+    try:
+        yield
+    finally:
+        hash_slots.release()
+
+
+def find_user(email):
+    """Return the user with the given email, as their own email or an allauth email address"""
+    users = get_user_model().objects.filter(
+        Q(email__iexact=email) | Q(emailaddress__email__iexact=email)
+    ).distinct()
+    users = sorted(users, key=lambda user: (user.email != email, user.email.lower() != email.lower()))
+
+    return users[0] if users else None
+
+
+def authenticate_login(request, email, password):
+    """Return the active user with the given email and password, None otherwise"""
+    user = find_user(email)
+    with hash_slot():
+        if user is None:
+            make_password(password)
+            is_valid = False
+        else:
+            is_valid = user.check_password(password)
+
+    if is_valid and user.is_active:
+        return user
+
+    user_login_failed.send(sender=__name__, credentials={'username': email}, request=request)
+    return None
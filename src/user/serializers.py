@@ -1,10 +1,19 @@
-from django.contrib.auth import get_user_model, authenticate
+from datetime import date
+
+from django.contrib.auth import get_user_model
 from django.utils.translation import ugettext_lazy as _
 
 from rest_framework import serializers
 
+from core.mixins import DirectUploadMixin, ImageVariantsMixin
+from meal.serializers import DailyMealDetailSerializer
+from measurement.serializers import UserGoalSerializer, MeasurementSerializer
+from user.login import authenticate_login
+
+
+class CreateManageUserSerializer(DirectUploadMixin, ImageVariantsMixin, serializers.ModelSerializer):
+    image_fields = ('profile_picture',)
 
-class CreateManageUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         fields = ['id', 'email', 'password', 'name', 'gender', 'profile_picture']
@@ -26,7 +35,9 @@ class CreateManageUserSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ImageVariantsMixin, serializers.ModelSerializer):
+    image_fields = ('profile_picture',)
+
     class Meta:
         model = get_user_model()
         fields = ['id', 'email', 'name', 'gender', 'profile_picture', 'last_login', 'is_active', 'groups', 'is_staff', 'is_superuser', 'user_permissions']
@@ -41,18 +52,36 @@ class AuthTokenSerializer(serializers.Serializer):
     )
 
     def validate(self, data):
-        """Check if email and password belong to a valid user"""
+        """Check if email and password belong to a valid user,
+        hashing the password only once, see user.login"""
         email = data.get('email')
         password = data.get('password')
 
-        user = authenticate(
-            request=self.context.get('request'),
-            username=email,
-            password=password
-        )
+        user = authenticate_login(self.context.get('request'), email, password)
         if not user:
             msg = _('Unable to authenticate with provided credentials')
             raise serializers.ValidationError(msg, code='authorization')
 
         data['user'] = user
         return data
+
+
+class DashboardQuerySerializer(serializers.Serializer):
+    """Serializer for the query parameters of the dashboard"""
+    date = serializers.DateField(default=date.today)
+
+
+class DashboardSerializer(serializers.Serializer):
+    """Serializer for everything the first screen of the app shows"""
+    user = CreateManageUserSerializer()
+    daily_meal = DailyMealDetailSerializer(allow_null=True)
+    goal = UserGoalSerializer(allow_null=True)
+    measurement = MeasurementSerializer(allow_null=True)
+
+
+class UploadSerializer(serializers.Serializer):
+    """Serializer for a signed direct upload URL"""
+    key = serializers.CharField()
+    url = serializers.URLField()
+    method = serializers.CharField()
+    expires_in = serializers.IntegerField()
@@ -0,0 +1,68 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import MD5PasswordHasher, make_password
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+
+class CountingHasher(MD5PasswordHasher):
+    """Counts the passwords it hashes"""
+    algorithm = 'counting_md5'
+    hashed = 0
+
+    def encode(self, password, salt):
+        CountingHasher.hashed += 1
+        return super().encode(password, salt)
+
+
+class LoginTests(TestCase):
+    """Token logins find the user once and hash the password once"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='login@test.com', password='testpass123')
+        self.client = APIClient()
+        self.url = reverse('user:token-list')
+
+    def login(self, email='login@test.com', password='testpass123'):
+        return self.client.post(self.url, {'email': email, 'password': password})
+
+    def test_hashes_once_per_attempt(self):
+        with override_settings(PASSWORD_HASHERS=['user.tests.test_login.CountingHasher']):
+            self.user.set_password('testpass123')
+            self.user.save()
+            for email, password, status in [
+                ('login@test.com', 'testpass123', 200),
+                ('login@test.com', 'wrong', 400),
+                ('unknown@test.com', 'testpass123', 400),
+            ]:
+                CountingHasher.hashed = 0
+                self.assertEqual(self.login(email, password).status_code, status)
+                self.assertEqual(CountingHasher.hashed, 1, email)
+
+    def test_upgrades_the_hasher(self):
+        self.user.password = make_password('testpass123', hasher='pbkdf2_sha256')
+        self.user.save()
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2'))
+
+    def test_inactive_user(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.login().status_code, 400)
+
+    def test_email_case(self):
+        self.assertEqual(self.login('LOGIN@test.com').status_code, 200)
+        other = get_user_model().objects.create_user(email='Login@test.com', password='otherpass123')
+        self.assertEqual(self.login('Login@test.com', 'otherpass123').data['token'], other.auth_token.key)
+        self.assertEqual(self.login('login@test.com').data['token'], self.user.auth_token.key)
+
+    @override_settings(LOGIN_HASH_TIMEOUT=0.01)
+    def test_throttled_when_hashing_is_busy(self):
+        with mock.patch('user.login.hash_slots', threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
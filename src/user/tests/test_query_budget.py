@@ -0,0 +1,15 @@
+from django.urls import reverse
+
+from core.tests.query_budget import QueryBudgetTestCase
+
+
+class DashboardQueryBudgetTests(QueryBudgetTestCase):
+    """Query budget of the dashboard"""
+
+    def test_dashboard_budget(self):
+        self.assertQueryBudget(7, 'get', reverse('user:dashboard-list'))
+
+
+class LargeDashboardQueryBudgetTests(DashboardQueryBudgetTests):
+    """Same budget with many rows per user"""
+    rows = 12
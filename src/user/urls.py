@@ -65,5 +65,7 @@ router.register('create', views.CreateUserView, 'create')
 router.register('token', views.CreateTokenView, 'token')
 router.register('google_token', views.GoogleLogin, 'google_token')
 router.register('me', views.ManageUserView, 'me')
+router.register('dashboard', views.DashboardView, 'dashboard')
+router.register('uploads', views.UploadView, 'uploads')
 
 urlpatterns = router.urls
@@ -1,15 +1,23 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from rest_framework import generics, viewsets, mixins
+from rest_framework import generics, viewsets, mixins, status
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
 
 from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
 from allauth.socialaccount.providers.oauth2.client import OAuth2Client
 from dj_rest_auth.registration.views import SocialLoginView
 
-from user.serializers import CreateManageUserSerializer, UserSerializer, AuthTokenSerializer
+from core.authentication import CachedTokenAuthentication
+from core.models import DailyMeal, UserGoal, Measurement
+from core.uploads import upload_backend
+from meal.serializers import DailyMealDetailSerializer
+from user.serializers import (
+    CreateManageUserSerializer, UserSerializer, AuthTokenSerializer, DashboardQuerySerializer, DashboardSerializer,
+    UploadSerializer,
+)
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -18,7 +26,7 @@ class CreateUserView(generics.CreateAPIView):
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the current user"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     serializer_class = CreateManageUserSerializer
@@ -27,6 +35,51 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 
+class DashboardView(generics.GenericAPIView):
+    """Everything the first screen of the app shows in one request: the current user,
+    their daily meal of the day, latest goal and latest measurement"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    serializer_class = DashboardSerializer
+
+    def get(self, request):
+        query = DashboardQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        user = self.request.user
+        daily_meals = DailyMeal.objects.filter(user=user, date=query.validated_data['date'])
+        dashboard = {
+            # Loaded by the authentication, without a query
+            'user': user,
+            'daily_meal': DailyMealDetailSerializer.setup_eager_loading(daily_meals).order_by('id').first(),
+            'goal': UserGoal.objects.filter(user=user).order_by('-id').first(),
+            'measurement': Measurement.objects.filter(user=user).order_by('-date', '-id').first(),
+        }
+
+        return Response(self.get_serializer(dashboard).data)
+
+
+class UploadView(generics.GenericAPIView):
+    """Sign a URL to PUT a picture to, whose key is then sent as the
+    <field>_upload of a user, food or measurement, see core.uploads"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    serializer_class = UploadSerializer
+
+    def post(self, request):
+        key = upload_backend.create_key(request.user.pk)
+        upload = {
+            'key': key,
+            'url': upload_backend.get_upload_url(request, key),
+            'method': 'PUT',
+            'expires_in': settings.UPLOAD_URL_TIMEOUT,
+        }
+
+        return Response(self.get_serializer(upload).data, status=status.HTTP_201_CREATED)
+
+
 class CreateTokenView(ObtainAuthToken):
     """Create an authentication token for a user"""
     serializer_class = AuthTokenSerializer
@@ -35,7 +88,7 @@ class CreateTokenView(ObtainAuthToken):
 
 class UserViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.UpdateModelMixin):
     """View list of users or detail for a single user"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated, IsAdminUser,)
 
     queryset = get_user_model().objects.all()